@@ -0,0 +1,19 @@
+# Generated by Django 4.2.13 on 2026-10-18 03:45
+
+import accounts.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_account_locked_until_user_deactivated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='data_version',
+            field=models.BigIntegerField(default=accounts.models.initial_data_version, editable=False),
+        ),
+    ]
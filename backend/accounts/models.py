@@ -2,6 +2,13 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+import time
+
+
+def initial_data_version():
+    # Time based, so a reused user id never matches cached entries of a deleted user
+    return time.time_ns() // 1000
+
 
 class User(AbstractUser):
     """
@@ -29,12 +36,26 @@ class User(AbstractUser):
     is_active = models.BooleanField(default=False)  # Changed to False by default
     deactivated_at = models.DateTimeField(null=True, blank=True)
     deactivation_reason = models.TextField(blank=True)
+
+    # Bumped on every write to the user's data; keys cached analytics and report snapshots
+    data_version = models.BigIntegerField(default=initial_data_version, editable=False)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
     def __str__(self):
         return self.email
+
+    def save(self, *args, **kwargs):
+        # data_version is only written by F() updates; a full save of a loaded
+        # user would otherwise write back the version it read and undo bumps
+        full_update = not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+        if full_update and not self._state.adding:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'data_version'
+            ]
+        super().save(*args, **kwargs)
     
     def deactivate_account(self, reason=""):
         """Deactivate user account"""
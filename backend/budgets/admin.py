@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Budget, BudgetCategory, BudgetAlert
+from .models import Budget, BudgetCategory, BudgetAlert, BudgetAlertEvent
 
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
@@ -20,3 +20,9 @@ class BudgetAlertAdmin(admin.ModelAdmin):
     list_filter = ('alert_type', 'is_active')
     search_fields = ('budget_category__category__name',)
     list_select_related = ('budget_category', 'budget_category__category')
+
+@admin.register(BudgetAlertEvent)
+class BudgetAlertEventAdmin(admin.ModelAdmin):
+    list_display = ('alert', 'threshold', 'spent_amount', 'budgeted_amount', 'triggered_at')
+    list_filter = ('alert__alert_type',)
+    list_select_related = ('alert', 'alert__budget_category', 'alert__budget_category__category')
@@ -0,0 +1,72 @@
+"""
+Evaluation of budget alerts against the spend of their allocations
+"""
+from django.db.models import Exists, OuterRef
+from .models import BudgetAlert, BudgetAlertEvent
+
+EVALUATION_BATCH_SIZE = 1000
+
+
+def unfired_alerts():
+    """Active alerts whose current threshold has not fired yet"""
+    return BudgetAlert.objects.filter(is_active=True).exclude(
+        Exists(BudgetAlertEvent.objects.filter(alert=OuterRef('pk'), threshold=OuterRef('threshold')))
+    ).select_related('budget_category')
+
+
+def alert_limit(alert):
+    """Return the spend at which an alert fires"""
+    allocation = alert.budget_category
+    if alert.alert_type == 'PERCENTAGE':
+        return allocation.amount * alert.threshold / 100
+    return alert.threshold
+
+
+def evaluate_alerts(alerts):
+    """
+    Record an event for every alert whose allocation spend reached its limit.
+
+    Spend is read from the allocation's maintained `spent_amount`, so this is
+    one query for the alerts plus an insert when some fire. The unique
+    (alert, threshold) constraint drops events that a concurrent evaluation
+    already recorded. Returns the new events.
+    """
+    events = [
+        BudgetAlertEvent(
+            alert=alert,
+            threshold=alert.threshold,
+            spent_amount=alert.budget_category.spent_amount,
+            budgeted_amount=alert.budget_category.amount,
+        )
+        for alert in alerts
+        if alert.budget_category.spent_amount >= alert_limit(alert)
+    ]
+    if events:
+        BudgetAlertEvent.objects.bulk_create(events, ignore_conflicts=True)
+    return events
+
+
+def evaluate_alerts_for_expense(user_id, category_id, date):
+    """Evaluate the alerts of the allocations an expense counts towards"""
+    return evaluate_alerts(unfired_alerts().filter(
+        budget_category__category_id=category_id,
+        budget_category__budget__user_id=user_id,
+        budget_category__budget__start_date__lte=date,
+        budget_category__budget__end_date__gte=date,
+    ))
+
+
+def evaluate_all_alerts(user_ids=None, batch_size=EVALUATION_BATCH_SIZE):
+    """Re-evaluate every unfired alert, e.g. after bulk imports; returns the number fired"""
+    alerts = unfired_alerts()
+    if user_ids is not None:
+        alerts = alerts.filter(budget_category__budget__user_id__in=user_ids)
+
+    fired = 0
+    last_id = 0
+    while True:
+        batch = list(alerts.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            return fired
+        fired += len(evaluate_alerts(batch))
+        last_id = batch[-1].id
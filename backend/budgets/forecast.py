@@ -0,0 +1,119 @@
+"""
+End-of-period spend forecasts for budget allocations
+"""
+import numpy as np
+from django.db.models import BooleanField, ExpressionWrapper, Q, Sum
+from django.utils import timezone
+from transactions.models import Transaction
+from transactions.recurring import normalize_frequency, occurrence_dates
+
+
+def forecast_budgets(user, budgets, today=None):
+    """
+    Project the end-of-period spend of every allocation of `budgets`.
+
+    Expenses are read with one query grouped by category, day and whether
+    they come from a recurring transaction, and laid out as daily series per
+    category. Each allocation's projection is its spend so far, plus its
+    one-off spending pace applied to the days left, plus the recurring
+    expenses scheduled before the period ends, whether already materialized
+    or still due from their templates. All allocations are computed together
+    from cumulative sums of the series.
+
+    `budgets` must have their `categories` prefetched. Returns a mapping of
+    budget id -> forecast.
+    """
+    today = today or timezone.now().date()
+    allocations = [allocation for budget in budgets for allocation in budget.categories.all()]
+    forecasts = {
+        budget.id: {'projected_spent': 0.0, 'likely_over_budget': False, 'categories': []}
+        for budget in budgets
+    }
+    if not allocations:
+        return forecasts
+
+    first_day = min(budget.start_date for budget in budgets)
+    last_day = max(budget.end_date for budget in budgets)
+    days = (last_day - first_day).days + 1
+    category_ids = sorted({allocation.category_id for allocation in allocations})
+    category_index = {category_id: index for index, category_id in enumerate(category_ids)}
+
+    # Daily one-off and recurring spend per category
+    one_off = np.zeros((len(category_ids), days))
+    recurring = np.zeros((len(category_ids), days))
+    rows = Transaction.objects.filter(
+        user=user,
+        transaction_type='EXPENSE',
+        category_id__in=category_ids,
+        date__gte=first_day,
+        date__lte=last_day,
+    ).annotate(
+        recurring=ExpressionWrapper(
+            Q(is_recurring=True) | Q(recurring_template__isnull=False), output_field=BooleanField()
+        )
+    ).order_by().values('category_id', 'date', 'recurring').annotate(total=Sum('amount'))
+    for row in rows:
+        series = recurring if row['recurring'] else one_off
+        series[category_index[row['category_id']], (row['date'] - first_day).days] += float(abs(row['total']))
+
+    # Occurrences of recurring templates not materialized yet
+    templates = Transaction.objects.filter(
+        user=user,
+        transaction_type='EXPENSE',
+        category_id__in=category_ids,
+        is_recurring=True,
+        recurring_template__isnull=True,
+        date__lte=last_day,
+    ).exclude(recurring_frequency='').values(
+        'category_id', 'amount', 'date', 'recurring_frequency', 'materialized_until'
+    )
+    for template in templates:
+        frequency = normalize_frequency(template['recurring_frequency'])
+        if frequency is None:
+            continue
+        index = category_index[template['category_id']]
+        after = max(today, template['materialized_until'] or template['date'])
+        for occurrence in occurrence_dates(template['date'], frequency, after, last_day):
+            if occurrence >= first_day:
+                recurring[index, (occurrence - first_day).days] += float(abs(template['amount']))
+
+    # Cumulative sums with a leading zero column, so a range [a, b) sums to c[:, b] - c[:, a]
+    one_off_total = np.pad(np.cumsum(one_off, axis=1), ((0, 0), (1, 0)))
+    recurring_total = np.pad(np.cumsum(recurring, axis=1), ((0, 0), (1, 0)))
+
+    budget_by_id = {budget.id: budget for budget in budgets}
+    category = np.array([category_index[allocation.category_id] for allocation in allocations])
+    start = np.array([(budget_by_id[a.budget_id].start_date - first_day).days for a in allocations])
+    end = np.array([(budget_by_id[a.budget_id].end_date - first_day).days + 1 for a in allocations])
+    amount = np.array([float(allocation.amount) for allocation in allocations])
+    now = np.clip((today - first_day).days + 1, start, end)
+
+    one_off_to_date = one_off_total[category, now] - one_off_total[category, start]
+    recurring_to_date = recurring_total[category, now] - recurring_total[category, start]
+    one_off_ahead = one_off_total[category, end] - one_off_total[category, now]
+    scheduled_recurring = recurring_total[category, end] - recurring_total[category, now]
+    elapsed_days = now - start
+    remaining_days = end - now
+    daily_pace = np.divide(one_off_to_date, elapsed_days, out=np.zeros_like(amount), where=elapsed_days > 0)
+
+    spent_to_date = one_off_to_date + recurring_to_date
+    projected = spent_to_date + one_off_ahead + scheduled_recurring + daily_pace * remaining_days
+
+    for i, allocation in enumerate(allocations):
+        forecast = forecasts[allocation.budget_id]
+        forecast['projected_spent'] += projected[i]
+        forecast['categories'].append({
+            'category_id': allocation.category_id,
+            'category_name': allocation.category.name,
+            'budgeted_amount': round(float(amount[i]), 2),
+            'spent_to_date': round(float(spent_to_date[i]), 2),
+            'daily_pace': round(float(daily_pace[i]), 2),
+            'scheduled_recurring': round(float(scheduled_recurring[i]), 2),
+            'projected_spent': round(float(projected[i]), 2),
+            'projected_remaining': round(float(amount[i] - projected[i]), 2),
+            'likely_overrun': bool(projected[i] > amount[i]),
+        })
+    for budget_id, forecast in forecasts.items():
+        forecast['projected_spent'] = round(float(forecast['projected_spent']), 2)
+        forecast['likely_over_budget'] = forecast['projected_spent'] > float(budget_by_id[budget_id].total_amount)
+    return forecasts
@@ -0,0 +1 @@
+# Management commands for budgets app 
\ No newline at end of file
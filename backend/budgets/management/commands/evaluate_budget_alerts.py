@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from budgets.alerts import EVALUATION_BATCH_SIZE, evaluate_all_alerts
+
+class Command(BaseCommand):
+    help = 'Evaluate all active budget alerts against the current spend of their allocations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Email of specific user to evaluate alerts for'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EVALUATION_BATCH_SIZE,
+            help='Number of alerts evaluated per query'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User with email {options["user"]} does not exist')
+            user_ids = [user.id]
+
+        fired = evaluate_all_alerts(user_ids=user_ids, batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f'{fired} budget alerts fired'))
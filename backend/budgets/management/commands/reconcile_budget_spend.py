@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from budgets.models import BudgetCategory
+from budgets.spending import reconcile_allocations
+
+class Command(BaseCommand):
+    help = 'Verify the stored spend of budget allocations against transactions and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Email of specific user to reconcile budgets for'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of allocations checked per database transaction'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted allocations without repairing them'
+        )
+
+    def handle(self, *args, **options):
+        allocations = BudgetCategory.objects.all()
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User with email {options["user"]} does not exist')
+            allocations = allocations.filter(budget__user=user)
+
+        chunk_size = max(1, options['chunk_size'])
+        repair = not options['dry_run']
+        checked = 0
+        drifted = 0
+        last_id = 0
+        while True:
+            chunk_ids = list(
+                allocations.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not chunk_ids:
+                break
+            drifted += reconcile_allocations(BudgetCategory.objects.filter(id__in=chunk_ids), repair=repair)
+            checked += len(chunk_ids)
+            last_id = chunk_ids[-1]
+
+        if drifted and not repair:
+            self.stdout.write(self.style.WARNING(f'{drifted} of {checked} allocations have drifted'))
+        elif drifted:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {drifted} of {checked} allocations'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {checked} allocations are consistent'))
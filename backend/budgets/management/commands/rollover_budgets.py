@@ -0,0 +1,55 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from budgets.rollover import ROLLOVER_CHUNK_SIZE, rollover_budgets
+
+class Command(BaseCommand):
+    help = 'Clone expiring monthly, quarterly and yearly budgets into their next period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Email of specific user to roll budgets over for'
+        )
+        parser.add_argument(
+            '--as-of',
+            type=str,
+            help='Roll over budgets that ended by this date (YYYY-MM-DD, default today)'
+        )
+        parser.add_argument(
+            '--carry-forward',
+            action='store_true',
+            help='Add the unspent amount of each allocation to the next period'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=ROLLOVER_CHUNK_SIZE,
+            help='Number of budgets rolled over per database transaction'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(email=options['user']).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError(f'User with email {options["user"]} does not exist')
+
+        as_of = None
+        if options['as_of']:
+            try:
+                as_of = datetime.strptime(options['as_of'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid --as-of date. Use YYYY-MM-DD format.')
+
+        result = rollover_budgets(
+            as_of=as_of,
+            user_ids=user_ids,
+            carry_forward=options['carry_forward'],
+            chunk_size=max(1, options['chunk_size'])
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled over {result["budgets"]} budgets with {result["allocations"]} allocations '
+            f'in {result["elapsed_seconds"]}s'
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', 'is_active', 'start_date', 'end_date'], name='budget_user_active_period_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.13 on 2026-10-18 03:04
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+
+def backfill_spend(apps, schema_editor):
+    BudgetCategory = apps.get_model('budgets', 'BudgetCategory')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    expenses = Transaction.objects.filter(
+        user=OuterRef('budget__user'),
+        category=OuterRef('category'),
+        transaction_type='EXPENSE',
+        date__gte=OuterRef('budget__start_date'),
+        date__lte=OuterRef('budget__end_date'),
+    ).order_by().values('category')
+    allocations = []
+    for allocation in BudgetCategory.objects.annotate(
+        actual_spent=Subquery(expenses.annotate(total=Sum('amount')).values('total')),
+        actual_count=Subquery(expenses.annotate(count=Count('id')).values('count')),
+    ).iterator(chunk_size=1000):
+        if allocation.actual_count:
+            allocation.spent_amount = allocation.actual_spent
+            allocation.transaction_count = allocation.actual_count
+            allocations.append(allocation)
+    BudgetCategory.objects.bulk_update(allocations, ['spent_amount', 'transaction_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0002_hot_filter_indexes'),
+        ('transactions', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budgetcategory',
+            name='spent_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='budgetcategory',
+            name='transaction_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_spend, migrations.RunPython.noop),
+    ]
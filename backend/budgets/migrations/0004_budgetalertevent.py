@@ -0,0 +1,32 @@
+# Generated by Django 4.2.13 on 2026-10-18 03:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0003_budgetcategory_spend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetAlertEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('spent_amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('budgeted_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('triggered_at', models.DateTimeField(auto_now_add=True)),
+                ('alert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='budgets.budgetalert')),
+            ],
+            options={
+                'ordering': ['-triggered_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='budgetalertevent',
+            constraint=models.UniqueConstraint(fields=('alert', 'threshold'), name='unique_alert_event_threshold'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.13 on 2026-10-18 03:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budgets', '0004_budgetalertevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='rolled_over_from',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rolled_over_to', to='budgets.budget'),
+        ),
+        migrations.AddField(
+            model_name='budgetcategory',
+            name='carried_over',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['end_date', 'period_type'], name='budget_end_period_idx'),
+        ),
+    ]
@@ -24,6 +24,16 @@ class Budget(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    # The budget of the previous period this one was rolled over from
+    rolled_over_from = models.OneToOneField(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='rolled_over_to'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_active', 'start_date', 'end_date'], name='budget_user_active_period_idx'),
+            models.Index(fields=['end_date', 'period_type'], name='budget_end_period_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.period_type})"
@@ -35,6 +45,12 @@ class BudgetCategory(models.Model):
     budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='categories')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budget_allocations')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
+    # Expenses in the category during the budget period, kept up to date by
+    # budgets/signals.py and repaired by the reconcile_budget_spend command
+    spent_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    transaction_count = models.IntegerField(default=0, editable=False)
+    # Part of `amount` carried forward unspent from the previous period
+    carried_over = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True)
@@ -64,3 +80,22 @@ class BudgetAlert(models.Model):
 
     def __str__(self):
         return f"Alert for {self.budget_category.category.name} at {self.threshold}"
+
+class BudgetAlertEvent(models.Model):
+    """
+    A budget alert that fired, recorded once per alert threshold
+    """
+    alert = models.ForeignKey(BudgetAlert, on_delete=models.CASCADE, related_name='events')
+    threshold = models.DecimalField(max_digits=12, decimal_places=2)
+    spent_amount = models.DecimalField(max_digits=14, decimal_places=2)
+    budgeted_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    triggered_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-triggered_at']
+        constraints = [
+            models.UniqueConstraint(fields=['alert', 'threshold'], name='unique_alert_event_threshold'),
+        ]
+
+    def __str__(self):
+        return f"{self.alert} fired at {self.spent_amount}"
@@ -0,0 +1,181 @@
+"""
+Rollover of expiring budgets into their next period
+"""
+import calendar
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import transaction as db_transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from core.analytics_cache import bump_users_data_version
+from .alerts import evaluate_alerts, unfired_alerts
+from .models import Budget, BudgetCategory, BudgetAlert
+from .spending import reconcile_allocations
+
+ROLLOVER_CHUNK_SIZE = 500
+
+# Period type -> months per period
+ROLLOVER_PERIODS = {
+    'MONTHLY': 1,
+    'QUARTERLY': 3,
+    'YEARLY': 12,
+}
+
+
+def add_months(day, months):
+    """Return `day` moved by a number of months, clamped to the end of shorter months"""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def next_period(budget):
+    """Return the (start_date, end_date) of the period following a budget"""
+    start_date = budget.end_date + timedelta(days=1)
+    return start_date, add_months(start_date, ROLLOVER_PERIODS[budget.period_type]) - timedelta(days=1)
+
+
+class BudgetRollover:
+    """
+    Clone budgets that ended by `as_of` into their next period.
+
+    Source budgets are locked and read in keyset-ordered chunks across all
+    users; each chunk's budgets, allocations and alerts are written with one
+    bulk_create per model in a single database transaction. A budget is only
+    rolled over once: the clone references it through `rolled_over_from`,
+    which is unique, and sources that already have a clone are skipped, so the
+    run is safe to repeat. Budgets whose next period would already have ended
+    are left alone rather than filled in period by period.
+
+    With `carry_forward`, the unspent part of each allocation is added to the
+    planned amount of the next one and recorded as its `carried_over`.
+    """
+
+    def __init__(self, as_of=None, user_ids=None, carry_forward=False, chunk_size=ROLLOVER_CHUNK_SIZE):
+        self.as_of = as_of or timezone.now().date()
+        self.user_ids = user_ids
+        self.carry_forward = carry_forward
+        self.chunk_size = chunk_size
+        self.created_budget_ids = []
+        self.allocations = 0
+        self.touched_users = set()
+
+    def sources_queryset(self):
+        # Only budgets whose next period has not ended yet
+        recent = Q()
+        for period_type, months in ROLLOVER_PERIODS.items():
+            recent |= Q(period_type=period_type, end_date__gte=add_months(self.as_of, -months))
+        queryset = Budget.objects.filter(
+            recent, is_active=True, end_date__lte=self.as_of
+        ).exclude(
+            Exists(Budget.objects.filter(rolled_over_from=OuterRef('pk')))
+        )
+        if self.user_ids is not None:
+            queryset = queryset.filter(user_id__in=self.user_ids)
+        return queryset.order_by('id')
+
+    def run(self):
+        started = time.monotonic()
+        last_id = 0
+        while True:
+            last_id = self.rollover_chunk(last_id)
+            if last_id is None:
+                break
+
+        # bulk_create skips post_save, so cached analytics are invalidated here
+        if self.touched_users:
+            bump_users_data_version(self.touched_users)
+
+        return {
+            'budgets': len(self.created_budget_ids),
+            'allocations': self.allocations,
+            'elapsed_seconds': round(time.monotonic() - started, 3),
+        }
+
+    def build_budget(self, source, allocations):
+        start_date, end_date = next_period(source)
+        total_amount = source.total_amount
+        if self.carry_forward:
+            total_amount += sum(
+                allocation.carried_over - source_allocation.carried_over
+                for source_allocation, allocation in allocations
+            )
+        return Budget(
+            user_id=source.user_id,
+            name=source.name,
+            period_type=source.period_type,
+            start_date=start_date,
+            end_date=end_date,
+            total_amount=total_amount,
+            notes=source.notes,
+            rolled_over_from=source,
+        )
+
+    def build_allocation(self, source_allocation):
+        amount = source_allocation.amount
+        carried_over = Decimal('0')
+        if self.carry_forward:
+            planned = amount - source_allocation.carried_over
+            carried_over = max(amount - source_allocation.spent_amount, Decimal('0'))
+            amount = planned + carried_over
+        return BudgetCategory(
+            category_id=source_allocation.category_id,
+            amount=amount,
+            carried_over=carried_over,
+            notes=source_allocation.notes,
+        )
+
+    def rollover_chunk(self, last_id):
+        """Roll over the next chunk of budgets after `last_id`; return the new position"""
+        with db_transaction.atomic():
+            # Budgets locked by a concurrent run are left to that run
+            sources = list(
+                self.sources_queryset().select_for_update(skip_locked=True).filter(id__gt=last_id)[:self.chunk_size]
+            )
+            if not sources:
+                return None
+
+            source_allocations = {}
+            for allocation in BudgetCategory.objects.filter(budget__in=sources).order_by('id'):
+                source_allocations.setdefault(allocation.budget_id, []).append(
+                    (allocation, self.build_allocation(allocation))
+                )
+            budgets = Budget.objects.bulk_create([
+                self.build_budget(source, source_allocations.get(source.id, [])) for source in sources
+            ])
+
+            allocations = []
+            alerts_by_source = {}
+            for source, budget in zip(sources, budgets):
+                for source_allocation, allocation in source_allocations.get(source.id, []):
+                    allocation.budget = budget
+                    allocations.append(allocation)
+                    alerts_by_source[source_allocation.id] = allocation
+            BudgetCategory.objects.bulk_create(allocations)
+            BudgetAlert.objects.bulk_create([
+                BudgetAlert(
+                    budget_category=alerts_by_source[alert.budget_category_id],
+                    alert_type=alert.alert_type,
+                    threshold=alert.threshold,
+                )
+                for alert in BudgetAlert.objects.filter(budget_category_id__in=alerts_by_source, is_active=True)
+            ])
+
+            # Expenses already recorded in the new periods
+            new_allocations = BudgetCategory.objects.filter(budget__in=budgets)
+            reconcile_allocations(new_allocations)
+            budget_ids = [budget.id for budget in budgets]
+            db_transaction.on_commit(
+                lambda: evaluate_alerts(unfired_alerts().filter(budget_category__budget_id__in=budget_ids))
+            )
+
+        self.created_budget_ids.extend(budget_ids)
+        self.allocations += len(allocations)
+        self.touched_users.update(source.user_id for source in sources)
+        return sources[-1].id
+
+
+def rollover_budgets(as_of=None, user_ids=None, carry_forward=False, chunk_size=ROLLOVER_CHUNK_SIZE):
+    """Roll every expiring budget over into its next period; safe to re-run"""
+    return BudgetRollover(as_of, user_ids, carry_forward, chunk_size).run()
@@ -1,15 +1,27 @@
+from django.db import transaction as db_transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Budget, BudgetCategory, BudgetAlert
+from core.analytics_cache import bump_user_data_version
+from transactions.models import Category
+from .models import Budget, BudgetCategory, BudgetAlert, BudgetAlertEvent
+from .signals import bulk_allocation_writes
+from .spending import reconcile_allocations
 
 class BudgetCategorySerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     
     class Meta:
         model = BudgetCategory
-        fields = ['id', 'category', 'category_name', 'amount', 'notes', 'created_at', 'updated_at']
-        read_only_fields = ('id', 'created_at', 'updated_at', 'category_name')
+        fields = ['id', 'category', 'category_name', 'amount', 'carried_over', 'spent_amount', 'transaction_count',
+                  'notes', 'created_at', 'updated_at']
+        read_only_fields = ('id', 'created_at', 'updated_at', 'category_name', 'carried_over', 'spent_amount',
+                            'transaction_count')
 
 class BudgetCategoryCreateSerializer(serializers.ModelSerializer):
+    # Looked up for all allocations at once by BudgetSerializer
+    category = serializers.IntegerField(source='category_id')
+
     class Meta:
         model = BudgetCategory
         fields = ['category', 'amount', 'notes']
@@ -20,6 +32,16 @@ class BudgetAlertSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+class BudgetAlertEventSerializer(serializers.ModelSerializer):
+    budget_category = serializers.IntegerField(source='alert.budget_category_id', read_only=True)
+    alert_type = serializers.CharField(source='alert.alert_type', read_only=True)
+
+    class Meta:
+        model = BudgetAlertEvent
+        fields = ['id', 'alert', 'budget_category', 'alert_type', 'threshold', 'spent_amount',
+                  'budgeted_amount', 'triggered_at']
+        read_only_fields = fields
+
 class BudgetSerializer(serializers.ModelSerializer):
     categories = BudgetCategorySerializer(many=True, read_only=True)
     category_allocations = BudgetCategoryCreateSerializer(many=True, write_only=True, required=False)
@@ -27,34 +49,84 @@ class BudgetSerializer(serializers.ModelSerializer):
     class Meta:
         model = Budget
         fields = ['id', 'name', 'period_type', 'start_date', 'end_date', 'total_amount', 
-                 'notes', 'is_active', 'created_at', 'updated_at', 'categories', 'category_allocations']
-        read_only_fields = ('id', 'created_at', 'updated_at', 'user', 'categories')
+                 'notes', 'is_active', 'rolled_over_from', 'created_at', 'updated_at', 'categories',
+                 'category_allocations']
+        read_only_fields = ('id', 'created_at', 'updated_at', 'user', 'rolled_over_from', 'categories')
+
+    def validate_category_allocations(self, value):
+        category_ids = [allocation['category_id'] for allocation in value]
+        if len(set(category_ids)) != len(category_ids):
+            raise serializers.ValidationError('Each category can only be allocated once per budget.')
+        missing = set(category_ids) - set(Category.objects.filter(id__in=category_ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(f'Invalid category: {", ".join(map(str, sorted(missing)))}.')
+        return value
+
+    def to_representation(self, instance):
+        # Edits clear the viewset's prefetch; avoid a category query per allocation
+        if 'categories' not in getattr(instance, '_prefetched_objects_cache', {}):
+            prefetch_related_objects([instance], 'categories__category')
+        return super().to_representation(instance)
 
     def create(self, validated_data):
         category_allocations = validated_data.pop('category_allocations', [])
-        budget = Budget.objects.create(**validated_data)
-        
-        # Create budget categories if provided
-        for allocation in category_allocations:
-            BudgetCategory.objects.create(budget=budget, **allocation)
-        
+        with db_transaction.atomic():
+            budget = Budget.objects.create(**validated_data)
+            if category_allocations:
+                self.sync_allocations(budget, category_allocations)
         return budget
 
     def update(self, instance, validated_data):
         category_allocations = validated_data.pop('category_allocations', None)
-        
-        # Update budget fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        
-        # Update category allocations if provided
-        if category_allocations is not None:
-            # Delete existing allocations
-            instance.categories.all().delete()
-            
-            # Create new allocations
-            for allocation in category_allocations:
-                BudgetCategory.objects.create(budget=instance, **allocation)
-        
-        return instance 
\ No newline at end of file
+        with db_transaction.atomic():
+            # Update budget fields
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+
+            if category_allocations is not None:
+                self.sync_allocations(instance, category_allocations)
+        return instance
+
+    def sync_allocations(self, budget, category_allocations):
+        """
+        Make the allocations of a budget match the submitted ones, keyed by
+        category. Unchanged rows are left alone, so allocation IDs and their
+        alerts survive an edit; changed rows are written with one bulk_update,
+        new ones with one bulk_create and removed ones with one delete.
+        """
+        existing = {allocation.category_id: allocation for allocation in budget.categories.all()}
+        submitted = {allocation['category_id']: allocation for allocation in category_allocations}
+
+        created = []
+        changed = []
+        for category_id, values in submitted.items():
+            allocation = existing.get(category_id)
+            if allocation is None:
+                created.append(BudgetCategory(budget=budget, **values))
+                continue
+            new_notes = values.get('notes', allocation.notes)
+            if allocation.amount != values['amount'] or allocation.notes != new_notes:
+                allocation.amount = values['amount']
+                allocation.notes = new_notes
+                # bulk_update skips auto_now
+                allocation.updated_at = timezone.now()
+                changed.append(allocation)
+        removed = [category_id for category_id in existing if category_id not in submitted]
+
+        if removed:
+            # One bump below instead of one per deleted row
+            with bulk_allocation_writes(budget.id):
+                BudgetCategory.objects.filter(budget=budget, category_id__in=removed).delete()
+        if changed:
+            # Their alerts are re-evaluated on commit by the budget's post_save
+            BudgetCategory.objects.bulk_update(changed, ['amount', 'notes', 'updated_at'])
+        if created:
+            BudgetCategory.objects.bulk_create(created)
+            # bulk_create skips post_save, so count the existing expenses here
+            reconcile_allocations(BudgetCategory.objects.filter(
+                budget=budget, category_id__in=[allocation.category_id for allocation in created]
+            ))
+        if removed or changed or created:
+            bump_user_data_version(budget.user_id)
+            getattr(budget, '_prefetched_objects_cache', {}).pop('categories', None)
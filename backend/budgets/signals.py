@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction as db_transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.analytics_cache import bump_user_data_version
+from transactions.models import Transaction
+from transactions.signals import transactions_bulk_created
+from .alerts import evaluate_alerts, evaluate_alerts_for_expense, evaluate_all_alerts, unfired_alerts
+from .models import Budget, BudgetCategory, BudgetAlert
+from .spending import add_spend_delta, apply_spend_deltas, reconcile_allocations
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def invalidate_analytics_cache_for_budget(sender, instance, raw=False, **kwargs):
+    """Make cached analytics of the owner stale after a budget changes"""
+    if not raw:
+        bump_user_data_version(instance.user_id)
+
+
+# Budgets whose allocations are being written in bulk; the writer bumps the owner once
+_bulk_allocation_budgets = ContextVar('bulk_allocation_budgets', default=frozenset())
+
+
+@contextmanager
+def bulk_allocation_writes(budget_id):
+    """Skip the per-row cache invalidation of allocation signals for a budget"""
+    token = _bulk_allocation_budgets.set(_bulk_allocation_budgets.get() | {budget_id})
+    try:
+        yield
+    finally:
+        _bulk_allocation_budgets.reset(token)
+
+
+@receiver(post_save, sender=BudgetCategory)
+@receiver(post_delete, sender=BudgetCategory)
+def invalidate_analytics_cache_for_allocation(sender, instance, raw=False, **kwargs):
+    """Make cached analytics of the owner stale after a budget allocation changes"""
+    if raw or instance.budget_id in _bulk_allocation_budgets.get():
+        return
+    if BudgetCategory.budget.is_cached(instance):
+        user_id = instance.budget.user_id
+    else:
+        user_id = Budget.objects.filter(pk=instance.budget_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        bump_user_data_version(user_id)
+
+
+@receiver(post_save, sender=Budget)
+def recompute_spend_for_budget(sender, instance, created, raw=False, **kwargs):
+    """The budget period may have changed, so recount its allocations"""
+    if not raw and not created:
+        reconcile_allocations(BudgetCategory.objects.filter(budget=instance))
+
+
+@receiver(post_save, sender=BudgetCategory)
+def recompute_spend_for_allocation(sender, instance, raw=False, **kwargs):
+    """Count the existing expenses of a new or edited allocation"""
+    if raw:
+        return
+    reconcile_allocations(BudgetCategory.objects.filter(pk=instance.pk))
+    instance.refresh_from_db(fields=['spent_amount', 'transaction_count'])
+
+
+@receiver(post_save, sender=Transaction)
+def update_spend_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move an expense between the allocations covering its old and new values"""
+    if raw:
+        return
+    deltas = {}
+    # Stored values before the save, captured by transactions.signals
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        add_spend_delta(deltas, Transaction(**previous), sign=-1)
+    add_spend_delta(deltas, instance)
+    apply_spend_deltas(deltas)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_spend_on_delete(sender, instance, origin=None, **kwargs):
+    """Remove a deleted expense from the allocations covering it"""
+    # Cascades from deleting a user remove the allocations as well
+    if not (isinstance(origin, Transaction) or (isinstance(origin, QuerySet) and origin.model is Transaction)):
+        return
+    deltas = {}
+    add_spend_delta(deltas, instance, sign=-1)
+    apply_spend_deltas(deltas)
+
+
+@receiver(transactions_bulk_created)
+def update_spend_on_bulk_create(sender, transactions, **kwargs):
+    """Count the expenses written by bulk importers"""
+    deltas = {}
+    for transaction in transactions:
+        add_spend_delta(deltas, transaction)
+    apply_spend_deltas(deltas)
+
+
+@receiver(post_save, sender=Transaction)
+def evaluate_alerts_on_save(sender, instance, raw=False, **kwargs):
+    """Check the alerts an expense counts towards once it is committed"""
+    if raw or instance.transaction_type != 'EXPENSE' or instance.category_id is None:
+        return
+    user_id, category_id = instance.user_id, instance.category_id
+    date = Transaction._meta.get_field('date').to_python(instance.date)
+    db_transaction.on_commit(lambda: evaluate_alerts_for_expense(user_id, category_id, date))
+
+
+@receiver(transactions_bulk_created)
+def evaluate_alerts_on_bulk_create(sender, transactions, **kwargs):
+    """Re-evaluate the alerts of the users a bulk import wrote expenses for"""
+    user_ids = {t.user_id for t in transactions if t.transaction_type == 'EXPENSE' and t.category_id}
+    if user_ids:
+        db_transaction.on_commit(lambda: evaluate_all_alerts(user_ids=user_ids))
+
+
+@receiver(post_save, sender=BudgetAlert)
+def evaluate_alert_on_save(sender, instance, raw=False, **kwargs):
+    """A new or edited alert may already be past its threshold"""
+    if not raw:
+        alert_id = instance.pk
+        db_transaction.on_commit(lambda: evaluate_alerts(unfired_alerts().filter(pk=alert_id)))
+
+
+@receiver(post_save, sender=BudgetCategory)
+def evaluate_alerts_on_allocation_save(sender, instance, raw=False, **kwargs):
+    """A changed allocation amount or recount moves the limits of its alerts"""
+    if not raw:
+        allocation_id = instance.pk
+        db_transaction.on_commit(lambda: evaluate_alerts(unfired_alerts().filter(budget_category_id=allocation_id)))
+
+
+@receiver(post_save, sender=Budget)
+def evaluate_alerts_on_budget_save(sender, instance, created, raw=False, **kwargs):
+    """A changed budget period recounts the spend of every allocation"""
+    if not raw and not created:
+        budget_id = instance.pk
+        db_transaction.on_commit(lambda: evaluate_alerts(unfired_alerts().filter(budget_category__budget_id=budget_id)))
@@ -0,0 +1,159 @@
+"""
+Aggregation of expenses against budget allocations.
+
+Every BudgetCategory carries the sum and number of its user's expenses in its
+category during the budget period (`spent_amount`, `transaction_count`), so
+budget screens read them instead of aggregating transactions. Transaction
+writes adjust them with F() increments through `apply_spend_deltas`; budget and
+allocation edits recompute the affected rows; the reconcile_budget_spend command
+repairs any drift.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from transactions.models import Transaction
+from .models import Budget, BudgetCategory
+
+
+def spend_key(user_id, category_id, date):
+    """Return the key an expense with these values is counted under"""
+    return (user_id, category_id, date)
+
+
+def add_spend_delta(deltas, transaction, sign=1):
+    """Add an expense to a mapping of spend key -> (total, count) deltas"""
+    if transaction.transaction_type != 'EXPENSE' or transaction.category_id is None:
+        return
+    date = Transaction._meta.get_field('date').to_python(transaction.date)
+    key = spend_key(transaction.user_id, transaction.category_id, date)
+    total, count = deltas.get(key, (0, 0))
+    deltas[key] = (total + sign * Decimal(str(transaction.amount)), count + sign)
+
+
+def apply_spend_deltas(deltas):
+    """
+    Add spend deltas to every allocation whose budget covers the expense date.
+
+    The matching allocations are found in one query; their increments are then
+    written as F() expressions in a single bulk update, so concurrent writers
+    never overwrite each other's changes.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not deltas:
+        return
+
+    by_user_category = defaultdict(list)
+    for (user_id, category_id, date), delta in deltas.items():
+        by_user_category[(user_id, category_id)].append((date, delta))
+    dates = [date for _, _, date in deltas]
+
+    allocations = BudgetCategory.objects.filter(
+        budget__user_id__in={user_id for user_id, _, _ in deltas},
+        category_id__in={category_id for _, category_id, _ in deltas},
+        budget__start_date__lte=max(dates),
+        budget__end_date__gte=min(dates),
+    ).values_list('id', 'budget__user_id', 'category_id', 'budget__start_date', 'budget__end_date')
+
+    updates = []
+    for allocation_id, user_id, category_id, start_date, end_date in allocations:
+        total = 0
+        count = 0
+        for date, (delta_total, delta_count) in by_user_category.get((user_id, category_id), ()):
+            if start_date <= date <= end_date:
+                total += delta_total
+                count += delta_count
+        if total or count:
+            updates.append(BudgetCategory(
+                id=allocation_id,
+                spent_amount=F('spent_amount') + total,
+                transaction_count=F('transaction_count') + count,
+            ))
+
+    if len(updates) == 1:
+        allocation = updates[0]
+        BudgetCategory.objects.filter(id=allocation.id).update(
+            spent_amount=allocation.spent_amount,
+            transaction_count=allocation.transaction_count,
+        )
+    elif updates:
+        BudgetCategory.objects.bulk_update(updates, ['spent_amount', 'transaction_count'], batch_size=500)
+
+
+def annotate_actual_spend(queryset):
+    """Annotate allocations with `actual_spent` and `actual_count` computed from the transactions"""
+    expenses = Transaction.objects.filter(
+        user=OuterRef('budget__user'),
+        category=OuterRef('category'),
+        transaction_type='EXPENSE',
+        date__gte=OuterRef('budget__start_date'),
+        date__lte=OuterRef('budget__end_date'),
+    ).order_by().values('category')
+    return queryset.annotate(
+        actual_spent=Subquery(expenses.annotate(total=Sum('amount')).values('total')),
+        actual_count=Subquery(expenses.annotate(count=Count('id')).values('count')),
+    )
+
+
+def reconcile_allocations(queryset, repair=True):
+    """
+    Compare the stored spend of allocations with the transactions and, when
+    `repair` is set, overwrite the rows that drifted. Returns the number of
+    drifted rows.
+    """
+    with db_transaction.atomic():
+        if repair:
+            # Hold concurrent increments back until the corrected values are written
+            queryset = queryset.select_for_update(of=('self',))
+        drifted = []
+        for allocation in annotate_actual_spend(queryset.order_by()):
+            actual_spent = allocation.actual_spent or Decimal('0')
+            actual_count = allocation.actual_count or 0
+            if allocation.spent_amount != actual_spent or allocation.transaction_count != actual_count:
+                allocation.spent_amount = actual_spent
+                allocation.transaction_count = actual_count
+                drifted.append(allocation)
+        if repair and drifted:
+            BudgetCategory.objects.bulk_update(drifted, ['spent_amount', 'transaction_count'], batch_size=500)
+    return len(drifted)
+
+
+def budget_history(user, start_date, end_date):
+    """
+    Return the budgets of a user overlapping a date range, each with its
+    allocations and their spend, ordered by period.
+
+    Spend is read from the maintained allocation totals, so this is a single
+    query whose size depends on the number of budgets and allocations, not on
+    the number of transactions.
+    """
+    rows = Budget.objects.filter(
+        user=user, start_date__lte=end_date, end_date__gte=start_date
+    ).order_by('start_date', 'id', 'categories__category__name').values(
+        'id', 'name', 'period_type', 'start_date', 'end_date', 'total_amount',
+        'categories__category_id', 'categories__category__name', 'categories__amount',
+        'categories__spent_amount', 'categories__transaction_count',
+    )
+
+    budgets = {}
+    for row in rows:
+        budget = budgets.setdefault(row['id'], {
+            'id': row['id'],
+            'name': row['name'],
+            'period_type': row['period_type'],
+            'start_date': row['start_date'],
+            'end_date': row['end_date'],
+            'total_amount': row['total_amount'],
+            'allocations': [],
+        })
+        # Budgets without allocations come back as a single row of NULLs
+        if row['categories__category_id'] is not None:
+            budget['allocations'].append({
+                'category_id': row['categories__category_id'],
+                'category_name': row['categories__category__name'],
+                'amount': row['categories__amount'],
+                'spent_amount': row['categories__spent_amount'],
+                'transaction_count': row['categories__transaction_count'],
+            })
+    return list(budgets.values())
+
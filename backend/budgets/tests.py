@@ -1,3 +1,757 @@
 from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from decimal import Decimal
+from datetime import date, timedelta
+from contextlib import redirect_stdout
+from io import StringIO
+from django.core.management import call_command
+from rest_framework.test import APITestCase, APIClient
+from core.testing import QueryPlanAssertions
+from transactions.models import Category, Transaction
+from transactions.imports import TransactionImporter
+from transactions.signals import transactions_bulk_created
+from .alerts import evaluate_alerts_for_expense, evaluate_all_alerts
+from .forecast import forecast_budgets
+from .models import Budget, BudgetCategory, BudgetAlert, BudgetAlertEvent
+from .rollover import rollover_budgets
+from .spending import reconcile_allocations
+
+User = get_user_model()
 
 # Create your tests here.
+
+
+class BudgetSpendingAnalysisTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='budgetuser',
+            email='budget@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        self.other = Category.objects.create(name='Other', user=self.user)
+        self.budget = Budget.objects.create(
+            user=self.user, name='March', period_type='MONTHLY',
+            start_date=date(2024, 3, 1), end_date=date(2024, 3, 31), total_amount=Decimal('500.00')
+        )
+        BudgetCategory.objects.create(budget=self.budget, category=self.food, amount=Decimal('300.00'))
+        BudgetCategory.objects.create(budget=self.budget, category=self.travel, amount=Decimal('100.00'))
+        self.url = f'/api/budgets/budgets/{self.budget.id}/spending_analysis/'
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_expenses(self, count, category, amount='10.00', day=date(2024, 3, 10)):
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, amount=Decimal(amount), description='Expense',
+                category=category, transaction_type='EXPENSE', date=day
+            )
+            for _ in range(count)
+        ])
+        transactions_bulk_created.send(sender=Transaction, transactions=transactions)
+
+    def test_breakdown(self):
+        self.add_expenses(3, self.food)
+        self.add_expenses(2, self.travel, amount='60.00')
+        self.add_expenses(4, self.other)  # not allocated
+        self.add_expenses(1, self.food, day=date(2024, 4, 1))  # outside the period
+
+        response = self.client.get(self.url)
+        breakdown = {row['category_name']: row for row in response.data['category_breakdown']}
+        self.assertEqual(breakdown['Food']['spent_amount'], 30.0)
+        self.assertEqual(breakdown['Food']['transaction_count'], 3)
+        self.assertEqual(breakdown['Travel']['spent_amount'], 120.0)
+        self.assertTrue(breakdown['Travel']['is_over_budget'])
+        self.assertEqual(response.data['overall_progress']['total_spent'], 150.0)
+        self.assertEqual(len(response.data['recent_transactions']), 5)
+
+    def test_queries_and_output_do_not_grow_with_transactions(self):
+        self.add_expenses(2, self.food)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+
+        self.add_expenses(500, self.food)
+        self.add_expenses(500, self.travel)
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as many, redirect_stdout(stdout):
+            response = self.client.get(self.url)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertEqual(response.data['overall_progress']['total_spent'], 10020.0)
+
+    def test_diagnostics_are_logged_at_debug(self):
+        self.add_expenses(2, self.food)
+        with self.assertLogs('budgets.views', level='DEBUG') as logs:
+            self.client.get(self.url)
+        self.assertIn(f'budget={self.budget.id}', logs.output[0])
+        self.assertIn('transactions=2', logs.output[0])
+
+
+class BudgetCategorySpendTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='spenduser',
+            email='spend@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        self.march = Budget.objects.create(
+            user=self.user, name='March', period_type='MONTHLY',
+            start_date=date(2024, 3, 1), end_date=date(2024, 3, 31), total_amount=Decimal('500.00')
+        )
+        self.quarter = Budget.objects.create(
+            user=self.user, name='Q1', period_type='QUARTERLY',
+            start_date=date(2024, 1, 1), end_date=date(2024, 3, 31), total_amount=Decimal('1500.00')
+        )
+        self.march_food = BudgetCategory.objects.create(budget=self.march, category=self.food, amount=Decimal('300.00'))
+        self.quarter_food = BudgetCategory.objects.create(budget=self.quarter, category=self.food, amount=Decimal('900.00'))
+        self.march_travel = BudgetCategory.objects.create(budget=self.march, category=self.travel, amount=Decimal('100.00'))
+
+    def spend(self, allocation):
+        allocation.refresh_from_db()
+        return allocation.spent_amount, allocation.transaction_count
+
+    def add_expense(self, amount, category, day):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Expense',
+            category=category, transaction_type='EXPENSE', date=day
+        )
+
+    def test_transaction_writes_adjust_every_matching_allocation(self):
+        lunch = self.add_expense('20.00', self.food, date(2024, 3, 5))
+        self.add_expense('15.00', self.food, date(2024, 2, 5))
+        self.assertEqual(self.spend(self.march_food), (Decimal('20.00'), 1))
+        self.assertEqual(self.spend(self.quarter_food), (Decimal('35.00'), 2))
+
+        lunch.category = self.travel
+        lunch.amount = Decimal('25.00')
+        lunch.save()
+        self.assertEqual(self.spend(self.march_food), (Decimal('0.00'), 0))
+        self.assertEqual(self.spend(self.march_travel), (Decimal('25.00'), 1))
+        self.assertEqual(self.spend(self.quarter_food), (Decimal('15.00'), 1))
+
+        lunch.transaction_type = 'INCOME'
+        lunch.save()
+        self.assertEqual(self.spend(self.march_travel), (Decimal('0.00'), 0))
+
+        Transaction.objects.filter(user=self.user).delete()
+        self.assertEqual(self.spend(self.quarter_food), (Decimal('0.00'), 0))
+
+    def test_imports_are_counted(self):
+        lines = StringIO(
+            'date,description,amount,category\n'
+            '2024-03-02,Market,-12.50,Food\n'
+            '2024-01-20,Market,-7.50,food\n'
+            '2024-03-03,Salary,1000.00,\n'
+        )
+        TransactionImporter(self.user).import_file(lines, 'csv')
+        self.assertEqual(self.spend(self.march_food), (Decimal('12.50'), 1))
+        self.assertEqual(self.spend(self.quarter_food), (Decimal('20.00'), 2))
+
+    def test_budget_and_allocation_changes_recount(self):
+        self.add_expense('40.00', self.food, date(2024, 4, 10))
+        self.assertEqual(self.spend(self.march_food), (Decimal('0.00'), 0))
+
+        self.march.end_date = date(2024, 4, 30)
+        self.march.save()
+        self.assertEqual(self.spend(self.march_food), (Decimal('40.00'), 1))
+
+        april = Budget.objects.create(
+            user=self.user, name='April', period_type='MONTHLY',
+            start_date=date(2024, 4, 1), end_date=date(2024, 4, 30), total_amount=Decimal('500.00')
+        )
+        allocation = BudgetCategory.objects.create(budget=april, category=self.food, amount=Decimal('100.00'))
+        self.assertEqual(allocation.spent_amount, Decimal('40.00'))
+
+    def test_reconcile_command_repairs_drift(self):
+        self.add_expense('20.00', self.food, date(2024, 3, 5))
+        BudgetCategory.objects.filter(pk=self.march_food.pk).update(spent_amount=Decimal('999.00'), transaction_count=7)
+        self.assertEqual(reconcile_allocations(BudgetCategory.objects.all(), repair=False), 1)
+
+        out = StringIO()
+        call_command('reconcile_budget_spend', chunk_size=1, stdout=out)
+        self.assertIn('Repaired 1 of 3 allocations', out.getvalue())
+        self.assertEqual(self.spend(self.march_food), (Decimal('20.00'), 1))
+
+        out = StringIO()
+        call_command('reconcile_budget_spend', stdout=out)
+        self.assertIn('All 3 allocations are consistent', out.getvalue())
+
+
+class BudgetDashboardOverviewTestCase(APITestCase):
+    url = '/api/budgets/budgets/dashboard_overview/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='overviewuser',
+            email='overview@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_budget(self, month, categories, total='100.00'):
+        budget = Budget.objects.create(
+            user=self.user, name=f'Month {month}', period_type='MONTHLY',
+            start_date=date(2024, month, 1), end_date=date(2024, month, 28), total_amount=Decimal(total)
+        )
+        for category in categories:
+            BudgetCategory.objects.create(budget=budget, category=category, amount=Decimal('50.00'))
+        return budget
+
+    def add_expense(self, amount, category, day):
+        Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Expense',
+            category=category, transaction_type='EXPENSE', date=day
+        )
+
+    def test_spend_per_budget(self):
+        march = self.add_budget(3, [self.food, self.travel])
+        april = self.add_budget(4, [self.food])
+        self.add_budget(5, [])
+        self.add_expense('40.00', self.food, date(2024, 3, 5))
+        self.add_expense('70.00', self.travel, date(2024, 3, 6))
+        self.add_expense('95.00', self.food, date(2024, 4, 2))
+        self.add_expense('30.00', self.travel, date(2024, 4, 2))  # not allocated in April
+
+        response = self.client.get(self.url)
+        overviews = {budget['id']: budget for budget in response.data['budgets']}
+        self.assertEqual(overviews[march.id]['total_spent'], 110.0)
+        self.assertEqual(overviews[march.id]['status'], 'over_budget')
+        self.assertEqual(overviews[march.id]['category_count'], 2)
+        self.assertEqual(overviews[april.id]['total_spent'], 95.0)
+        self.assertEqual(overviews[april.id]['status'], 'warning')
+        self.assertEqual(len(overviews), 3)
+        self.assertEqual(response.data['summary']['on_track_count'], 1)
+
+    def test_query_count_is_constant(self):
+        self.add_budget(1, [self.food, self.travel])
+        cache.clear()
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(self.url)
+
+        for i in range(29):
+            self.add_budget(i % 12 + 1, [self.food, self.travel])
+            self.add_expense('5.00', self.food, date(2024, i % 12 + 1, 3))
+        cache.clear()
+        with CaptureQueriesContext(connection) as thirty:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['budgets']), 30)
+        self.assertEqual(len(thirty), len(one))
+
+
+class BudgetQueryPlanTestCase(QueryPlanAssertions, APITestCase):
+    """The active-budget lookups must keep using their index"""
+
+    def setUp(self):
+        users = [
+            User.objects.create_user(username=f'budgetplan{i}', email=f'budgetplan{i}@example.com', password='testpass123')
+            for i in range(5)
+        ]
+        self.user = users[0]
+        Budget.objects.bulk_create([
+            Budget(
+                user=user, name=f'Budget {i}', period_type='MONTHLY',
+                start_date=date(2023, 1, 1) + timedelta(days=30 * i),
+                end_date=date(2023, 1, 1) + timedelta(days=30 * i + 29),
+                total_amount=Decimal('1000.00'), is_active=i % 4 != 0
+            )
+            for user in users
+            for i in range(40)
+        ])
+        self.analyze()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_active_budgets_for_a_date(self):
+        self.assertRequestUsesIndexes('/api/budgets/budgets/dashboard_overview/', table='budgets_budget')
+        self.assertRequestUsesIndexes('/api/budgets/budgets/forecast/', table='budgets_budget')
+        # Budgets active today
+        self.assertRequestUsesIndexes('/api/reports/reports/budget_vs_actual/', table='budgets_budget')
+
+
+class BudgetAlertEvaluationTestCase(QueryPlanAssertions, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='alertuser',
+            email='alert@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        self.budget = Budget.objects.create(
+            user=self.user, name='March', period_type='MONTHLY',
+            start_date=date(2024, 3, 1), end_date=date(2024, 3, 31), total_amount=Decimal('500.00')
+        )
+        self.food_allocation = BudgetCategory.objects.create(budget=self.budget, category=self.food, amount=Decimal('200.00'))
+        self.travel_allocation = BudgetCategory.objects.create(budget=self.budget, category=self.travel, amount=Decimal('100.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.percentage = BudgetAlert.objects.create(
+                budget_category=self.food_allocation, alert_type='PERCENTAGE', threshold=Decimal('80.00')
+            )
+            self.amount = BudgetAlert.objects.create(
+                budget_category=self.food_allocation, alert_type='AMOUNT', threshold=Decimal('190.00')
+            )
+            self.travel_alert = BudgetAlert.objects.create(
+                budget_category=self.travel_allocation, alert_type='PERCENTAGE', threshold=Decimal('50.00')
+            )
+
+    def add_expense(self, amount, category=None, day=date(2024, 3, 10)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Transaction.objects.create(
+                user=self.user, amount=Decimal(amount), description='Expense',
+                category=category or self.food, transaction_type='EXPENSE', date=day
+            )
+
+    def fired(self):
+        return set(BudgetAlertEvent.objects.values_list('alert_id', flat=True))
+
+    def test_alerts_fire_once_when_spend_crosses_threshold(self):
+        self.add_expense('150.00')
+        self.assertEqual(self.fired(), set())
+
+        self.add_expense('10.00')
+        self.assertEqual(self.fired(), {self.percentage.id})
+        event = BudgetAlertEvent.objects.get(alert=self.percentage)
+        self.assertEqual(event.spent_amount, Decimal('160.00'))
+        self.assertEqual(event.budgeted_amount, Decimal('200.00'))
+
+        self.add_expense('40.00')
+        self.add_expense('5.00')
+        self.assertEqual(self.fired(), {self.percentage.id, self.amount.id})
+        self.assertEqual(BudgetAlertEvent.objects.count(), 2)
+
+    def test_expenses_outside_the_budget_are_ignored(self):
+        self.add_expense('500.00', day=date(2024, 4, 1))
+        income = Transaction.objects.create(
+            user=self.user, amount=Decimal('500.00'), description='Refund',
+            category=self.food, transaction_type='INCOME', date=date(2024, 3, 10)
+        )
+        self.assertIsNotNone(income.pk)
+        self.assertEqual(self.fired(), set())
+
+    def test_raised_threshold_fires_again(self):
+        self.add_expense('170.00')
+        self.assertEqual(self.fired(), {self.percentage.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.percentage.threshold = Decimal('90.00')
+            self.percentage.save()
+        self.add_expense('10.00')
+        self.assertEqual(
+            list(self.percentage.events.order_by('threshold').values_list('threshold', flat=True)),
+            [Decimal('80.00'), Decimal('90.00')]
+        )
+
+    def test_bulk_created_expenses_are_evaluated_in_batch(self):
+        expenses = Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, amount=Decimal('60.00'), description='Imported',
+                category=category, transaction_type='EXPENSE', date=date(2024, 3, 12)
+            )
+            for category in (self.food, self.food, self.food, self.travel)
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            transactions_bulk_created.send(sender=Transaction, transactions=expenses)
+        self.assertEqual(self.fired(), {self.percentage.id, self.travel_alert.id})
+
+    def test_evaluate_all_alerts_and_command(self):
+        BudgetCategory.objects.filter(pk=self.travel_allocation.pk).update(spent_amount=Decimal('60.00'))
+        self.assertEqual(evaluate_all_alerts(batch_size=1), 1)
+        self.assertEqual(evaluate_all_alerts(), 0)
+
+        BudgetCategory.objects.filter(pk=self.food_allocation.pk).update(spent_amount=Decimal('195.00'))
+        out = StringIO()
+        with redirect_stdout(out):
+            call_command('evaluate_budget_alerts', user='alert@example.com', stdout=out)
+        self.assertIn('2 budget alerts fired', out.getvalue())
+
+    def test_alert_events_endpoint(self):
+        self.add_expense('170.00')
+        response = self.client.get('/api/budgets/budget-alert-events/')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['alert'], self.percentage.id)
+        self.assertEqual(results[0]['budget_category'], self.food_allocation.id)
+
+    def test_per_write_evaluation_overhead(self):
+        """Looking up and checking the alerts of one expense stays cheap as alerts grow"""
+        with CaptureQueriesContext(connection) as queries:
+            self.add_expense('1.00')
+        queries_per_write = len(queries)
+
+        categories = Category.objects.bulk_create([
+            Category(name=f'Category {i}', user=self.user) for i in range(50)
+        ])
+        budgets = Budget.objects.bulk_create([
+            Budget(
+                user=self.user, name=f'Budget {i}', period_type='MONTHLY',
+                start_date=date(2023, 1, 1) + timedelta(days=30 * i),
+                end_date=date(2023, 1, 1) + timedelta(days=30 * i + 29),
+                total_amount=Decimal('1000.00')
+            )
+            for i in range(12)
+        ])
+        allocations = BudgetCategory.objects.bulk_create([
+            BudgetCategory(budget=budget, category=category, amount=Decimal('100.00'))
+            for budget in budgets for category in categories
+        ])
+        BudgetAlert.objects.bulk_create([
+            BudgetAlert(budget_category=allocation, alert_type='PERCENTAGE', threshold=threshold)
+            for allocation in allocations for threshold in (Decimal('50.00'), Decimal('90.00'))
+        ])
+        self.analyze()
+
+        day = date(2023, 6, 15)
+        with CaptureQueriesContext(connection) as queries:
+            evaluate_alerts_for_expense(self.user.id, categories[0].id, day)
+        self.assertEqual(len(queries), 1)
+        self.assertQueriesUseIndexes(queries)
+
+        # A whole expense write, signals and alert evaluation included, costs
+        # the same number of queries as with a single budget
+        for category in categories[:10]:
+            with CaptureQueriesContext(connection) as queries:
+                self.add_expense('1.00', category=category, day=day)
+            self.assertEqual(len(queries), queries_per_write, [query['sql'] for query in queries])
+
+
+class BudgetAllocationSyncTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='syncuser',
+            email='sync@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.categories = Category.objects.bulk_create([
+            Category(name=f'Category {i}', user=self.user) for i in range(55)
+        ])
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('30.00'), description='Lunch',
+            category=self.categories[2], transaction_type='EXPENSE', date=date(2024, 3, 5)
+        )
+
+    def create_budget(self, count):
+        response = self.client.post('/api/budgets/budgets/', {
+            'name': 'March', 'period_type': 'MONTHLY', 'start_date': '2024-03-01',
+            'end_date': '2024-03-31', 'total_amount': '5000.00',
+            'category_allocations': [
+                {'category': category.id, 'amount': '100.00'} for category in self.categories[:count]
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Budget.objects.get(pk=response.data['id'])
+
+    def allocations(self, budget):
+        return {
+            allocation.category_id: allocation
+            for allocation in BudgetCategory.objects.filter(budget=budget)
+        }
+
+    def test_create_counts_existing_spend(self):
+        budget = self.create_budget(3)
+        allocations = self.allocations(budget)
+        self.assertEqual(len(allocations), 3)
+        self.assertEqual(allocations[self.categories[2].id].spent_amount, Decimal('30.00'))
+        self.assertEqual(allocations[self.categories[2].id].transaction_count, 1)
+
+    def test_update_keeps_unchanged_allocations(self):
+        budget = self.create_budget(3)
+        before = self.allocations(budget)
+        alert = BudgetAlert.objects.create(
+            budget_category=before[self.categories[0].id], alert_type='AMOUNT', threshold=Decimal('50.00')
+        )
+
+        response = self.client.patch(f'/api/budgets/budgets/{budget.id}/', {
+            'category_allocations': [
+                {'category': self.categories[0].id, 'amount': '100.00'},
+                {'category': self.categories[2].id, 'amount': '150.00', 'notes': 'Raised'},
+                {'category': self.categories[3].id, 'amount': '75.00'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['categories']), 3)
+
+        after = self.allocations(budget)
+        self.assertEqual(set(after), {self.categories[i].id for i in (0, 2, 3)})
+        self.assertEqual(after[self.categories[0].id].id, before[self.categories[0].id].id)
+        self.assertEqual(after[self.categories[0].id].updated_at, before[self.categories[0].id].updated_at)
+        self.assertTrue(BudgetAlert.objects.filter(pk=alert.pk).exists())
+        changed = after[self.categories[2].id]
+        self.assertEqual(changed.id, before[self.categories[2].id].id)
+        self.assertEqual((changed.amount, changed.notes), (Decimal('150.00'), 'Raised'))
+        self.assertEqual(changed.spent_amount, Decimal('30.00'))
+        self.assertEqual(after[self.categories[3].id].amount, Decimal('75.00'))
+
+    def test_duplicate_categories_are_rejected(self):
+        budget = self.create_budget(1)
+        response = self.client.patch(f'/api/budgets/budgets/{budget.id}/', {
+            'category_allocations': [
+                {'category': self.categories[0].id, 'amount': '100.00'},
+                {'category': self.categories[0].id, 'amount': '200.00'},
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.allocations(budget)[self.categories[0].id].amount, Decimal('100.00'))
+
+    def edit_queries(self, count, removed=5):
+        """Queries writing an edit that changes every kept allocation, adds five and removes `removed`"""
+        budget = self.create_budget(count)
+        payload = [
+            {'category': category.id, 'amount': '120.00'} for category in self.categories[removed:count + 5]
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/budgets/budgets/{budget.id}/', {'category_allocations': payload}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.allocations(budget)), count - removed + 5)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def reset(self):
+        BudgetCategory.objects.all().delete()
+        Budget.objects.all().delete()
+
+    def test_edit_query_count_is_flat(self):
+        small = self.edit_queries(10)
+        self.reset()
+        large = self.edit_queries(50)
+        writes = [sql for sql in large if sql.startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(len([sql for sql in writes if sql.startswith('INSERT INTO "budgets_budgetcategory"')]), 1)
+        self.assertEqual(len([sql for sql in writes if sql.startswith('DELETE FROM "budgets_budgetcategory"')]), 1)
+        self.assertEqual(len(large), len(small))
+
+        # Nor with the number of removed allocations
+        self.reset()
+        self.assertEqual(len(self.edit_queries(50, removed=45)), len(small))
+
+
+class BudgetRolloverTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rolloveruser',
+            email='rollover@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        self.march = self.create_budget(self.user, 'MONTHLY', date(2024, 3, 1), date(2024, 3, 31))
+        self.food_allocation = BudgetCategory.objects.create(budget=self.march, category=self.food, amount=Decimal('300.00'))
+        BudgetCategory.objects.create(budget=self.march, category=self.travel, amount=Decimal('100.00'))
+        BudgetAlert.objects.create(budget_category=self.food_allocation, alert_type='PERCENTAGE', threshold=Decimal('80.00'))
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('120.00'), description='Groceries',
+            category=self.food, transaction_type='EXPENSE', date=date(2024, 3, 10)
+        )
+
+    def create_budget(self, user, period_type, start_date, end_date, **kwargs):
+        return Budget.objects.create(
+            user=user, name=f'{period_type} budget', period_type=period_type,
+            start_date=start_date, end_date=end_date, total_amount=Decimal('400.00'), **kwargs
+        )
+
+    def rolled_over(self, budget):
+        return Budget.objects.get(rolled_over_from=budget)
+
+    def allocations(self, budget):
+        return {
+            allocation.category_id: allocation
+            for allocation in BudgetCategory.objects.filter(budget=budget)
+        }
+
+    def test_rollover_clones_into_next_period_once(self):
+        quarter = self.create_budget(self.user, 'QUARTERLY', date(2024, 1, 1), date(2024, 3, 31))
+        year = self.create_budget(self.user, 'YEARLY', date(2023, 4, 1), date(2024, 3, 31))
+        self.create_budget(self.user, 'CUSTOM', date(2024, 3, 1), date(2024, 3, 31))
+        self.create_budget(self.user, 'MONTHLY', date(2024, 2, 1), date(2024, 2, 29), is_active=False)
+        self.create_budget(self.user, 'MONTHLY', date(2023, 1, 1), date(2023, 1, 31))
+
+        result = rollover_budgets(as_of=date(2024, 3, 31))
+        self.assertEqual((result['budgets'], result['allocations']), (3, 2))
+
+        april = self.rolled_over(self.march)
+        self.assertEqual((april.start_date, april.end_date), (date(2024, 4, 1), date(2024, 4, 30)))
+        self.assertEqual((april.name, april.total_amount), (self.march.name, Decimal('400.00')))
+        allocations = self.allocations(april)
+        self.assertEqual(allocations[self.food.id].amount, Decimal('300.00'))
+        self.assertEqual(allocations[self.food.id].spent_amount, Decimal('0.00'))
+        self.assertEqual(allocations[self.travel.id].amount, Decimal('100.00'))
+        self.assertEqual(
+            list(BudgetAlert.objects.filter(budget_category=allocations[self.food.id]).values_list('threshold', flat=True)),
+            [Decimal('80.00')]
+        )
+        self.assertEqual(self.rolled_over(quarter).end_date, date(2024, 6, 30))
+        self.assertEqual(self.rolled_over(year).end_date, date(2025, 3, 31))
+
+        self.assertEqual(rollover_budgets(as_of=date(2024, 4, 1))['budgets'], 0)
+        self.assertEqual(Budget.objects.filter(user=self.user).count(), 9)
+
+    def test_carry_forward_accumulates_unspent_amounts(self):
+        rollover_budgets(as_of=date(2024, 3, 31), carry_forward=True)
+        april = self.rolled_over(self.march)
+        food = self.allocations(april)[self.food.id]
+        self.assertEqual((food.amount, food.carried_over), (Decimal('480.00'), Decimal('180.00')))
+        self.assertEqual(self.allocations(april)[self.travel.id].amount, Decimal('200.00'))
+        self.assertEqual(april.total_amount, Decimal('680.00'))
+
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('500.00'), description='Party',
+            category=self.food, transaction_type='EXPENSE', date=date(2024, 5, 2)
+        )
+        rollover_budgets(as_of=date(2024, 4, 30), carry_forward=True)
+        may = self.rolled_over(april)
+        food = self.allocations(may)[self.food.id]
+        # Planned 300 plus everything left unspent in April
+        self.assertEqual((food.amount, food.carried_over), (Decimal('780.00'), Decimal('480.00')))
+        self.assertEqual((food.spent_amount, food.transaction_count), (Decimal('500.00'), 1))
+        self.assertEqual(may.total_amount, Decimal('1080.00'))
+
+    def test_rollover_action_is_scoped_to_the_user(self):
+        today = timezone.now().date()
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        other_budget = self.create_budget(other, 'MONTHLY', today - timedelta(days=30), today - timedelta(days=1))
+        self.create_budget(self.user, 'MONTHLY', today - timedelta(days=30), today - timedelta(days=1))
+        self.create_budget(self.user, 'MONTHLY', today, today + timedelta(days=29))
+
+        response = self.client.post('/api/budgets/budgets/rollover/', {'carry_forward': True}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['budgets'], 1)
+        self.assertEqual(response.data['created'][0]['start_date'], today.isoformat())
+        self.assertFalse(Budget.objects.filter(rolled_over_from=other_budget).exists())
+
+        response = self.client.post('/api/budgets/budgets/rollover/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['budgets'], 0)
+
+    def test_command_query_count_does_not_grow_with_users(self):
+        def seed(count):
+            users = User.objects.bulk_create([
+                User(username=f'bulk{count}-{i}', email=f'bulk{count}-{i}@example.com') for i in range(count)
+            ])
+            budgets = Budget.objects.bulk_create([
+                Budget(
+                    user=user, name='Monthly', period_type='MONTHLY', start_date=date(2024, 5, 1),
+                    end_date=date(2024, 5, 31), total_amount=Decimal('400.00')
+                )
+                for user in users
+            ])
+            BudgetCategory.objects.bulk_create([
+                BudgetCategory(budget=budget, category=category, amount=Decimal('50.00'))
+                for budget in budgets for category in (self.food, self.travel)
+            ])
+
+        def run():
+            with CaptureQueriesContext(connection) as queries:
+                with redirect_stdout(StringIO()):
+                    call_command('rollover_budgets', as_of='2024-05-31', stdout=StringIO())
+            return len(queries)
+
+        seed(3)
+        small = run()
+        seed(40)
+        self.assertEqual(run(), small)
+        self.assertEqual(Budget.objects.filter(start_date=date(2024, 6, 1)).count(), 43)
+
+
+class BudgetForecastTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='forecastuser',
+            email='forecast@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        self.march = self.add_budget(date(2024, 3, 1), date(2024, 3, 31))
+        # Weekly fare, materialized up to the 8th
+        template = self.add_expense('10.00', self.travel, date(2024, 3, 1), is_recurring=True,
+                                    recurring_frequency='WEEKLY')
+        self.add_expense('10.00', self.travel, date(2024, 3, 8), recurring_template=template)
+        Transaction.objects.filter(pk=template.pk).update(materialized_until=date(2024, 3, 8))
+        self.add_expense('100.00', self.food, date(2024, 3, 2))
+
+    def add_budget(self, start_date, end_date):
+        budget = Budget.objects.create(
+            user=self.user, name=f'{start_date:%B}', period_type='MONTHLY',
+            start_date=start_date, end_date=end_date, total_amount=Decimal('350.00')
+        )
+        BudgetCategory.objects.create(budget=budget, category=self.food, amount=Decimal('300.00'))
+        BudgetCategory.objects.create(budget=budget, category=self.travel, amount=Decimal('100.00'))
+        return budget
+
+    def add_expense(self, amount, category, day, **kwargs):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Expense',
+            category=category, transaction_type='EXPENSE', date=day, **kwargs
+        )
+
+    def budgets(self):
+        return list(Budget.objects.filter(user=self.user).prefetch_related('categories__category').order_by('start_date'))
+
+    def test_projection_combines_pace_and_recurring_expenses(self):
+        forecast = forecast_budgets(self.user, self.budgets(), today=date(2024, 3, 10))[self.march.id]
+        food, travel = sorted(forecast['categories'], key=lambda row: row['category_name'])
+
+        # 100 over 10 days, continued for the remaining 21
+        self.assertEqual((food['spent_to_date'], food['daily_pace']), (100.0, 10.0))
+        self.assertEqual(food['projected_spent'], 310.0)
+        self.assertTrue(food['likely_overrun'])
+        # Two fares so far and three still due, with no one-off pace
+        self.assertEqual((travel['spent_to_date'], travel['scheduled_recurring']), (20.0, 30.0))
+        self.assertEqual(travel['projected_spent'], 50.0)
+        self.assertFalse(travel['likely_overrun'])
+        self.assertEqual(forecast['projected_spent'], 360.0)
+        self.assertTrue(forecast['likely_over_budget'])
+
+    def test_past_and_future_periods(self):
+        february = self.add_budget(date(2024, 2, 1), date(2024, 2, 29))
+        april = self.add_budget(date(2024, 4, 1), date(2024, 4, 30))
+        self.add_expense('40.00', self.food, date(2024, 2, 10))
+
+        forecasts = forecast_budgets(self.user, self.budgets(), today=date(2024, 3, 10))
+        self.assertEqual(forecasts[february.id]['projected_spent'], 40.0)
+        # Fares on April 5, 12, 19 and 26
+        self.assertEqual(forecasts[april.id]['projected_spent'], 40.0)
+
+    def test_queries_do_not_grow_with_budgets(self):
+        for month in range(4, 13):
+            self.add_budget(date(2024, month, 1), date(2024, month, 28))
+        budgets = self.budgets()
+        with CaptureQueriesContext(connection) as queries:
+            forecasts = forecast_budgets(self.user, budgets, today=date(2024, 3, 10))
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(len(forecasts), 10)
+
+    def test_forecast_endpoints(self):
+        response = self.client.get('/api/budgets/budgets/forecast/', {'budget': self.march.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([budget['budget_id'] for budget in response.data['budgets']], [self.march.id])
+        self.assertEqual(len(response.data['budgets'][0]['categories']), 2)
+
+        response = self.client.get('/api/budgets/budgets/forecast/', {'budget': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/api/budgets/budgets/dashboard_overview/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('projected_spent', response.data['budgets'][0])
+        self.assertIn('likely_over_budget', response.data['budgets'][0])
+
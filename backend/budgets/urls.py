@@ -1,9 +1,10 @@
 from rest_framework.routers import DefaultRouter
-from .views import BudgetViewSet, BudgetCategoryViewSet, BudgetAlertViewSet
+from .views import BudgetViewSet, BudgetCategoryViewSet, BudgetAlertViewSet, BudgetAlertEventViewSet
 
 router = DefaultRouter()
 router.register(r'budgets', BudgetViewSet, basename='budgets')
 router.register(r'budget-categories', BudgetCategoryViewSet, basename='budget-categories')
 router.register(r'budget-alerts', BudgetAlertViewSet, basename='budget-alerts')
+router.register(r'budget-alert-events', BudgetAlertEventViewSet, basename='budget-alert-events')
 
 urlpatterns = router.urls 
\ No newline at end of file
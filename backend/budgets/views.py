@@ -1,14 +1,21 @@
+import logging
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Budget, BudgetCategory, BudgetAlert
-from .serializers import BudgetSerializer, BudgetCategorySerializer, BudgetAlertSerializer
+from decimal import Decimal
+from .models import Budget, BudgetCategory, BudgetAlert, BudgetAlertEvent
+from .forecast import forecast_budgets
+from .rollover import BudgetRollover
+from .serializers import BudgetSerializer, BudgetCategorySerializer, BudgetAlertSerializer, BudgetAlertEventSerializer
 from transactions.models import Transaction
 from transactions.serializers import TransactionSerializer
+from core.analytics_cache import cached_analytics
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
@@ -17,7 +24,7 @@ class BudgetViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user)
+        return Budget.objects.filter(user=self.request.user).prefetch_related('categories__category')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -26,60 +33,35 @@ class BudgetViewSet(viewsets.ModelViewSet):
     def spending_analysis(self, request, pk=None):
         """Get spending analysis for a specific budget"""
         budget = self.get_object()
-        
-        print(f"Analyzing budget: {budget.name} (ID: {budget.id})")
-        print(f"Budget period: {budget.start_date} to {budget.end_date}")
-        
-        # Get budget categories first
         budget_categories = budget.categories.all()
-        print(f"Budget has {budget_categories.count()} category allocations")
-        
-        # Get category IDs allocated to this budget (filter out None categories)
-        allocated_category_ids = [bc.category.id for bc in budget_categories if bc.category]
-        print(f"Allocated category IDs: {allocated_category_ids}")
-        
-        # Get transactions within budget period AND only for allocated categories
-        if allocated_category_ids:
-            transactions = Transaction.objects.filter(
-                user=request.user,
-                transaction_type='EXPENSE',
-                date__gte=budget.start_date,
-                date__lte=budget.end_date,
-                category__id__in=allocated_category_ids  # Only include transactions for allocated categories
-            )
-        else:
-            # If no categories are allocated to this budget, no transactions should be counted
-            transactions = Transaction.objects.none()
-            print(f"No categories allocated to budget {budget.name}, so no transactions counted")
-        
-        print(f"Found {transactions.count()} transactions in budget period for allocated categories")
-        for t in transactions:
-            print(f"  - {t.description}: ${t.amount} ({t.category.name}) on {t.date}")
-        
-        # Calculate total spending for this budget (only allocated categories)
-        total_spent = abs(transactions.aggregate(total=Sum('amount'))['total'] or 0)
-        print(f"Total spent for this budget's categories: ${total_spent}")
-        
+
+        # Expenses in the budget period for the allocated categories only
+        transactions = Transaction.objects.filter(
+            user=request.user,
+            transaction_type='EXPENSE',
+            date__gte=budget.start_date,
+            date__lte=budget.end_date,
+            category__budget_allocations__budget=budget
+        )
+
+        # Allocations carry their spend, maintained as transactions change
         category_spending = []
-        
+        total_spent = 0
         for budget_category in budget_categories:
-            print(f"Analyzing category: {budget_category.category.name} (budgeted: ${budget_category.amount})")
-            category_transactions = transactions.filter(category=budget_category.category)
-            print(f"  Found {category_transactions.count()} transactions for this category")
-            
-            spent_amount = abs(category_transactions.aggregate(total=Sum('amount'))['total'] or 0)
-            print(f"  Total spent: ${spent_amount}")
-            
+            spent_amount = abs(budget_category.spent_amount)
+            total_spent += spent_amount
+
             category_spending.append({
-                'category_id': budget_category.category.id,
+                'category_id': budget_category.category_id,
                 'category_name': budget_category.category.name,
                 'budgeted_amount': float(budget_category.amount),
                 'spent_amount': float(spent_amount),
                 'remaining_amount': float(budget_category.amount - spent_amount),
                 'percentage_used': float((spent_amount / budget_category.amount * 100) if budget_category.amount > 0 else 0),
-                'is_over_budget': spent_amount > budget_category.amount
+                'is_over_budget': spent_amount > budget_category.amount,
+                'transaction_count': budget_category.transaction_count
             })
-        
+
         # Calculate overall budget progress (using only allocated category spending)
         budget_progress = {
             'total_budgeted': float(budget.total_amount),
@@ -90,50 +72,35 @@ class BudgetViewSet(viewsets.ModelViewSet):
             'days_remaining': (budget.end_date - timezone.now().date()).days,
             'daily_average_spent': float(total_spent / max(1, (timezone.now().date() - budget.start_date).days)) if timezone.now().date() > budget.start_date else 0
         }
-        
-        print(f"Budget progress: {budget_progress}")
-        
+
+        logger.debug(
+            'spending_analysis budget=%s user=%s period=%s..%s categories=%s transactions=%s total_spent=%s',
+            budget.id, request.user.id, budget.start_date, budget.end_date, len(category_spending),
+            sum(row['transaction_count'] for row in category_spending), total_spent
+        )
+
         return Response({
             'budget': BudgetSerializer(budget).data,
             'overall_progress': budget_progress,
             'category_breakdown': category_spending,
             'recent_transactions': TransactionSerializer(
-                transactions.order_by('-date')[:10], 
+                transactions.select_related('category').defer('search_vector').order_by('-date', '-id')[:10],
                 many=True
-            ).data if 'TransactionSerializer' in globals() else []
+            ).data
         })
 
     @action(detail=False, methods=['get'])
+    @cached_analytics
     def dashboard_overview(self, request):
         """Get overview of all budgets with spending data"""
-        budgets = self.get_queryset().filter(is_active=True)
+        budgets = list(self.get_queryset().filter(is_active=True).order_by('id'))
+        forecasts = forecast_budgets(request.user, budgets)
         budget_overviews = []
-        
+
         for budget in budgets:
-            try:
-                # Get category IDs allocated to this budget
-                budget_categories = budget.categories.all()
-                allocated_category_ids = [bc.category.id for bc in budget_categories if bc.category]
-                
-                # Get transactions for this budget period AND only for allocated categories
-                if allocated_category_ids:
-                    transactions = Transaction.objects.filter(
-                        user=request.user,
-                        transaction_type='EXPENSE',
-                        date__gte=budget.start_date,
-                        date__lte=budget.end_date,
-                        category__id__in=allocated_category_ids  # Only include transactions for allocated categories
-                    )
-                else:
-                    # If no categories are allocated to this budget, no transactions should be counted
-                    transactions = Transaction.objects.none()
-                
-                total_spent = abs(transactions.aggregate(total=Sum('amount'))['total'] or 0)
-            except Exception as e:
-                print(f"Error processing budget {budget.id}: {e}")
-                # If there's an error, set default values
-                total_spent = 0
-            
+            allocations = budget.categories.all()
+            total_spent = abs(sum(allocation.spent_amount for allocation in allocations))
+
             budget_overviews.append({
                 'id': budget.id,
                 'name': budget.name,
@@ -141,11 +108,15 @@ class BudgetViewSet(viewsets.ModelViewSet):
                 'start_date': budget.start_date,
                 'end_date': budget.end_date,
                 'total_budgeted': float(budget.total_amount),
+                'total_allocated': float(sum(allocation.amount for allocation in allocations)),
+                'category_count': len(allocations),
                 'total_spent': float(total_spent),
                 'percentage_used': float((total_spent / budget.total_amount * 100) if budget.total_amount > 0 else 0),
                 'is_over_budget': total_spent > budget.total_amount,
                 'days_remaining': (budget.end_date - timezone.now().date()).days,
-                'status': 'over_budget' if total_spent > budget.total_amount else 'on_track' if total_spent < float(budget.total_amount) * 0.9 else 'warning'
+                'projected_spent': forecasts[budget.id]['projected_spent'],
+                'likely_over_budget': forecasts[budget.id]['likely_over_budget'],
+                'status': 'over_budget' if total_spent > budget.total_amount else 'on_track' if total_spent < budget.total_amount * Decimal('0.9') else 'warning'
             })
         
         return Response({
@@ -158,6 +129,62 @@ class BudgetViewSet(viewsets.ModelViewSet):
             }
         })
 
+    @action(detail=False, methods=['get'])
+    @cached_analytics
+    def forecast(self, request):
+        """
+        Project the end-of-period spend of the active budgets.
+
+        GET /api/budgets/budgets/forecast/?budget=<id>
+
+        Each allocated category is projected from its spending pace so far
+        plus the recurring expenses due before the period ends, and flagged
+        when it is likely to overrun its allocation.
+        """
+        budgets = self.get_queryset().filter(is_active=True).order_by('start_date', 'id')
+        if request.query_params.get('budget'):
+            try:
+                budget_id = int(request.query_params['budget'])
+            except ValueError:
+                return Response({'error': 'budget must be an integer id.'}, status=status.HTTP_400_BAD_REQUEST)
+            budgets = budgets.filter(id=budget_id)
+        budgets = list(budgets)
+        forecasts = forecast_budgets(request.user, budgets)
+
+        return Response({
+            'date': timezone.now().date(),
+            'budgets': [
+                {
+                    'budget_id': budget.id,
+                    'budget_name': budget.name,
+                    'start_date': budget.start_date,
+                    'end_date': budget.end_date,
+                    'total_budgeted': float(budget.total_amount),
+                    **forecasts[budget.id],
+                }
+                for budget in budgets
+            ]
+        })
+
+    @action(detail=False, methods=['post'])
+    def rollover(self, request):
+        """
+        Roll the user's expiring budgets over into their next period.
+
+        POST /api/budgets/budgets/rollover/
+
+        Clones every active monthly, quarterly or yearly budget that has ended
+        and was not rolled over yet, with its allocations and alerts. With
+        `carry_forward` the unspent amount of each allocation is added to the
+        next period.
+        """
+        carry_forward = str(request.data.get('carry_forward', '')).lower() in ('1', 'true')
+        rollover = BudgetRollover(user_ids=[request.user.id], carry_forward=carry_forward)
+        result = rollover.run()
+        budgets = self.get_queryset().filter(id__in=rollover.created_budget_ids).order_by('id')
+        result['created'] = self.get_serializer(budgets, many=True).data
+        return Response(result, status=status.HTTP_201_CREATED if result['budgets'] else status.HTTP_200_OK)
+
 class BudgetCategoryViewSet(viewsets.ModelViewSet):
     serializer_class = BudgetCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -185,3 +212,16 @@ class BudgetAlertViewSet(viewsets.ModelViewSet):
         else:
             qs = qs.filter(budget_category__budget__user=self.request.user)
         return qs
+
+class BudgetAlertEventViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = BudgetAlertEventSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        qs = BudgetAlertEvent.objects.filter(
+            alert__budget_category__budget__user=self.request.user
+        ).select_related('alert')
+        alert_id = self.request.query_params.get('alert')
+        if alert_id:
+            qs = qs.filter(alert_id=alert_id)
+        return qs
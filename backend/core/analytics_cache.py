@@ -0,0 +1,148 @@
+"""
+Per-user caching of analytics responses.
+
+Analytics endpoints are pure functions of a user's data and the query
+parameters, so their responses are cached under a key built from the user, the
+endpoint, the normalized parameters, today's date and a per-user data version.
+Writes to the user's data bump the version (see the apps' signals modules), which
+makes every older entry unreachable without having to delete it. The version is
+a column of the user row, so every process sees a bump as soon as it commits,
+whichever cache backend is configured.
+
+Entries stay fresh for ANALYTICS_CACHE['TIMEOUT'] seconds. After that they are
+served stale for up to ANALYTICS_CACHE['STALE_TIMEOUT'] seconds while a
+background thread recomputes them. Entries from an older data version are never
+served.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from accounts.models import User
+
+KEY_PREFIX = 'analytics'
+STATS_KEYS = ('hit', 'miss', 'stale')
+DEFAULTS = {
+    'TIMEOUT': 300,
+    'STALE_TIMEOUT': 3600,
+    'BACKGROUND_REFRESH': True,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'ANALYTICS_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_user_data_version(user_id):
+    return User.objects.filter(pk=user_id).values_list('data_version', flat=True).first()
+
+
+def bump_user_data_version(user_id):
+    """
+    Invalidate every cached analytics response of a user.
+
+    The increment is part of the surrounding database transaction, so other
+    processes see the new version exactly when they can see the data that
+    caused it.
+    """
+    User.objects.filter(pk=user_id).update(data_version=F('data_version') + 1)
+
+
+def bump_users_data_version(user_ids):
+    """Invalidate the cached analytics of several users with one update"""
+    User.objects.filter(pk__in=list(user_ids)).update(data_version=F('data_version') + 1)
+
+
+def record_stat(name):
+    key = f'{KEY_PREFIX}:stats:{name}'
+    if cache.add(key, 1, timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def analytics_cache_stats():
+    """Return hit, miss and stale counters since the cache was last cleared"""
+    values = cache.get_many([f'{KEY_PREFIX}:stats:{name}' for name in STATS_KEYS])
+    return {name: values.get(f'{KEY_PREFIX}:stats:{name}', 0) for name in STATS_KEYS}
+
+
+def build_cache_key(user_id, endpoint, request, kwargs):
+    params = {
+        'query': sorted((key, sorted(request.query_params.getlist(key))) for key in request.query_params),
+        'kwargs': sorted((key, str(value)) for key, value in kwargs.items()),
+        'today': timezone.now().date().isoformat(),
+    }
+    digest = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{user_id}:{get_user_data_version(user_id)}:{endpoint}:{digest}'
+
+
+def schedule_refresh(refresh):
+    """Run a stale entry's refresh in a background thread"""
+    def run():
+        try:
+            refresh()
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def cached_analytics(view_func):
+    """
+    Cache the successful responses of a viewset action per user.
+
+    Apply it below @action so the router still sees the original action name.
+    """
+    endpoint = view_func.__qualname__
+
+    @functools.wraps(view_func)
+    def wrapper(self, request, *args, **kwargs):
+        user_id = request.user.pk
+        key = build_cache_key(user_id, endpoint, request, kwargs)
+        timeout = get_setting('TIMEOUT')
+
+        def compute():
+            response = view_func(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(
+                    key,
+                    {'data': response.data, 'fresh_until': time.time() + timeout},
+                    timeout=timeout + get_setting('STALE_TIMEOUT')
+                )
+            return response
+
+        entry = cache.get(key)
+        if entry is not None:
+            if entry['fresh_until'] > time.time():
+                record_stat('hit')
+                return Response(entry['data'], headers={'X-Cache': 'HIT'})
+            if get_setting('BACKGROUND_REFRESH'):
+                record_stat('stale')
+                lock_key = f'{key}:refreshing'
+                # Only one request per entry triggers the recomputation
+                if cache.add(lock_key, 1, timeout=60):
+                    def refresh():
+                        try:
+                            compute()
+                        finally:
+                            cache.delete(lock_key)
+                    schedule_refresh(refresh)
+                return Response(entry['data'], headers={'X-Cache': 'STALE'})
+
+        record_stat('miss')
+        response = compute()
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
@@ -103,6 +103,10 @@ DATABASES = {
     'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600, ssl_require=False)
 }
 
+# Covering indexes only carry their INCLUDE columns on PostgreSQL; elsewhere
+# they are plain indexes, which is fine for local SQLite databases
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -199,6 +203,47 @@ CACHES = {
     }
 }
 
+# Shared cache for multi-process deployments (requires the redis package)
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+# Analytics response cache (see core/analytics_cache.py)
+ANALYTICS_CACHE = {
+    'TIMEOUT': config('ANALYTICS_CACHE_TIMEOUT', default=300, cast=int),  # seconds an entry is fresh
+    'STALE_TIMEOUT': config('ANALYTICS_CACHE_STALE_TIMEOUT', default=3600, cast=int),  # seconds it may then be served stale
+    'BACKGROUND_REFRESH': True,
+}
+
+# Logging: the apps log key=value diagnostics on the logger of their module.
+# They are quiet by default; set APP_LOG_LEVEL=DEBUG to see them.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            'format': 'time=%(asctime)s level=%(levelname)s logger=%(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        app: {
+            'handlers': ['console'],
+            'level': config('APP_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        }
+        for app in ('accounts', 'transactions', 'budgets', 'reports', 'debts', 'core')
+    },
+}
+
 # Frontend URL for password reset and email verification
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:5173')
 
@@ -0,0 +1,75 @@
+"""
+Shared test helpers
+"""
+import re
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+SQLITE_FULL_SCAN_RE = re.compile(r'\bSCAN\b')
+
+
+class QueryPlanAssertions:
+    """
+    Assertions on the EXPLAIN output of the queries code really runs, so that
+    a change which stops a hot query from using its index fails the test
+    suite.
+
+    Queries are captured from a request to the endpoint (or a call to the
+    code under test) and explained as executed, filter backends, pagination
+    and all, rather than rebuilt by hand in the test.
+
+    On PostgreSQL sequential scans are disabled while explaining, which makes
+    the planner pick an index whenever one is usable even on the small seeded
+    tables of a test; a remaining "Seq Scan" means no index fits the query.
+    On SQLite any full table or index SCAN (as opposed to an index SEARCH)
+    fails.
+    """
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tests run inside a transaction, so this ends with the test
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                return '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertQueriesUseIndexes(self, queries, table=None, ordered=False):
+        """
+        Fail if a captured SELECT scans a whole table, or sorts rows when
+        `ordered` is set and the query has an ORDER BY. Only queries on
+        `table` are checked when it is given. Returns the checked SQL.
+        """
+        statements = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and (table is None or f'"{table}"' in query['sql'])
+        ]
+        self.assertTrue(statements, 'No queries to explain')
+        for sql in statements:
+            plan = self.explain(sql)
+            sorted_rows = ordered and 'ORDER BY' in sql
+            if connection.vendor == 'postgresql':
+                self.assertNotIn('Seq Scan', plan, f'Sequential scan in plan of {sql}:\n{plan}')
+                if sorted_rows:
+                    self.assertNotIn('Sort Key', plan, f'Sort instead of an ordered index scan in {sql}:\n{plan}')
+            elif connection.vendor == 'sqlite':
+                self.assertIsNone(SQLITE_FULL_SCAN_RE.search(plan), f'Full scan in plan of {sql}:\n{plan}')
+                if sorted_rows:
+                    self.assertNotIn(
+                        'TEMP B-TREE FOR ORDER BY', plan, f'Sort instead of an ordered index scan in {sql}:\n{plan}'
+                    )
+        return statements
+
+    def assertRequestUsesIndexes(self, path, data=None, table=None, ordered=False):
+        """GET `path` with the test client and check the queries it runs; returns the response"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, data)
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        self.assertQueriesUseIndexes(queries, table=table, ordered=ordered)
+        return response
+
+    def analyze(self):
+        """Refresh planner statistics after seeding"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
@@ -5,3 +5,6 @@ class DebtsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'debts'
     verbose_name = 'Debt Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.13 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('debts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='debttransaction',
+            index=models.Index(fields=['user', '-created_at'], name='debt_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='debttransaction',
+            index=models.Index(fields=['user', 'status', 'due_date'], name='debt_user_status_due_idx'),
+        ),
+    ]
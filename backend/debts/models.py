@@ -38,6 +38,10 @@ class DebtTransaction(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Debt Transaction'
         verbose_name_plural = 'Debt Transactions'
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='debt_user_created_idx'),
+            models.Index(fields=['user', 'status', 'due_date'], name='debt_user_status_due_idx'),
+        ]
     
     def __str__(self):
         return f"{self.person_name} - ${self.amount}"
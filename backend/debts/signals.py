@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.analytics_cache import bump_user_data_version
+from .models import DebtTransaction
+
+
+@receiver(post_save, sender=DebtTransaction)
+@receiver(post_delete, sender=DebtTransaction)
+def invalidate_analytics_cache(sender, instance, raw=False, **kwargs):
+    """Make cached debt statistics of the owner stale after a debt changes"""
+    if not raw:
+        bump_user_data_version(instance.user_id)
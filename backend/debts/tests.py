@@ -9,6 +9,7 @@ from decimal import Decimal
 from datetime import date, timedelta
 import json
 
+from core.testing import QueryPlanAssertions
 from .models import DebtTransaction
 
 User = get_user_model()
@@ -543,3 +544,37 @@ class DebtTransactionModelTestCase(TestCase):
         debt.refresh_from_db()
         self.assertIsNotNone(debt.paid_date)
         self.assertEqual(debt.status, 'PAID')
+
+
+class DebtTransactionQueryPlanTestCase(QueryPlanAssertions, APITestCase):
+    """The debt list and overdue lookups must keep using their indexes"""
+
+    def setUp(self):
+        users = [
+            User.objects.create_user(username=f'debtplan{i}', email=f'debtplan{i}@example.com', password='testpass123')
+            for i in range(5)
+        ]
+        self.user = users[0]
+        # bulk_create skips the model validation that rejects past due dates
+        DebtTransaction.objects.bulk_create([
+            DebtTransaction(
+                user=user, person_name=f'Person {i}', amount=Decimal('25.00'),
+                transaction_type='NEED_TO_GIVE' if i % 2 else 'NEED_TO_GET',
+                date_created=date(2023, 1, 1), due_date=date(2023, 1, 1) + timedelta(days=i),
+                status=('UNPAID', 'PAID', 'OVERDUE')[i % 3]
+            )
+            for user in users
+            for i in range(200)
+        ])
+        self.analyze()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list(self):
+        self.assertRequestUsesIndexes('/api/debts/', table='debts_debttransaction', ordered=True)
+
+    def test_overdue_lookup(self):
+        self.assertRequestUsesIndexes(
+            '/api/debts/', {'status': 'UNPAID', 'due_date_to': '2023-03-01'}, table='debts_debttransaction'
+        )
+        self.assertRequestUsesIndexes('/api/debts/overdue/', table='debts_debttransaction')
@@ -9,6 +9,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 import django_filters
 from datetime import datetime, timedelta
 
+from core.analytics_cache import cached_analytics
 from .models import DebtTransaction
 from .serializers import (
     DebtTransactionSerializer,
@@ -118,6 +119,7 @@ class DebtTransactionViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'])
+    @cached_analytics
     def statistics(self, request):
         """
         Get debt summary statistics for the authenticated user.
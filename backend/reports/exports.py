@@ -0,0 +1,171 @@
+"""
+Generation and expiry of report export files
+"""
+import csv
+import io
+import tempfile
+import time
+from datetime import timedelta
+from django.core.files import File
+from django.utils import timezone
+from openpyxl import Workbook
+from transactions.exports import EXPORT_FIELDS, EXPORT_HEADERS, TAGS_INDEX, export_rows
+from transactions.models import Transaction
+from transactions.views import TransactionFilter
+from .generators import run_report
+from .models import ReportExport
+
+EXPORT_EXPIRY = timedelta(days=7)
+EXPORT_PURGE_BATCH_SIZE = 500
+# Rows per worksheet, header included; Excel cannot open longer sheets
+XLSX_MAX_ROWS = 1048576
+
+
+# Report type -> (sheet title, key of the rows in the report result, columns)
+RESULT_TABLES = {
+    'INCOME_EXPENSE': ('Months', 'monthly_breakdown', ['month', 'income', 'expenses', 'net']),
+    'CATEGORY_BREAKDOWN': ('Categories', 'category_breakdown', ['category', 'amount', 'count', 'percentage']),
+    'CASH_FLOW': (
+        'Cash flow', 'cash_flow_data', ['month', 'income', 'expenses', 'net_cash_flow', 'transaction_count']
+    ),
+}
+BUDGET_HEADERS = ['budget_id', 'budget_name', 'start_date', 'end_date']
+BUDGET_CATEGORY_HEADERS = [
+    'category_id', 'category_name', 'budgeted_amount', 'actual_spending', 'transaction_count',
+    'variance', 'variance_percentage', 'utilization_percentage',
+]
+
+
+def custom_report_transactions(report):
+    """Transactions of a custom report's date range, filtered like the transaction list by its filters"""
+    queryset = Transaction.objects.filter(
+        user_id=report.user_id,
+        date__gte=report.date_range_start,
+        date__lte=report.date_range_end,
+    )
+    filterset = TransactionFilter(report.filters or {}, queryset=queryset)
+    if not filterset.is_valid():
+        raise ValueError(f'Report filters are invalid: {dict(filterset.errors)}')
+    return filterset.qs.order_by('date', 'id')
+
+
+def transaction_rows(queryset):
+    """Yield transactions as lists of export values"""
+    for row in export_rows(queryset):
+        values = [row[field] for field in EXPORT_FIELDS]
+        values[TAGS_INDEX] = ','.join(str(tag) for tag in row['tags'] or [])
+        yield values
+
+
+def budget_rows(data):
+    """Yield one row per budget and allocated category of a budget vs actual result"""
+    for budget in data['budgets']:
+        values = [budget[header] for header in BUDGET_HEADERS]
+        for category in budget['categories']:
+            yield values + [category[header] for header in BUDGET_CATEGORY_HEADERS]
+
+
+def report_table(report):
+    """
+    Return (sheet title, headers, rows) of what a report produces.
+
+    Report types with a generator export the rows of their result, which is
+    read from the report snapshot when it is current. Custom reports export
+    their transactions. Raises ValueError for invalid filters.
+    """
+    if report.report_type == 'CUSTOM':
+        return 'Transactions', EXPORT_HEADERS, transaction_rows(custom_report_transactions(report))
+    data, _, _ = run_report(report)
+    if report.report_type == 'BUDGET_VS_ACTUAL':
+        return 'Budgets', BUDGET_HEADERS + BUDGET_CATEGORY_HEADERS, budget_rows(data)
+    title, key, headers = RESULT_TABLES[report.report_type]
+    return title, headers, ([row[header] for header in headers] for row in data[key])
+
+
+def write_csv(title, headers, rows, output):
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(headers)
+    for values in rows:
+        writer.writerow(values)
+    text.flush()
+    # Hand the binary file back open
+    text.detach()
+
+
+def write_xlsx(title, headers, rows, output):
+    # Write-only workbooks stream every appended row to a temporary file
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = XLSX_MAX_ROWS
+    for values in rows:
+        if sheet_rows == XLSX_MAX_ROWS:
+            sheet = workbook.create_sheet(f'{title} {len(workbook.worksheets) + 1}')
+            sheet.append(headers)
+            sheet_rows = 1
+        sheet.append(values)
+        sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet(f'{title} 1').append(headers)
+    workbook.save(output)
+
+
+EXPORT_WRITERS = {
+    'CSV': (write_csv, 'csv'),
+    'EXCEL': (write_xlsx, 'xlsx'),
+}
+
+
+def generate_export(report, export_format, expires_in=EXPORT_EXPIRY):
+    """
+    Export the result of a report to a file in storage.
+
+    Rows are written to a temporary file on disk as they arrive; the storage
+    backend then copies that file over in chunks. Transactions of custom
+    reports are read from the database in chunks, so memory use stays flat
+    however many years the report spans. Raises ValueError for formats that
+    cannot be generated and for reports that cannot be run.
+    """
+    if export_format not in EXPORT_WRITERS:
+        raise ValueError(f'Exports in {export_format} format are not supported.')
+    writer, extension = EXPORT_WRITERS[export_format]
+    title, headers, rows = report_table(report)
+
+    created_at = timezone.now()
+    export = ReportExport(report=report, format=export_format, expires_at=created_at + expires_in)
+    with tempfile.TemporaryFile() as output:
+        writer(title, headers, rows, output)
+        output.seek(0)
+        export.file.save(
+            f'report-{report.id}-{created_at:%Y%m%d%H%M%S}.{extension}', File(output), save=False
+        )
+    export.save()
+    return export
+
+
+def purge_expired_exports(now=None, batch_size=EXPORT_PURGE_BATCH_SIZE):
+    """Delete expired exports and their files in batches; returns counts"""
+    started = time.monotonic()
+    now = now or timezone.now()
+    storage = ReportExport._meta.get_field('file').storage
+    deleted = 0
+    last_id = 0
+    while True:
+        batch = list(
+            ReportExport.objects.filter(expires_at__lte=now, id__gt=last_id)
+            .order_by('id').values_list('id', 'file')[:batch_size]
+        )
+        if not batch:
+            break
+        # Files first: a row left behind by a failure here is retried on the next run
+        for _, name in batch:
+            if name:
+                storage.delete(name)
+        ReportExport.objects.filter(id__in=[export_id for export_id, _ in batch]).delete()
+        deleted += len(batch)
+        last_id = batch[-1][0]
+
+    return {
+        'exports': deleted,
+        'elapsed_seconds': round(time.monotonic() - started, 3),
+    }
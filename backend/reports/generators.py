@@ -0,0 +1,238 @@
+"""
+Report generation shared by the report endpoints and saved reports
+"""
+import hashlib
+import json
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Subquery
+from django.utils import timezone
+from accounts.models import User
+from core.analytics_cache import get_user_data_version
+from transactions.analytics import monthly_breakdown, monthly_category_summary, roll_up_categories
+from budgets.spending import budget_history
+from .models import Report, ReportSnapshot
+
+
+def financial_summary(user, start_date, end_date, rollup=False):
+    """Income, expenses, savings rate and per-category and per-month breakdowns of a period"""
+    # Monthly per-category totals, mostly served from the rollup table
+    monthly_rows = monthly_category_summary(user, start_date, end_date)
+
+    months = monthly_breakdown(monthly_rows, start_date, end_date)
+    total_income = sum(totals['income'] for totals in months.values())
+    total_expenses = sum(totals['expenses'] for totals in months.values())
+    transaction_count = sum(totals['count'] for totals in months.values())
+
+    # Category breakdown
+    categories = {}
+    for row in monthly_rows:
+        if row['expense_count']:
+            category_name = row['category__name'] or 'Uncategorized'
+            category = categories.setdefault(category_name, {'total': 0, 'count': 0})
+            category['total'] += abs(row['expenses'])
+            category['count'] += row['expense_count']
+
+    if rollup:
+        # Break expenses down by top-level category, subcategories included
+        categories = {
+            totals['name']: {'total': totals['expenses'], 'count': totals['expense_count']}
+            for totals in roll_up_categories(user, monthly_rows).values()
+            if totals['parent'] is None and totals['expense_count']
+        }
+
+    net_income = total_income - total_expenses
+    savings_rate = (float(net_income) / float(total_income) * 100) if total_income > 0 else 0
+    category_breakdown = sorted(categories.items(), key=lambda item: item[1]['total'], reverse=True)
+
+    # Monthly breakdown
+    monthly_data = [
+        {
+            'month': month.strftime('%Y-%m'),
+            'income': float(totals['income']),
+            'expenses': float(totals['expenses']),
+            'net': float(totals['income'] - totals['expenses'])
+        }
+        for month, totals in months.items()
+    ]
+
+    return {
+        'period': {
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d')
+        },
+        'summary': {
+            'total_income': float(total_income),
+            'total_expenses': float(total_expenses),
+            'net_income': float(net_income),
+            'savings_rate': round(savings_rate, 1),
+            'transaction_count': transaction_count
+        },
+        'category_breakdown': [
+            {
+                'category': category_name,
+                'amount': float(item['total']),
+                'count': item['count'],
+                'percentage': round((float(item['total']) / float(total_expenses) * 100), 1) if total_expenses > 0 else 0
+            }
+            for category_name, item in category_breakdown
+        ],
+        'monthly_breakdown': monthly_data
+    }
+
+
+def cash_flow(user, start_date, end_date):
+    """Monthly income, expenses and net cash flow of a period"""
+    # Group by month
+    months = monthly_breakdown(
+        monthly_category_summary(user, start_date, end_date), start_date, end_date
+    )
+
+    cash_flow_data = [
+        {
+            'month': month.strftime('%Y-%m'),
+            'income': float(totals['income']),
+            'expenses': float(totals['expenses']),
+            'net_cash_flow': float(totals['income'] - totals['expenses']),
+            'transaction_count': totals['count']
+        }
+        for month, totals in months.items()
+    ]
+
+    return {
+        'period': {
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d')
+        },
+        'cash_flow_data': cash_flow_data
+    }
+
+
+def comparison(budgeted, actual):
+    variance = budgeted - actual
+    return {
+        'variance': float(variance),
+        'variance_percentage': round(float(variance / budgeted * 100), 1) if budgeted > 0 else 0,
+        'utilization_percentage': round(float(actual / budgeted * 100), 1) if budgeted > 0 else 0,
+    }
+
+
+def budget_vs_actual_history(user, start_date, end_date):
+    """Budget vs actual per budget and allocated category for every budget overlapping a period"""
+    budgets = []
+    total_budgeted = 0
+    total_actual = 0
+    for budget in budget_history(user, start_date, end_date):
+        categories = []
+        actual_spending = 0
+        for allocation in budget['allocations']:
+            spent = abs(allocation['spent_amount'])
+            actual_spending += spent
+            categories.append({
+                'category_id': allocation['category_id'],
+                'category_name': allocation['category_name'],
+                'budgeted_amount': float(allocation['amount']),
+                'actual_spending': float(spent),
+                'transaction_count': allocation['transaction_count'],
+                **comparison(allocation['amount'], spent),
+            })
+        total_budgeted += budget['total_amount']
+        total_actual += actual_spending
+        budgets.append({
+            'budget_id': budget['id'],
+            'budget_name': budget['name'],
+            'period_type': budget['period_type'],
+            'start_date': budget['start_date'],
+            'end_date': budget['end_date'],
+            'budget_amount': float(budget['total_amount']),
+            'allocated_amount': float(sum(allocation['amount'] for allocation in budget['allocations'])),
+            'actual_spending': float(actual_spending),
+            **comparison(budget['total_amount'], actual_spending),
+            'categories': categories,
+        })
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'budgets': budgets,
+        'total_budgets': len(budgets),
+        'totals': {
+            'budget_amount': float(total_budgeted),
+            'actual_spending': float(total_actual),
+            **comparison(total_budgeted, total_actual),
+        }
+    }
+
+
+def category_breakdown(user, start_date, end_date, rollup=False):
+    """Expenses of a period per category"""
+    summary = financial_summary(user, start_date, end_date, rollup=rollup)
+    return {
+        'period': summary['period'],
+        'total_expenses': summary['summary']['total_expenses'],
+        'category_breakdown': summary['category_breakdown'],
+    }
+
+
+def generate_report(report):
+    """Compute the result of a saved report; raises ValueError for report types that cannot be run"""
+    user, start_date, end_date = report.user, report.date_range_start, report.date_range_end
+    rollup = bool((report.filters or {}).get('rollup'))
+    if report.report_type == 'INCOME_EXPENSE':
+        return financial_summary(user, start_date, end_date, rollup=rollup)
+    if report.report_type == 'CATEGORY_BREAKDOWN':
+        return category_breakdown(user, start_date, end_date, rollup=rollup)
+    if report.report_type == 'CASH_FLOW':
+        return cash_flow(user, start_date, end_date)
+    if report.report_type == 'BUDGET_VS_ACTUAL':
+        return budget_vs_actual_history(user, start_date, end_date)
+    raise ValueError(f'Reports of type {report.report_type} cannot be run.')
+
+
+def snapshot_key(report):
+    """Hash of the configuration a report's result depends on"""
+    config = {
+        'report_type': report.report_type,
+        'date_range_start': report.date_range_start,
+        'date_range_end': report.date_range_end,
+        'filters': report.filters,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+
+def run_report(report):
+    """
+    Return the result of a saved report as (data, generated_at, from_snapshot).
+
+    The result is stored as a zlib-compressed JSON snapshot along with a hash
+    of the report configuration and the owner's data version. The version is
+    compared with the one on the user row within the lookup query, so as long
+    as neither changes, repeated runs in any process decompress the snapshot
+    instead of recomputing; any write to the owner's data bumps the version
+    and so forces a new run.
+    """
+    key = snapshot_key(report)
+    snapshot = ReportSnapshot.objects.filter(
+        report=report,
+        key=key,
+        data_version=Subquery(User.objects.filter(pk=report.user_id).values('data_version')),
+    ).values_list('data', 'generated_at').first()
+    if snapshot is not None:
+        data, generated_at = snapshot
+        return json.loads(zlib.decompress(bytes(data))), generated_at, True
+
+    # Read before generating, so a write committed meanwhile forces the next run
+    data_version = get_user_data_version(report.user_id)
+    # Round-trip through JSON so fresh and snapshot results look the same
+    data = json.loads(json.dumps(generate_report(report), cls=DjangoJSONEncoder))
+    generated_at = timezone.now()
+    ReportSnapshot.objects.update_or_create(report=report, defaults={
+        'key': key,
+        'data_version': data_version,
+        'data': zlib.compress(json.dumps(data, separators=(',', ':')).encode()),
+        'generated_at': generated_at,
+    })
+    Report.objects.filter(pk=report.pk).update(last_generated=generated_at)
+    report.last_generated = generated_at
+    return data, generated_at, False
+
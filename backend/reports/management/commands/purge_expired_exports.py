@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from reports.exports import EXPORT_PURGE_BATCH_SIZE, purge_expired_exports
+
+class Command(BaseCommand):
+    help = 'Delete report exports past their expiry date along with their files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EXPORT_PURGE_BATCH_SIZE,
+            help='Number of exports deleted per query'
+        )
+
+    def handle(self, *args, **options):
+        result = purge_expired_exports(batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {result["exports"]} expired exports in {result["elapsed_seconds"]}s'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from reports.schedules import SCHEDULE_BATCH_SIZE, run_report_schedules
+
+class Command(BaseCommand):
+    help = 'Generate and email every due scheduled report, then advance its next run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes generating reports in parallel'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SCHEDULE_BATCH_SIZE,
+            help='Number of schedules claimed per database transaction'
+        )
+
+    def handle(self, *args, **options):
+        result = run_report_schedules(
+            workers=max(1, options['workers']),
+            batch_size=max(1, options['batch_size'])
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {result["schedules"]} schedules and sent {result["emails"]} emails '
+            f'in {result["elapsed_seconds"]}s'
+        ))
+        if result['failed']:
+            self.stdout.write(self.style.WARNING(f'{result["failed"]} schedules failed'))
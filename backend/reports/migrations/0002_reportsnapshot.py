@@ -0,0 +1,24 @@
+# Generated by Django 4.2.13 on 2026-10-18 03:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('data', models.BinaryField()),
+                ('generated_at', models.DateTimeField()),
+                ('report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='reports.report')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_reportsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportsnapshot',
+            name='data_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -29,6 +29,21 @@ class Report(models.Model):
     def __str__(self):
         return f"{self.name} ({self.report_type})"
 
+class ReportSnapshot(models.Model):
+    """
+    Compressed JSON result of the last run of a saved report
+    """
+    report = models.OneToOneField(Report, on_delete=models.CASCADE, related_name='snapshot')
+    # Hash of the report configuration it was generated for
+    key = models.CharField(max_length=64)
+    # Owner's User.data_version when it was generated
+    data_version = models.BigIntegerField(default=0)
+    data = models.BinaryField()
+    generated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Snapshot of {self.report.name} ({self.generated_at})"
+
 class ReportSchedule(models.Model):
     """
     Scheduled report generation
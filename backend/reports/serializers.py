@@ -5,7 +5,12 @@ class ReportExportSerializer(serializers.ModelSerializer):
     class Meta:
         model = ReportExport
         fields = '__all__'
-        read_only_fields = ('id', 'created_at')
+        read_only_fields = ('id', 'created_at', 'file', 'expires_at')
+
+    def validate_report(self, value):
+        if value.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError('Report not found.')
+        return value
 
 class ReportScheduleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,6 +18,11 @@ class ReportScheduleSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+    def validate_report(self, value):
+        if value.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError('Report not found.')
+        return value
+
 class ReportSerializer(serializers.ModelSerializer):
     schedules = ReportScheduleSerializer(many=True, read_only=True)
     exports = ReportExportSerializer(many=True, read_only=True)
@@ -2,9 +2,27 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import csv
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.test import override_settings
+from openpyxl import load_workbook
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from transactions.models import Transaction, Category
 from reports.views import ReportViewSet
+from budgets.models import Budget, BudgetCategory
+from reports.models import Report, ReportExport, ReportSchedule, ReportSnapshot
+from reports import exports
+from reports.exports import purge_expired_exports
+from reports.schedules import next_run_after, run_report_schedules
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 
@@ -96,3 +114,590 @@ class ReportViewSetTestCase(APITestCase):
         statistics = data['statistics']
         self.assertIn('savings_rate', statistics)
         self.assertIsInstance(statistics['savings_rate'], (int, float))
+
+
+class BudgetVsActualHistoryTestCase(APITestCase):
+    url = '/api/reports/reports/budget_vs_actual_history/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='historyuser',
+            email='history@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        self.fun = Category.objects.create(name='Fun', user=self.user)
+
+    def add_month(self, month, allocations):
+        start_date = date(2024, month, 1)
+        end_date = date(2024, month + 1, 1) - timedelta(days=1)
+        budget = Budget.objects.create(
+            user=self.user, name=f'Month {month}', period_type='MONTHLY',
+            start_date=start_date, end_date=end_date, total_amount=Decimal('500.00')
+        )
+        for category, amount in allocations:
+            BudgetCategory.objects.create(budget=budget, category=category, amount=Decimal(amount))
+        return budget
+
+    def add_expense(self, amount, category, day):
+        Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Expense',
+            category=category, transaction_type='EXPENSE', date=day
+        )
+
+    def test_history_per_budget_and_category(self):
+        self.add_month(1, [(self.food, '300.00')])
+        february = self.add_month(2, [(self.food, '300.00'), (self.travel, '100.00')])
+        march = self.add_month(3, [])
+        self.add_month(5, [(self.food, '300.00')])
+        self.add_expense('120.00', self.food, date(2024, 2, 3))
+        self.add_expense('150.00', self.travel, date(2024, 2, 9))
+        # Not allocated, so not part of the comparison
+        self.add_expense('999.00', self.fun, date(2024, 2, 9))
+
+        response = self.client.get(self.url, {'start_date': '2024-02-15', 'end_date': '2024-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([b['budget_id'] for b in response.data['budgets']], [february.id, march.id])
+
+        feb = response.data['budgets'][0]
+        self.assertEqual(feb['actual_spending'], 270.0)
+        self.assertEqual(feb['allocated_amount'], 400.0)
+        self.assertEqual(feb['variance'], 230.0)
+        self.assertEqual(feb['utilization_percentage'], 54.0)
+        food, travel = feb['categories']
+        self.assertEqual((food['category_name'], food['actual_spending'], food['transaction_count']), ('Food', 120.0, 1))
+        self.assertEqual((travel['variance'], travel['utilization_percentage']), (-50.0, 150.0))
+        self.assertEqual(response.data['budgets'][1]['categories'], [])
+        self.assertEqual(response.data['totals']['actual_spending'], 270.0)
+        self.assertEqual(response.data['totals']['budget_amount'], 1000.0)
+
+    def test_query_count_does_not_grow_with_transactions(self):
+        for month in range(1, 7):
+            self.add_month(month, [(self.food, '300.00'), (self.travel, '100.00')])
+
+        def queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(self.url, {'start_date': '2024-01-01', 'end_date': '2024-06-30'})
+            self.assertEqual(response.status_code, 200)
+            return len(captured)
+
+        few = queries()
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, amount=Decimal('5.00'), description='Expense', category=self.food,
+                transaction_type='EXPENSE', date=date(2024, 1 + i % 6, 1 + i % 28)
+            )
+            for i in range(300)
+        ])
+        self.assertEqual(queries(), few)
+
+    def test_invalid_range(self):
+        response = self.client.get(self.url, {'start_date': '2024-03-01', 'end_date': '2024-02-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {'start_date': 'March'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MonthlyBreakdownQueryCountTestCase(APITestCase):
+    """financial_summary and cash_flow must not issue queries per month"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='monthlyuser',
+            email='monthly@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Rent', user=self.user)
+        for month in range(60):
+            day = date(2020 + month // 12, month % 12 + 1, 15)
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('100.00'), description='Rent', category=category,
+                transaction_type='EXPENSE', date=day
+            )
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('250.00'), description='Salary',
+                transaction_type='INCOME', date=day
+            )
+
+    def get(self, endpoint, start_date, end_date):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f'/api/reports/reports/{endpoint}/', {'start_date': start_date, 'end_date': end_date}
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_query_count_is_flat_across_range_lengths(self):
+        # Besides the data version, whole months come from the rollups and partial
+        # edge months from one grouped query over the transactions, whatever the
+        # number of months
+        for endpoint in ('financial_summary', 'cash_flow'):
+            counts = {
+                end_date: self.get(endpoint, '2020-01-10', end_date)[1]
+                for end_date in ('2020-03-20', '2020-12-20', '2024-12-20')
+            }
+            self.assertEqual(set(counts.values()), {3}, f'{endpoint} queries per range: {counts}')
+
+    def test_five_year_breakdown(self):
+        summary, _ = self.get('financial_summary', '2020-01-01', '2024-12-31')
+        self.assertEqual(len(summary['monthly_breakdown']), 60)
+        self.assertEqual(summary['summary']['total_expenses'], 6000.0)
+        self.assertEqual(summary['summary']['transaction_count'], 120)
+
+        cash_flow, _ = self.get('cash_flow', '2019-11-01', '2025-01-31')
+        months = cash_flow['cash_flow_data']
+        self.assertEqual(len(months), 63)
+        self.assertEqual(months[0], {
+            'month': '2019-11', 'income': 0.0, 'expenses': 0.0, 'net_cash_flow': 0.0, 'transaction_count': 0
+        })
+        self.assertEqual(months[2]['net_cash_flow'], 150.0)
+        self.assertEqual(sum(month['transaction_count'] for month in months), 120)
+
+
+class SpendingTrendsTestCase(APITestCase):
+    url = '/api/reports/reports/spending_trends/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='trendsuser',
+            email='trends@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.categories = [Category.objects.create(name=f'Category {i}', user=self.user) for i in range(6)]
+        self.this_month = timezone.now().date().replace(day=1)
+
+    def add_expense(self, amount, category, months_ago):
+        month_index = self.this_month.year * 12 + self.this_month.month - 1 - months_ago
+        Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Expense', category=category,
+            transaction_type='EXPENSE', date=date(month_index // 12, month_index % 12 + 1, 1)
+        )
+
+    def test_top_categories_per_month(self):
+        for i, category in enumerate(self.categories):
+            self.add_expense(f'{10 * (i + 1)}.00', category, 0)
+        self.add_expense('5.00', None, 0)
+        self.add_expense('70.00', self.categories[0], 2)
+        self.add_expense('15.00', self.categories[1], 2)
+
+        response = self.client.get(self.url, {'months': 3, 'top': 3})
+        self.assertEqual(response.status_code, 200)
+        two_ago, last, current = response.data['trends_data']
+        self.assertEqual(response.data['period']['start_date'], f"{two_ago['month']}-01")
+        self.assertEqual(current['month'], self.this_month.strftime('%Y-%m'))
+        self.assertEqual(
+            current['category_breakdown'],
+            [{'category': 'Category 5', 'amount': 60.0}, {'category': 'Category 4', 'amount': 50.0},
+             {'category': 'Category 3', 'amount': 40.0}]
+        )
+        self.assertEqual(current['total_spending'], 215.0)
+        self.assertEqual((last['total_spending'], last['category_breakdown']), (0.0, []))
+        self.assertEqual([row['category'] for row in two_ago['category_breakdown']], ['Category 0', 'Category 1'])
+
+    def test_invalid_parameters(self):
+        for params in ({'top': 'abc'}, {'months': '1.5'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+        # Out of range values are clamped
+        response = self.client.get(self.url, {'top': -3, 'months': 100000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['trends_data']), 120)
+
+    def test_long_trend_is_one_aggregate_query(self):
+        for months_ago in range(36):
+            for category in self.categories[:4]:
+                self.add_expense('10.00', category, months_ago)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'months': 36})
+        self.assertEqual(response.status_code, 200)
+        # The data version, then the ranked totals
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(len(response.data['trends_data']), 36)
+        self.assertTrue(all(len(month['category_breakdown']) == 4 for month in response.data['trends_data']))
+
+
+class ReportRunTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='runuser',
+            email='run@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Food', user=self.user)
+        self.add_expense('40.00')
+        self.report = Report.objects.create(
+            user=self.user, name='Q1', report_type='INCOME_EXPENSE',
+            date_range_start=date(2024, 1, 1), date_range_end=date(2024, 3, 31)
+        )
+
+    def add_expense(self, amount):
+        Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Lunch', category=self.category,
+            transaction_type='EXPENSE', date=date(2024, 2, 10)
+        )
+
+    def run_report(self, report=None):
+        response = self.client.post(f'/api/reports/reports/{(report or self.report).id}/run/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_repeat_runs_are_served_from_the_snapshot(self):
+        first = self.run_report()
+        self.assertFalse(first['from_snapshot'])
+        self.assertEqual(first['data']['summary']['total_expenses'], 40.0)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.last_generated, first['generated_at'])
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.run_report()
+        self.assertTrue(second['from_snapshot'])
+        self.assertEqual(second['data'], first['data'])
+        self.assertEqual(second['generated_at'], first['generated_at'])
+        # The report and its snapshot, nothing else
+        self.assertEqual(len(queries), 2)
+
+    def test_data_and_config_changes_regenerate(self):
+        self.run_report()
+        self.add_expense('10.00')
+        result = self.run_report()
+        self.assertFalse(result['from_snapshot'])
+        self.assertEqual(result['data']['summary']['total_expenses'], 50.0)
+
+        self.report.date_range_end = date(2024, 1, 31)
+        self.report.save()
+        result = self.run_report()
+        self.assertFalse(result['from_snapshot'])
+        self.assertEqual(result['data']['summary']['total_expenses'], 0.0)
+        self.assertEqual(ReportSnapshot.objects.filter(report=self.report).count(), 1)
+
+    def test_writes_in_another_process_regenerate(self):
+        self.run_report()
+        # A write handled by a worker process with its own local-memory cache
+        with mock.patch('core.analytics_cache.cache', LocMemCache('other-process', {})):
+            self.add_expense('10.00')
+        result = self.run_report()
+        self.assertFalse(result['from_snapshot'])
+        self.assertEqual(result['data']['summary']['total_expenses'], 50.0)
+
+    def test_report_types(self):
+        budget = Budget.objects.create(
+            user=self.user, name='February', period_type='MONTHLY', start_date=date(2024, 2, 1),
+            end_date=date(2024, 2, 29), total_amount=Decimal('100.00')
+        )
+        BudgetCategory.objects.create(budget=budget, category=self.category, amount=Decimal('80.00'))
+        expected = {
+            'CATEGORY_BREAKDOWN': lambda data: data['category_breakdown'][0]['amount'] == 40.0,
+            'CASH_FLOW': lambda data: len(data['cash_flow_data']) == 3,
+            'BUDGET_VS_ACTUAL': lambda data: data['budgets'][0]['start_date'] == '2024-02-01',
+        }
+        for report_type, check in expected.items():
+            report = Report.objects.create(
+                user=self.user, name=report_type, report_type=report_type,
+                date_range_start=date(2024, 1, 1), date_range_end=date(2024, 3, 31)
+            )
+            self.assertTrue(check(self.run_report(report)['data']), report_type)
+
+        custom = Report.objects.create(
+            user=self.user, name='Custom', report_type='CUSTOM',
+            date_range_start=date(2024, 1, 1), date_range_end=date(2024, 3, 31)
+        )
+        response = self.client.post(f'/api/reports/reports/{custom.id}/run/')
+        self.assertEqual(response.status_code, 400)
+
+
+
+class ReportScheduleRunnerTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='scheduleuser',
+            email='schedule@example.com',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Food', user=self.user)
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('40.00'), description='Lunch', category=category,
+            transaction_type='EXPENSE', date=date(2024, 2, 10)
+        )
+        self.report = Report.objects.create(
+            user=self.user, name='Q1', report_type='INCOME_EXPENSE',
+            date_range_start=date(2024, 1, 1), date_range_end=date(2024, 3, 31)
+        )
+        self.now = timezone.make_aware(datetime(2024, 4, 1, 0, 5))
+
+    def add_schedule(self, frequency='DAILY', next_run=None, **kwargs):
+        kwargs.setdefault('email_recipients', ['me@example.com'])
+        return ReportSchedule.objects.create(
+            report=self.report, frequency=frequency,
+            next_run=next_run or timezone.make_aware(datetime(2024, 4, 1)), **kwargs
+        )
+
+    def test_schedules_only_for_own_reports(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        payload = {
+            'frequency': 'DAILY', 'next_run': '2024-04-02T00:00:00Z', 'email_recipients': ['me@example.com'],
+        }
+        response = client.post('/api/reports/report-schedules/', {'report': self.report.id, **payload}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        theirs = Report.objects.create(
+            user=other, name='Theirs', report_type='INCOME_EXPENSE',
+            date_range_start=date(2024, 1, 1), date_range_end=date(2024, 3, 31)
+        )
+        response = client.post('/api/reports/report-schedules/', {'report': theirs.id, **payload}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ReportSchedule.objects.filter(report=theirs).exists())
+
+    def test_next_run_after(self):
+        start = timezone.make_aware(datetime(2024, 1, 31, 6))
+        now = timezone.make_aware(datetime(2024, 1, 31, 7))
+        self.assertEqual(next_run_after(start, 'DAILY', now), start + timedelta(days=1))
+        self.assertEqual(next_run_after(start, 'WEEKLY', now), start + timedelta(days=7))
+        self.assertEqual(next_run_after(start, 'MONTHLY', now), timezone.make_aware(datetime(2024, 2, 29, 6)))
+        self.assertEqual(next_run_after(start, 'QUARTERLY', now), timezone.make_aware(datetime(2024, 4, 30, 6)))
+        self.assertEqual(next_run_after(start, 'YEARLY', now), timezone.make_aware(datetime(2025, 1, 31, 6)))
+        # Runs missed while no worker ran are skipped
+        late = timezone.make_aware(datetime(2024, 2, 3, 12))
+        self.assertEqual(next_run_after(start, 'DAILY', late), timezone.make_aware(datetime(2024, 2, 4, 6)))
+
+    def test_due_schedules_are_emailed_and_advanced(self):
+        daily = self.add_schedule('DAILY', email_recipients=['a@example.com', 'b@example.com'])
+        monthly = self.add_schedule('MONTHLY')
+        later = self.add_schedule('DAILY', next_run=timezone.make_aware(datetime(2024, 4, 2)))
+        inactive = self.add_schedule('DAILY', is_active=False)
+
+        result = run_report_schedules(batch_size=1, now=self.now)
+        self.assertEqual(result['schedules'], 2)
+        self.assertEqual(result['emails'], 2)
+        self.assertEqual(result['failed'], 0)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['a@example.com', 'b@example.com'])
+        self.assertIn('Q1', mail.outbox[0].subject)
+        filename, content, mimetype = mail.outbox[0].attachments[0]
+        self.assertEqual(mimetype, 'application/json')
+        self.assertIn('"total_expenses": 40.0', content)
+
+        daily.refresh_from_db()
+        monthly.refresh_from_db()
+        later.refresh_from_db()
+        inactive.refresh_from_db()
+        self.assertEqual(daily.next_run, timezone.make_aware(datetime(2024, 4, 2)))
+        self.assertEqual(monthly.next_run, timezone.make_aware(datetime(2024, 5, 1)))
+        self.assertEqual(later.next_run, timezone.make_aware(datetime(2024, 4, 2)))
+        self.assertEqual(inactive.next_run, timezone.make_aware(datetime(2024, 4, 1)))
+
+        # Advanced schedules are not due again
+        self.assertEqual(run_report_schedules(now=self.now)['schedules'], 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_one_mail_connection_per_run(self):
+        for _ in range(5):
+            self.add_schedule()
+        with mock.patch('reports.schedules.get_connection', wraps=mail.get_connection) as get_connection:
+            result = run_report_schedules(batch_size=2, now=self.now)
+        self.assertEqual(result['emails'], 5)
+        get_connection.assert_called_once()
+
+    def test_failed_deliveries_do_not_stop_the_run(self):
+        schedules = [self.add_schedule() for _ in range(3)]
+        backend = mail.get_connection()
+        send_messages = backend.send_messages
+        calls = []
+
+        def flaky_send(messages):
+            calls.append(len(messages))
+            if len(calls) == 1:
+                raise ConnectionRefusedError('SMTP down')
+            return send_messages(messages)
+
+        with mock.patch('reports.schedules.get_connection', return_value=backend), \
+                mock.patch.object(backend, 'send_messages', side_effect=flaky_send), \
+                self.assertLogs('reports.schedules', 'ERROR'):
+            result = run_report_schedules(batch_size=1, now=self.now)
+        self.assertEqual(calls, [1, 1, 1])
+        self.assertEqual((result['schedules'], result['failed'], result['emails']), (3, 1, 2))
+        self.assertEqual(len(mail.outbox), 2)
+        for schedule in schedules:
+            schedule.refresh_from_db()
+            self.assertGreater(schedule.next_run, self.now)
+
+    def test_failed_reports_are_counted(self):
+        self.report.report_type = 'CUSTOM'
+        self.report.save()
+        schedule = self.add_schedule()
+        with self.assertLogs('reports.schedules', 'ERROR'):
+            result = run_report_schedules(now=self.now)
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(len(mail.outbox), 0)
+        schedule.refresh_from_db()
+        self.assertGreater(schedule.next_run, self.now)
+
+    def test_command(self):
+        self.add_schedule(next_run=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('run_report_schedules', batch_size=10, stdout=out)
+        self.assertIn('Ran 1 schedules and sent 1 emails', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class ReportExportTestCase(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(
+            username='exportuser',
+            email='export@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Food', user=self.user)
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, amount=Decimal('12.50'), description=f'Lunch {day}', category=category,
+                transaction_type='EXPENSE', date=date(2024, 1, day), tags=['work', 'food']
+            )
+            for day in range(1, 6)
+        ])
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('99.00'), description='Outside range',
+            transaction_type='EXPENSE', date=date(2023, 12, 31)
+        )
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('2000.00'), description='Salary',
+            transaction_type='INCOME', date=date(2024, 1, 31)
+        )
+        self.report = Report.objects.create(
+            user=self.user, name='January', report_type='CUSTOM', filters={'transaction_type': 'EXPENSE'},
+            date_range_start=date(2024, 1, 1), date_range_end=date(2024, 1, 31)
+        )
+
+    def create_export(self, export_format, report=None):
+        return self.client.post('/api/reports/report-exports/', {
+            'report': (report or self.report).id,
+            'format': export_format,
+        })
+
+    def test_csv_export(self):
+        response = self.create_export('CSV')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(response.data['expires_at'])
+        export = ReportExport.objects.get(id=response.data['id'])
+        self.assertTrue(export.file.name.endswith('.csv'))
+
+        with export.file.open('r') as handle:
+            rows = list(csv.reader(handle))
+        self.assertEqual(rows[0][:4], ['id', 'date', 'description', 'amount'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][1:4], ['2024-01-01', 'Lunch 1', '12.50'])
+        self.assertEqual(rows[1][8], 'work,food')
+
+    def test_xlsx_export(self):
+        response = self.create_export('EXCEL')
+        self.assertEqual(response.status_code, 201)
+        export = ReportExport.objects.get(id=response.data['id'])
+        self.assertTrue(export.file.name.endswith('.xlsx'))
+
+        with export.file.open('rb') as handle:
+            rows = list(load_workbook(handle, read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual(rows[0][:3], ('id', 'date', 'description'))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][2], 'Lunch 1')
+        self.assertEqual(rows[1][3], 12.5)
+
+    def test_exports_follow_the_report_type(self):
+        groceries = Category.objects.create(
+            name='Groceries', user=self.user, parent=Category.objects.get(user=self.user, name='Food')
+        )
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('37.50'), description='Market', category=groceries,
+            transaction_type='EXPENSE', date=date(2024, 1, 10)
+        )
+        # Reports read the rollups, which bulk_create in setUp bypasses
+        call_command('rebuild_rollups', stdout=StringIO())
+        report = Report.objects.create(
+            user=self.user, name='Categories', report_type='CATEGORY_BREAKDOWN', filters={'rollup': True},
+            date_range_start=date(2024, 1, 1), date_range_end=date(2024, 1, 31)
+        )
+        response = self.create_export('CSV', report)
+        self.assertEqual(response.status_code, 201)
+        with ReportExport.objects.get(id=response.data['id']).file.open('r') as handle:
+            rows = list(csv.reader(handle))
+        # Subcategories are rolled up into their parent, as in the report result
+        self.assertEqual(rows, [['category', 'amount', 'count', 'percentage'], ['Food', '100.0', '6', '100.0']])
+
+        report.report_type = 'CASH_FLOW'
+        report.save()
+        export = exports.generate_export(report, 'EXCEL')
+        with export.file.open('rb') as handle:
+            rows = list(load_workbook(handle, read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual(rows, [
+            ('month', 'income', 'expenses', 'net_cash_flow', 'transaction_count'),
+            ('2024-01', 2000, 100, 1900, 7),
+        ])
+
+    def test_invalid_report_filters(self):
+        self.report.filters = {'transaction_type': 'REFUND'}
+        self.report.save()
+        response = self.create_export('CSV')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('report', response.data)
+        self.assertFalse(ReportExport.objects.exists())
+
+    def test_long_exports_span_several_sheets(self):
+        with mock.patch.object(exports, 'XLSX_MAX_ROWS', 3):
+            export = exports.generate_export(self.report, 'EXCEL')
+        with export.file.open('rb') as handle:
+            workbook = load_workbook(handle, read_only=True)
+            sheets = [list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets]
+        self.assertEqual([len(rows) for rows in sheets], [3, 3, 2])
+        self.assertTrue(all(rows[0][0] == 'id' for rows in sheets))
+
+    def test_unsupported_format_and_foreign_report(self):
+        self.assertEqual(self.create_export('PDF').status_code, 400)
+
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        report = Report.objects.create(
+            user=other, name='Theirs', report_type='INCOME_EXPENSE',
+            date_range_start=date(2024, 1, 1), date_range_end=date(2024, 1, 31)
+        )
+        self.assertEqual(self.create_export('CSV', report).status_code, 400)
+        self.assertFalse(ReportExport.objects.exists())
+
+    def test_purge_expired_exports(self):
+        expired = [exports.generate_export(self.report, 'CSV', expires_in=timedelta(days=-1)) for _ in range(3)]
+        current = exports.generate_export(self.report, 'CSV')
+        storage = current.file.storage
+
+        result = purge_expired_exports(batch_size=2)
+        self.assertEqual(result['exports'], 3)
+        self.assertEqual(list(ReportExport.objects.values_list('id', flat=True)), [current.id])
+        self.assertFalse(any(storage.exists(export.file.name) for export in expired))
+        self.assertTrue(storage.exists(current.file.name))
+
+        out = StringIO()
+        call_command('purge_expired_exports', stdout=out)
+        self.assertIn('Purged 0 expired exports', out.getvalue())
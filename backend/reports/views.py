@@ -1,12 +1,16 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Avg, Q
+from django.db.models import Sum, Avg, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
+from core.analytics_cache import cached_analytics
+from transactions.analytics import add_months, iter_months, month_end, top_expense_categories_by_month
 from transactions.models import Transaction
 from budgets.models import Budget
+from . import exports, generators
 from .models import Report, ReportSchedule, ReportExport
 from .serializers import ReportSerializer, ReportScheduleSerializer, ReportExportSerializer
 
@@ -22,7 +26,31 @@ class ReportViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=True, methods=['post'])
+    def run(self, request, pk=None):
+        """
+        Run a saved report over its date range and filters.
+
+        POST /api/reports/reports/{id}/run/
+
+        The result is kept as a snapshot and served again until the report or
+        the user's data changes.
+        """
+        report = self.get_object()
+        try:
+            data, generated_at, from_snapshot = generators.run_report(report)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'report': report.id,
+            'report_type': report.report_type,
+            'generated_at': generated_at,
+            'from_snapshot': from_snapshot,
+            'data': data,
+        })
+
     @action(detail=False, methods=['get'])
+    @cached_analytics
     def financial_summary(self, request):
         """Generate financial summary report"""
         # Get date range from query params
@@ -39,79 +67,13 @@ class ReportViewSet(viewsets.ModelViewSet):
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-        # Get transactions in date range
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__gte=start_date,
-            date__lte=end_date
-        )
-
-        # Calculate summary statistics
-        income_transactions = transactions.filter(transaction_type='INCOME')
-        expense_transactions = transactions.filter(transaction_type='EXPENSE')
-
-        total_income = income_transactions.aggregate(total=Sum('amount'))['total'] or 0
-        total_expenses = abs(expense_transactions.aggregate(total=Sum('amount'))['total'] or 0)
-        net_income = total_income - total_expenses
-        savings_rate = (float(net_income) / float(total_income) * 100) if total_income > 0 else 0
-
-        # Category breakdown
-        category_breakdown = expense_transactions.values('category__name').annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        ).order_by('-total')
-
-        # Monthly breakdown
-        monthly_data = []
-        current_date = start_date
-        while current_date <= end_date:
-            month_start = current_date.replace(day=1)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            month_transactions = transactions.filter(
-                date__gte=month_start,
-                date__lte=month_end
-            )
-            
-            month_income = month_transactions.filter(transaction_type='INCOME').aggregate(
-                total=Sum('amount'))['total'] or 0
-            month_expenses = abs(month_transactions.filter(transaction_type='EXPENSE').aggregate(
-                total=Sum('amount'))['total'] or 0)
-            
-            monthly_data.append({
-                'month': month_start.strftime('%Y-%m'),
-                'income': float(month_income),
-                'expenses': float(month_expenses),
-                'net': float(month_income - month_expenses)
-            })
-            
-            current_date = (month_start + timedelta(days=32)).replace(day=1)
-
-        return Response({
-            'period': {
-                'start_date': start_date.strftime('%Y-%m-%d'),
-                'end_date': end_date.strftime('%Y-%m-%d')
-            },
-            'summary': {
-                'total_income': float(total_income),
-                'total_expenses': float(total_expenses),
-                'net_income': float(net_income),
-                'savings_rate': round(savings_rate, 1),
-                'transaction_count': transactions.count()
-            },
-            'category_breakdown': [
-                {
-                    'category': item['category__name'] or 'Uncategorized',
-                    'amount': abs(float(item['total'])),
-                    'count': item['count'],
-                    'percentage': round((abs(float(item['total'])) / float(total_expenses) * 100), 1) if total_expenses > 0 else 0
-                }
-                for item in category_breakdown
-            ],
-            'monthly_breakdown': monthly_data
-        })
+        return Response(generators.financial_summary(
+            request.user, start_date, end_date,
+            rollup=request.query_params.get('rollup', '').lower() in ('1', 'true')
+        ))
 
     @action(detail=False, methods=['get'])
+    @cached_analytics
     def cash_flow(self, request):
         """Generate cash flow report"""
         # Get date range from query params
@@ -128,49 +90,10 @@ class ReportViewSet(viewsets.ModelViewSet):
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-        # Get transactions in date range
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date')
-
-        # Group by month
-        cash_flow_data = []
-        current_date = start_date.replace(day=1)
-        
-        while current_date <= end_date:
-            month_end = (current_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            month_transactions = transactions.filter(
-                date__gte=current_date,
-                date__lte=month_end
-            )
-            
-            income = month_transactions.filter(transaction_type='INCOME').aggregate(
-                total=Sum('amount'))['total'] or 0
-            expenses = abs(month_transactions.filter(transaction_type='EXPENSE').aggregate(
-                total=Sum('amount'))['total'] or 0)
-            
-            cash_flow_data.append({
-                'month': current_date.strftime('%Y-%m'),
-                'income': float(income),
-                'expenses': float(expenses),
-                'net_cash_flow': float(income - expenses),
-                'transaction_count': month_transactions.count()
-            })
-            
-            current_date = (current_date + timedelta(days=32)).replace(day=1)
-
-        return Response({
-            'period': {
-                'start_date': start_date.strftime('%Y-%m-%d'),
-                'end_date': end_date.strftime('%Y-%m-%d')
-            },
-            'cash_flow_data': cash_flow_data
-        })
+        return Response(generators.cash_flow(request.user, start_date, end_date))
 
     @action(detail=False, methods=['get'])
+    @cached_analytics
     def budget_vs_actual(self, request):
         """Generate budget vs actual report"""
         # Get active budgets
@@ -218,56 +141,54 @@ class ReportViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @cached_analytics
+    def budget_vs_actual_history(self, request):
+        """Budget vs actual per budget and allocated category for every budget overlapping a date range"""
+        try:
+            end_date = datetime.strptime(request.query_params['end_date'], '%Y-%m-%d').date() \
+                if request.query_params.get('end_date') else timezone.now().date()
+            start_date = datetime.strptime(request.query_params['start_date'], '%Y-%m-%d').date() \
+                if request.query_params.get('start_date') else end_date.replace(day=1) - timedelta(days=365)
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        if start_date > end_date:
+            return Response({'error': 'start_date must not be after end_date.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(generators.budget_vs_actual_history(request.user, start_date, end_date))
+
+    @action(detail=False, methods=['get'])
+    @cached_analytics
     def spending_trends(self, request):
         """Generate spending trends report"""
-        # Get date range from query params
-        months = int(request.query_params.get('months', 12))
-        
-        now = timezone.now()
-        end_date = now.date()
-        start_date = (now - timedelta(days=30*months)).date()
-
-        # Get transactions in date range
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__gte=start_date,
-            date__lte=end_date
-        )
-
-        # Group by month
-        trends_data = []
-        current_date = start_date.replace(day=1)
-        
-        while current_date <= end_date:
-            month_end = (current_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            month_transactions = transactions.filter(
-                date__gte=current_date,
-                date__lte=month_end
-            )
-            
-            # Calculate spending by category
-            category_spending = month_transactions.filter(
-                transaction_type='EXPENSE'
-            ).values('category__name').annotate(
-                total=Sum('amount')
-            ).order_by('-total')
-            
-            trends_data.append({
-                'month': current_date.strftime('%Y-%m'),
-                'total_spending': abs(float(month_transactions.filter(
-                    transaction_type='EXPENSE'
-                ).aggregate(total=Sum('amount'))['total'] or 0)),
-                'category_breakdown': [
-                    {
-                        'category': item['category__name'] or 'Uncategorized',
-                        'amount': abs(float(item['total']))
-                    }
-                    for item in category_spending[:5]  # Top 5 categories
-                ]
+        # Whole calendar months, ending with the current one
+        try:
+            months = min(max(1, int(request.query_params.get('months', 12))), 120)
+            top = min(max(1, int(request.query_params.get('top', 5))), 50)
+        except ValueError:
+            return Response({'error': 'months and top must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        today = timezone.now().date()
+        start_date = add_months(today, 1 - months)
+        end_date = month_end(today)
+
+        # Group by month, keeping the top categories of each
+        spending = {month: {'total': 0, 'categories': []} for month in iter_months(start_date, end_date)}
+        for row in top_expense_categories_by_month(request.user, start_date, end_date, top):
+            month_spending = spending[row['month']]
+            month_spending['total'] = row['month_total']
+            month_spending['categories'].append({
+                'category': row['category__name'] or 'Uncategorized',
+                'amount': float(row['expenses'])
             })
-            
-            current_date = (current_date + timedelta(days=32)).replace(day=1)
+
+        trends_data = [
+            {
+                'month': month.strftime('%Y-%m'),
+                'total_spending': float(month_spending['total']),
+                'category_breakdown': month_spending['categories']
+            }
+            for month, month_spending in spending.items()
+        ]
 
         return Response({
             'period': {
@@ -305,3 +226,24 @@ class ReportExportViewSet(viewsets.ModelViewSet):
         else:
             qs = qs.filter(report__user=self.request.user)
         return qs
+
+    def perform_create(self, serializer):
+        """
+        Generate the export file of a report.
+
+        POST /api/reports/report-exports/
+
+        Exports the rows of the report result, or the filtered transactions
+        of a custom report. Supports CSV and EXCEL; the file expires after a
+        week.
+        """
+        export_format = serializer.validated_data['format']
+        try:
+            serializer.instance = exports.generate_export(serializer.validated_data['report'], export_format)
+        except ValueError as exc:
+            field = 'format' if export_format not in exports.EXPORT_WRITERS else 'report'
+            raise ValidationError({field: str(exc)})
+
+    def perform_destroy(self, instance):
+        instance.file.delete(save=False)
+        instance.delete()
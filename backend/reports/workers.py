@@ -0,0 +1,21 @@
+"""
+Entry points of report worker processes.
+
+Spawned workers import this module before Django is set up, so it must not
+import models at module level.
+"""
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def generate_scheduled_report(report_id):
+    """Run the report of a schedule and return its data"""
+    from .generators import run_report
+    from .models import Report
+
+    report = Report.objects.select_related('user').get(pk=report_id)
+    data, _, _ = run_report(report)
+    return data
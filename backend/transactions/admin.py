@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Account, Category, Transaction
+from .models import Account, Category, Transaction, MonthlyCategoryRollup
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
@@ -20,3 +20,10 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ('transaction_type', 'date', 'is_recurring')
     search_fields = ('description', 'user__email', 'notes')
     list_select_related = ('category',)
+
+@admin.register(MonthlyCategoryRollup)
+class MonthlyCategoryRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'month', 'category', 'transaction_type', 'total', 'count')
+    list_filter = ('transaction_type', 'month')
+    search_fields = ('user__email', 'category__name')
+    list_select_related = ('user', 'category')
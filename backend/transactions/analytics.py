@@ -0,0 +1,219 @@
+"""
+Shared aggregation helpers for transaction analytics
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.db.models import F, Sum, Count, Q
+from django.db.models.functions import TruncMonth
+from .models import Category, MonthlyCategoryRollup, Transaction, path_ids
+
+
+def add_months(value, months):
+    """Return the first day of the month `months` away from the month of `value`"""
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def month_end(value):
+    """Return the last day of the month containing `value`"""
+    return add_months(value, 1) - timedelta(days=1)
+
+
+def iter_months(start_date, end_date):
+    """Yield the first day of every month between two dates, inclusive"""
+    current = start_date.replace(day=1)
+    while current <= end_date:
+        yield current
+        current = add_months(current, 1)
+
+
+def monthly_category_totals(queryset):
+    """
+    Group transactions by month and category in a single query.
+
+    Each row holds the month, the category id, name and path, the income and expense
+    sums (None when there were none), the number of expenses and the number of
+    transactions of any type.
+    """
+    return queryset.annotate(
+        month=TruncMonth('date')
+    ).values('month', 'category_id', 'category__name', 'category__path').annotate(
+        income=Sum('amount', filter=Q(transaction_type='INCOME')),
+        expenses=Sum('amount', filter=Q(transaction_type='EXPENSE')),
+        expense_count=Count('id', filter=Q(transaction_type='EXPENSE')),
+        count=Count('id'),
+    ).order_by()
+
+
+def monthly_category_summary(user, start_date, end_date):
+    """
+    Monthly per-category totals for a date range, in the shape of
+    `monthly_category_totals`.
+
+    Whole months are read from MonthlyCategoryRollup, so the cost grows with the
+    number of months rather than transactions. Partial months at either edge of
+    the range fall back to a grouped query over the raw transactions.
+    """
+    full_start = start_date if start_date.day == 1 else add_months(start_date, 1)
+    full_end = end_date if end_date == month_end(end_date) else add_months(end_date, 0) - timedelta(days=1)
+
+    rows = []
+    if full_start <= full_end:
+        rows.extend(MonthlyCategoryRollup.objects.filter(
+            user=user,
+            month__gte=full_start,
+            month__lte=full_end
+        ).values('month', 'category_id', 'category__name', 'category__path').annotate(
+            income=Sum('total', filter=Q(transaction_type='INCOME')),
+            expenses=Sum('total', filter=Q(transaction_type='EXPENSE')),
+            expense_count=Sum('count', filter=Q(transaction_type='EXPENSE')),
+            count=Sum('count'),
+        ).order_by())
+        edges = Q(date__gte=start_date, date__lt=full_start) | Q(date__gt=full_end, date__lte=end_date)
+        needs_edges = start_date < full_start or full_end < end_date
+    else:
+        edges = Q(date__gte=start_date, date__lte=end_date)
+        needs_edges = True
+
+    if needs_edges:
+        rows.extend(monthly_category_totals(Transaction.objects.filter(edges, user=user)))
+    return rows
+
+
+def monthly_breakdown(rows, start_date, end_date):
+    """
+    Sum per-category monthly rows into income, expense and transaction count
+    totals per month. Every month of the range is present, in order, with
+    zeros for months without transactions; expenses are positive.
+    """
+    months = {month: {'income': 0, 'expenses': 0, 'count': 0} for month in iter_months(start_date, end_date)}
+    for row in rows:
+        totals = months[row['month']]
+        totals['income'] += row['income'] or 0
+        totals['expenses'] += abs(row['expenses'] or 0)
+        totals['count'] += row['count']
+    return months
+
+
+def roll_up_categories(user, rows):
+    """
+    Fold per-category rows into subtree totals.
+
+    Every row is added to its own category and to each ancestor named on the
+    category's materialized path, so no tree walk is needed however deep the
+    nesting goes. Returns a dict of category id -> totals with the name and
+    parent id of every category of the user; uncategorized rows are kept under
+    the key None.
+    """
+    totals = {
+        category_id: {'name': name, 'parent': parent_id, 'income': 0, 'expenses': 0, 'expense_count': 0, 'count': 0}
+        for category_id, name, parent_id in Category.objects.filter(user=user).values_list('id', 'name', 'parent_id')
+    }
+    totals[None] = {'name': 'Uncategorized', 'parent': None, 'income': 0, 'expenses': 0, 'expense_count': 0, 'count': 0}
+
+    for row in rows:
+        ancestor_ids = (path_ids(row['category__path']) or [row['category_id']]) if row['category_id'] else [None]
+        for category_id in ancestor_ids:
+            category = totals.get(category_id)
+            if category is None:
+                continue
+            category['income'] += row['income'] or 0
+            category['expenses'] += abs(row['expenses'] or 0)
+            category['expense_count'] += row['expense_count'] or 0
+            category['count'] += row['count']
+    return totals
+
+
+CENTS = Decimal('0.01')
+TAG_TOTALS_SQL = {
+    'postgresql': (
+        "SELECT tag, "
+        "SUM(CASE WHEN t.transaction_type = 'INCOME' THEN t.amount ELSE 0 END), "
+        "SUM(CASE WHEN t.transaction_type = 'EXPENSE' THEN t.amount ELSE 0 END), "
+        "COUNT(*) "
+        "FROM ({transactions}) t CROSS JOIN LATERAL jsonb_array_elements_text(t.tags) AS tag "
+        "WHERE jsonb_typeof(t.tags) = 'array' "
+        "GROUP BY tag"
+    ),
+    'sqlite': (
+        "SELECT tag.value, "
+        "SUM(CASE WHEN t.transaction_type = 'INCOME' THEN t.amount ELSE 0 END), "
+        "SUM(CASE WHEN t.transaction_type = 'EXPENSE' THEN t.amount ELSE 0 END), "
+        "COUNT(*) "
+        "FROM ({transactions}) t, json_each(t.tags) AS tag "
+        "WHERE json_type(t.tags) = 'array' "
+        "GROUP BY tag.value"
+    ),
+}
+
+
+def tag_totals(queryset):
+    """
+    Income and expense totals and transaction counts per tag, in one query.
+
+    The tags arrays of the (already filtered) transactions are unnested in the
+    database, with jsonb_array_elements_text on PostgreSQL and json_each on
+    SQLite, and grouped by tag. Rows come back by descending expenses.
+    """
+    sql = TAG_TOTALS_SQL[connection.vendor]
+    transactions, params = queryset.order_by().values(
+        'amount', 'transaction_type', 'tags'
+    ).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(transactions=transactions), params)
+        rows = [
+            {
+                'tag': tag,
+                'income': Decimal(str(income or 0)).quantize(CENTS),
+                'expenses': Decimal(str(expenses or 0)).quantize(CENTS),
+                'count': count,
+            }
+            for tag, income, expenses, count in cursor.fetchall()
+        ]
+    return sorted(rows, key=lambda row: (-row['expenses'], row['tag']))
+
+
+TOP_CATEGORIES_SQL = (
+    "SELECT month, category_id, category_name, amount, month_total FROM ("
+    "SELECT m.month, m.category_id, m.category_name, m.amount, "
+    "ROW_NUMBER() OVER (PARTITION BY m.month ORDER BY m.amount DESC, m.category_id) AS position, "
+    "SUM(m.amount) OVER (PARTITION BY m.month) AS month_total "
+    "FROM ({months}) m"
+    ") ranked WHERE position <= %s ORDER BY month, position"
+)
+
+
+def top_expense_categories_by_month(user, start_month, end_month, top):
+    """
+    The `top` expense categories of every month in a range of whole months,
+    with each month's total expenses, in one query.
+
+    Monthly per-category expenses are read from MonthlyCategoryRollup and
+    ranked within each month with a ROW_NUMBER() window, so only the top rows
+    leave the database. Rows come back by month, then by descending amount;
+    months without expenses are absent.
+    """
+    months, params = MonthlyCategoryRollup.objects.filter(
+        user=user,
+        transaction_type='EXPENSE',
+        month__gte=start_month,
+        month__lte=end_month,
+    ).values('month', 'category_id').annotate(
+        category_name=F('category__name'),
+        amount=Sum('total'),
+    ).order_by().query.sql_with_params()
+    month_field = MonthlyCategoryRollup._meta.get_field('month')
+    with connection.cursor() as cursor:
+        cursor.execute(TOP_CATEGORIES_SQL.format(months=months), (*params, top))
+        return [
+            {
+                'month': month_field.to_python(month),
+                'category_id': category_id,
+                'category__name': category_name,
+                'expenses': abs(Decimal(str(amount or 0))).quantize(CENTS),
+                'month_total': abs(Decimal(str(month_total or 0))).quantize(CENTS),
+            }
+            for month, category_id, category_name, amount, month_total in cursor.fetchall()
+        ]
+
@@ -0,0 +1,71 @@
+"""
+Streaming export of transactions as CSV or JSON Lines
+"""
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+EXPORT_FIELDS = [
+    'id', 'date', 'description', 'amount', 'transaction_type', 'category_id',
+    'category__name', 'notes', 'tags', 'is_recurring', 'recurring_frequency',
+]
+EXPORT_HEADERS = [
+    'id', 'date', 'description', 'amount', 'transaction_type', 'category_id',
+    'category', 'notes', 'tags', 'is_recurring', 'recurring_frequency',
+]
+EXPORT_CHUNK_SIZE = 2000
+TAGS_INDEX = EXPORT_FIELDS.index('tags')
+
+
+class Echo:
+    """File-like object whose write() hands back the line instead of buffering it"""
+    def write(self, value):
+        return value
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Renderer that only exists so DRF accepts `?format=` for streamed exports.
+
+    Successful exports bypass rendering with a StreamingHttpResponse; error
+    responses are rendered as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, str)):
+            return data
+        return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+class CSVRenderer(StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONLinesRenderer(StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+
+def export_rows(queryset):
+    """Yield transaction rows as dicts, fetched from the database in chunks"""
+    return queryset.values(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    for row in export_rows(queryset):
+        values = [row[field] for field in EXPORT_FIELDS]
+        values[TAGS_INDEX] = ','.join(str(tag) for tag in row['tags'] or [])
+        yield writer.writerow(values)
+
+
+def stream_jsonl(queryset):
+    for row in export_rows(queryset):
+        yield json.dumps(
+            {header: row[field] for header, field in zip(EXPORT_HEADERS, EXPORT_FIELDS)},
+            cls=DjangoJSONEncoder
+        ) + '\n'
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from transactions.imports import IMPORT_BATCH_SIZE, IMPORT_FORMATS, TransactionImporter, detect_format
+
+class Command(BaseCommand):
+    help = 'Bulk import a CSV, OFX or QIF bank statement for a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path of the statement file')
+        parser.add_argument(
+            '--user',
+            type=str,
+            required=True,
+            help='Email of the user to import transactions for'
+        )
+        parser.add_argument(
+            '--format',
+            choices=IMPORT_FORMATS,
+            help='Statement format (detected from the file extension by default)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Number of rows inserted per bulk_create'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User with email {options["user"]} does not exist')
+
+        file_format = options['format'] or detect_format(options['path'])
+        importer = TransactionImporter(user, batch_size=max(1, options['batch_size']))
+        try:
+            with open(options['path'], encoding='utf-8-sig', errors='replace', newline='') as lines:
+                result = importer.import_file(lines, file_format)
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stdout.write(self.style.WARNING(f'Line {error["line"]}: {error["error"]}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result["imported"]} transactions '
+            f'({result["duplicates"]} duplicates, {result["rejected"]} rejected) '
+            f'in {result["elapsed_seconds"]}s, {result["rows_per_second"]} rows/s'
+        ))
@@ -0,0 +1,50 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts.models import User
+from transactions.recurring import MATERIALIZE_BATCH_SIZE, materialize_recurring
+
+class Command(BaseCommand):
+    help = 'Generate the due occurrences of recurring transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Email of specific user to materialize recurring transactions for'
+        )
+        parser.add_argument(
+            '--days-ahead',
+            type=int,
+            default=0,
+            help='Also generate occurrences up to this many days in the future'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=MATERIALIZE_BATCH_SIZE,
+            help='Number of templates expanded per database transaction'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(email=options['user']).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError(f'User with email {options["user"]} does not exist')
+
+        horizon = timezone.now().date() + timedelta(days=max(0, options['days_ahead']))
+        result = materialize_recurring(
+            horizon=horizon,
+            user_ids=user_ids,
+            batch_size=max(1, options['batch_size'])
+        )
+
+        if result['skipped']:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {result["skipped"]} templates with an unrecognised frequency'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result["created"]} occurrences from {result["templates"]} recurring '
+            f'transactions up to {horizon} in {result["elapsed_seconds"]}s'
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from accounts.models import User
+from transactions.rollups import rebuild_user_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly category rollups from raw transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Email of specific user to rebuild rollups for'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of users rebuilt per database transaction'
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user_ids = list(User.objects.filter(email=options['user']).values_list('id', flat=True))
+            if not user_ids:
+                self.stdout.write(
+                    self.style.ERROR(f'User with email {options["user"]} does not exist')
+                )
+                return
+        else:
+            user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+
+        chunk_size = max(1, options['chunk_size'])
+        created_count = 0
+        for offset in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[offset:offset + chunk_size]
+            created_count += rebuild_user_rollups(chunk)
+            self.stdout.write(f'Rebuilt rollups for {offset + len(chunk)}/{len(user_ids)} users')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {created_count} rollup rows')
+        )
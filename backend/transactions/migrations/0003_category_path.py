@@ -0,0 +1,39 @@
+# Generated by Django 4.2.13 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    Category = apps.get_model('transactions', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def build_path(category_id, seen=()):
+        if category_id not in paths:
+            parent_id = parents.get(category_id)
+            if parent_id is None or parent_id in seen:
+                paths[category_id] = f'/{category_id}/'
+            else:
+                paths[category_id] = f'{build_path(parent_id, seen + (category_id,))}{category_id}/'
+        return paths[category_id]
+
+    categories = list(Category.objects.only('id'))
+    for category in categories:
+        category.path = build_path(category.id)
+    Category.objects.bulk_update(categories, ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_monthlycategoryrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Materialized ancestor path, e.g. /3/17/42/', max_length=255),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+INDEX_NAME = 'transactions_tags_gin'
+
+
+def create_tags_index(apps, schema_editor):
+    # GIN indexes are PostgreSQL only; other backends keep the unindexed fallback
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} '
+        'ON transactions_transaction USING gin (tags jsonb_ops)'
+    )
+
+
+def drop_tags_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('transactions', '0003_category_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_tags_index, drop_tags_index),
+    ]
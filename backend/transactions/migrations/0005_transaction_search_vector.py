@@ -0,0 +1,71 @@
+# Generated by Django 4.2.13 on 2026-10-18 02:52
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Descriptions weigh more than notes when ranking matches
+CREATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION transactions_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.notes, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_search_vector_trigger ON transactions_transaction;
+CREATE TRIGGER transactions_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF description, notes, search_vector ON transactions_transaction
+    FOR EACH ROW EXECUTE PROCEDURE transactions_search_vector_update();
+"""
+
+BACKFILL_SQL = """
+UPDATE transactions_transaction SET search_vector =
+    setweight(to_tsvector('english', coalesce(description, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(notes, '')), 'B')
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS transactions_search_vector_trigger ON transactions_transaction;
+DROP FUNCTION IF EXISTS transactions_search_vector_update();
+"""
+
+INDEX_NAME = 'transactions_search_vector_gin'
+
+
+def create_search_trigger(apps, schema_editor):
+    # Full-text search is PostgreSQL only; other backends search with icontains
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_TRIGGER_SQL)
+    schema_editor.execute(BACKFILL_SQL)
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} '
+        'ON transactions_transaction USING gin (search_vector)'
+    )
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+    schema_editor.execute(DROP_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('transactions', '0004_transaction_tags_gin_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.13 on 2026-10-18 02:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_transaction_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='materialized_until',
+            field=models.DateField(blank=True, editable=False, help_text='Occurrences of this template exist up to this date', null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='recurring_template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='transactions.transaction'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('is_recurring', True), ('recurring_template__isnull', True)), fields=['id'], name='transaction_recurring_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('recurring_template', 'date'), name='unique_recurring_occurrence'),
+        ),
+    ]
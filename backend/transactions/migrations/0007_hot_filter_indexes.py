@@ -0,0 +1,33 @@
+# Generated by Django 4.2.13 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_recurring_occurrences'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['user', 'is_income'], name='category_user_income_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['user', 'parent'], name='category_user_parent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-date', '-id'], name='transaction_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'transaction_type', 'date'], include=('amount', 'category'), name='transaction_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'category', 'date'], include=('amount', 'transaction_type'), name='transaction_user_cat_date_idx'),
+        ),
+    ]
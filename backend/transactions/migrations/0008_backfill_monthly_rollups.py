@@ -0,0 +1,43 @@
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    MonthlyCategoryRollup = apps.get_model('transactions', 'MonthlyCategoryRollup')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    rows = Transaction.objects.annotate(
+        rollup_month=TruncMonth('date')
+    ).values('user_id', 'rollup_month', 'category_id', 'transaction_type').annotate(
+        rollup_total=Sum('amount'),
+        rollup_count=Count('id')
+    ).order_by()
+
+    # Rows written by the signals since the table was created are rebuilt too
+    MonthlyCategoryRollup.objects.all().delete()
+    MonthlyCategoryRollup.objects.bulk_create(
+        (
+            MonthlyCategoryRollup(
+                user_id=row['user_id'],
+                month=row['rollup_month'],
+                category_id=row['category_id'],
+                transaction_type=row['transaction_type'],
+                total=row['rollup_total'] or Decimal('0'),
+                count=row['rollup_count'],
+            )
+            for row in rows.iterator(chunk_size=2000)
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.utils.translation import gettext_lazy as _
 from accounts.models import User
 
@@ -13,16 +17,57 @@ class Category(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categories')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subcategories')
     is_income = models.BooleanField(default=False)
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False,
+                            help_text="Materialized ancestor path, e.g. /3/17/42/")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = 'Categories'
         unique_together = ['name', 'user']
+        indexes = [
+            models.Index(fields=['user', 'is_income'], name='category_user_income_idx'),
+            models.Index(fields=['user', 'parent'], name='category_user_parent_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def ancestor_ids(self):
+        """Ids on the path from the root category down to this one"""
+        return path_ids(self.path)
+
+    def clean(self):
+        """Model validation"""
+        if self.parent_id and self.pk:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if self.parent_id == self.pk or f'/{self.pk}/' in parent_path:
+                raise ValidationError({'parent': 'A category cannot be nested under itself or its subcategories.'})
+
+    def save(self, *args, **kwargs):
+        self.clean()
+        super().save(*args, **kwargs)
+
+        # Keep the materialized path of this category and its subtree in sync
+        parent_path = '/'
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or '/'
+        new_path = f'{parent_path}{self.pk}/'
+        old_path = self.path
+        if new_path != old_path:
+            Category.objects.filter(pk=self.pk).update(path=new_path)
+            if old_path:
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1))
+                )
+            self.path = new_path
+
+
+def path_ids(path):
+    """Return the category ids on a materialized path, root first"""
+    return [int(part) for part in (path or '').split('/') if part]
+
 class Transaction(models.Model):
     """
     Financial transactions (income and expenses)
@@ -45,7 +90,41 @@ class Transaction(models.Model):
     tags = models.JSONField(default=list, blank=True)
     is_recurring = models.BooleanField(default=False)
     recurring_frequency = models.CharField(max_length=20, blank=True)
+    # Occurrences generated from a recurring template point back at it
+    recurring_template = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences'
+    )
+    materialized_until = models.DateField(null=True, blank=True, editable=False,
+                                          help_text="Occurrences of this template exist up to this date")
     attachment = models.FileField(upload_to='transaction_attachments/', null=True, blank=True)
+    # Maintained by a database trigger on PostgreSQL, unused elsewhere
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurring_template', 'date'], name='unique_recurring_occurrence'
+            ),
+        ]
+        indexes = [
+            # Transaction list and its keyset pagination
+            models.Index(fields=['user', '-date', '-id'], name='transaction_user_date_idx'),
+            # Date-ranged analytics per type and per category; amount is carried
+            # along on PostgreSQL so the sums can be answered from the index
+            models.Index(
+                fields=['user', 'transaction_type', 'date'], include=['amount', 'category'],
+                name='transaction_user_type_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'category', 'date'], include=['amount', 'transaction_type'],
+                name='transaction_user_cat_date_idx'
+            ),
+            # Small partial index the recurring materializer walks every night
+            models.Index(
+                fields=['id'], name='transaction_recurring_idx',
+                condition=models.Q(is_recurring=True, recurring_template__isnull=True)
+            ),
+        ]
 
     def __str__(self):
         return f"{self.description} - {self.amount} ({self.transaction_type})"
@@ -77,3 +156,23 @@ class Account(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.account_type})"
+
+class MonthlyCategoryRollup(models.Model):
+    """
+    Per-user monthly totals of transactions by category and type.
+
+    Maintained incrementally by the Transaction signal handlers so analytics can
+    read one row per month and category instead of scanning raw transactions.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_rollups')
+    month = models.DateField(help_text="First day of the month")
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='monthly_rollups')
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'month', 'category', 'transaction_type']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.category} {self.transaction_type}: {self.total} ({self.count})"
@@ -0,0 +1,191 @@
+"""
+Materialization of recurring transactions into concrete occurrences
+"""
+import calendar
+import time
+from datetime import date, timedelta
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from core.analytics_cache import bump_users_data_version
+from .models import Transaction
+from .rollups import rollup_key, apply_rollup_deltas
+from .signals import transactions_bulk_created
+
+MATERIALIZE_BATCH_SIZE = 2000
+
+# Frequency -> (days, months) between occurrences
+RECURRING_INTERVALS = {
+    'DAILY': (1, 0),
+    'WEEKLY': (7, 0),
+    'BIWEEKLY': (14, 0),
+    'MONTHLY': (0, 1),
+    'QUARTERLY': (0, 3),
+    'YEARLY': (0, 12),
+}
+
+TEMPLATE_FIELDS = (
+    'id', 'user_id', 'amount', 'description', 'category_id', 'transaction_type',
+    'date', 'notes', 'tags', 'recurring_frequency', 'materialized_until',
+)
+
+
+def nth_occurrence(anchor, frequency, n):
+    """
+    Return the date of the n-th occurrence after `anchor`.
+
+    Monthly steps are counted from the anchor rather than from the previous
+    occurrence, so a template on the 31st lands on the last day of shorter
+    months without drifting to the 28th for good.
+    """
+    days, months = RECURRING_INTERVALS[frequency]
+    if days:
+        return anchor + timedelta(days=days * n)
+    month_index = anchor.year * 12 + anchor.month - 1 + months * n
+    year, month = month_index // 12, month_index % 12 + 1
+    return date(year, month, min(anchor.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_dates(anchor, frequency, after, until):
+    """Yield the occurrence dates of a template in the range (after, until]"""
+    n = 1
+    while True:
+        occurrence = nth_occurrence(anchor, frequency, n)
+        if occurrence > until:
+            return
+        if occurrence > after:
+            yield occurrence
+        n += 1
+
+
+def normalize_frequency(value):
+    frequency = (value or '').strip().upper().replace('-', '')
+    return frequency if frequency in RECURRING_INTERVALS else None
+
+
+class RecurringMaterializer:
+    """
+    Expand recurring template transactions into occurrences up to a horizon.
+
+    Templates are locked and read in keyset-ordered batches across all users.
+    For each one, occurrences after its `materialized_until` watermark (or its
+    own date on the first run) are built in memory, written with one
+    bulk_create per batch and the watermarks advanced in the same database
+    transaction. Re-running therefore only picks up what became due since,
+    occurrences a user deleted are not recreated, and the unique
+    (recurring_template, date) constraint backs up the watermark. Templates
+    with an unrecognised frequency are counted as skipped.
+    """
+
+    def __init__(self, horizon=None, user_ids=None, batch_size=MATERIALIZE_BATCH_SIZE):
+        self.horizon = horizon or timezone.now().date()
+        self.user_ids = user_ids
+        self.batch_size = batch_size
+        self.templates = 0
+        self.created = 0
+        self.skipped = 0
+        self.touched_users = set()
+
+    def templates_queryset(self):
+        queryset = Transaction.objects.filter(
+            Q(materialized_until__isnull=True) | Q(materialized_until__lt=self.horizon),
+            is_recurring=True,
+            recurring_template__isnull=True,
+            date__lt=self.horizon,
+        ).exclude(recurring_frequency='')
+        if self.user_ids is not None:
+            queryset = queryset.filter(user_id__in=self.user_ids)
+        return queryset.order_by('id')
+
+    def run(self):
+        started = time.monotonic()
+        last_id = 0
+        while True:
+            last_id = self.materialize_batch(last_id)
+            if last_id is None:
+                break
+
+        # bulk_create skips post_save, so cached analytics are invalidated here
+        if self.touched_users:
+            bump_users_data_version(self.touched_users)
+
+        return {
+            'templates': self.templates,
+            'created': self.created,
+            'skipped': self.skipped,
+            'elapsed_seconds': round(time.monotonic() - started, 3),
+        }
+
+    def build_occurrences(self, template, frequency):
+        after = template['materialized_until'] or template['date']
+        return [
+            Transaction(
+                user_id=template['user_id'],
+                amount=template['amount'],
+                description=template['description'],
+                category_id=template['category_id'],
+                transaction_type=template['transaction_type'],
+                date=occurrence_date,
+                notes=template['notes'],
+                tags=template['tags'],
+                recurring_template_id=template['id'],
+            )
+            for occurrence_date in occurrence_dates(template['date'], frequency, after, self.horizon)
+        ]
+
+    def materialize_batch(self, last_id):
+        """Materialize the next batch of templates after `last_id`; return the new position"""
+        with db_transaction.atomic():
+            # Templates locked by a concurrent run are left to that run
+            batch = list(
+                self.templates_queryset().select_for_update(skip_locked=True).filter(
+                    id__gt=last_id
+                ).values(*TEMPLATE_FIELDS)[:self.batch_size]
+            )
+            if not batch:
+                return None
+
+            occurrences = []
+            materialized_ids = []
+            for template in batch:
+                frequency = normalize_frequency(template['recurring_frequency'])
+                if frequency is None:
+                    self.skipped += 1
+                    continue
+                occurrences.extend(self.build_occurrences(template, frequency))
+                materialized_ids.append(template['id'])
+
+            # Occurrences stored by an earlier run (e.g. after materialized_until
+            # was reset) are left out, so only new rows reach the rollups, the
+            # budget spend and the counters; the templates are locked, so no
+            # other run inserts them meanwhile
+            if occurrences:
+                existing = set(Transaction.objects.filter(
+                    recurring_template_id__in=materialized_ids,
+                    date__gte=min(occurrence.date for occurrence in occurrences),
+                    date__lte=self.horizon,
+                ).values_list('recurring_template_id', 'date'))
+                occurrences = [
+                    occurrence for occurrence in occurrences
+                    if (occurrence.recurring_template_id, occurrence.date) not in existing
+                ]
+            Transaction.objects.bulk_create(occurrences, batch_size=self.batch_size)
+            Transaction.objects.filter(id__in=materialized_ids).update(materialized_until=self.horizon)
+
+            rollup_deltas = {}
+            for occurrence in occurrences:
+                key = rollup_key(occurrence.user_id, occurrence.date, occurrence.category_id, occurrence.transaction_type)
+                total, count = rollup_deltas.get(key, (0, 0))
+                rollup_deltas[key] = (total + occurrence.amount, count + 1)
+            apply_rollup_deltas(rollup_deltas)
+            transactions_bulk_created.send(sender=Transaction, transactions=occurrences)
+
+        self.templates += len(batch)
+        self.created += len(occurrences)
+        self.touched_users.update(occurrence.user_id for occurrence in occurrences)
+        return batch[-1]['id']
+
+
+def materialize_recurring(horizon=None, user_ids=None, batch_size=MATERIALIZE_BATCH_SIZE):
+    """Materialize due occurrences of every recurring template; safe to re-run"""
+    return RecurringMaterializer(horizon, user_ids, batch_size).run()
@@ -0,0 +1,121 @@
+"""
+Maintenance of the MonthlyCategoryRollup table
+"""
+from decimal import Decimal
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Sum, Count, F
+from django.db.models.functions import TruncMonth
+from .models import MonthlyCategoryRollup, Transaction
+
+
+def rollup_key(user_id, date, category_id, transaction_type):
+    """Return the rollup key a transaction with these values is counted under"""
+    return (user_id, date.replace(day=1), category_id, transaction_type)
+
+
+def apply_rollup_delta(key, total, count):
+    """Add `total` and `count` to the rollup row for `key`, creating it if needed"""
+    user_id, month, category_id, transaction_type = key
+    lookup = {
+        'user_id': user_id,
+        'month': month,
+        'category_id': category_id,
+        'transaction_type': transaction_type,
+    }
+    with db_transaction.atomic():
+        # Rows for deleted categories fall back to category=NULL and may repeat,
+        # so only ever adjust a single matching row.
+        rollup_id = MonthlyCategoryRollup.objects.select_for_update().filter(
+            **lookup
+        ).values_list('id', flat=True).first()
+        if rollup_id is None:
+            try:
+                with db_transaction.atomic():
+                    MonthlyCategoryRollup.objects.create(total=total, count=count, **lookup)
+                return
+            except IntegrityError:
+                # Created concurrently by another writer
+                rollup_id = MonthlyCategoryRollup.objects.select_for_update().filter(
+                    **lookup
+                ).values_list('id', flat=True).first()
+        MonthlyCategoryRollup.objects.filter(id=rollup_id).update(
+            total=F('total') + total,
+            count=F('count') + count
+        )
+
+
+def apply_rollup_deltas(deltas):
+    """Apply a mapping of rollup key -> (total, count) deltas"""
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if len(deltas) <= 2:
+        # Single transaction writes touch at most two rows
+        for key, (total, count) in deltas.items():
+            apply_rollup_delta(key, total, count)
+        return
+
+    # Bulk writers (imports, materializers) adjust every row in a few statements
+    with db_transaction.atomic():
+        existing = {}
+        for rollup in MonthlyCategoryRollup.objects.select_for_update().filter(
+            user_id__in={key[0] for key in deltas},
+            month__in={key[1] for key in deltas}
+        ):
+            key = (rollup.user_id, rollup.month, rollup.category_id, rollup.transaction_type)
+            existing.setdefault(key, rollup)
+
+        to_update = []
+        to_create = []
+        for key, (total, count) in deltas.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                user_id, month, category_id, transaction_type = key
+                to_create.append(MonthlyCategoryRollup(
+                    user_id=user_id,
+                    month=month,
+                    category_id=category_id,
+                    transaction_type=transaction_type,
+                    total=total,
+                    count=count
+                ))
+            else:
+                rollup.total += total
+                rollup.count += count
+                to_update.append(rollup)
+
+        MonthlyCategoryRollup.objects.bulk_update(to_update, ['total', 'count'], batch_size=500)
+        try:
+            with db_transaction.atomic():
+                MonthlyCategoryRollup.objects.bulk_create(to_create, batch_size=500)
+        except IntegrityError:
+            # Another writer created some of the rows meanwhile
+            for rollup in to_create:
+                key = (rollup.user_id, rollup.month, rollup.category_id, rollup.transaction_type)
+                apply_rollup_delta(key, rollup.total, rollup.count)
+
+
+def rebuild_user_rollups(user_ids, batch_size=1000):
+    """Recompute the rollup rows of the given users from their transactions"""
+    rows = Transaction.objects.filter(user_id__in=user_ids).annotate(
+        rollup_month=TruncMonth('date')
+    ).values('user_id', 'rollup_month', 'category_id', 'transaction_type').annotate(
+        rollup_total=Sum('amount'),
+        rollup_count=Count('id')
+    ).order_by()
+
+    with db_transaction.atomic():
+        MonthlyCategoryRollup.objects.filter(user_id__in=user_ids).delete()
+        created = MonthlyCategoryRollup.objects.bulk_create(
+            (
+                MonthlyCategoryRollup(
+                    user_id=row['user_id'],
+                    month=row['rollup_month'],
+                    category_id=row['category_id'],
+                    transaction_type=row['transaction_type'],
+                    total=row['rollup_total'] or Decimal('0'),
+                    count=row['rollup_count']
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=batch_size
+        )
+    return len(created)
@@ -0,0 +1,47 @@
+"""
+Full-text search over transaction descriptions and notes
+"""
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection
+from decimal import Decimal
+from django.db.models import DecimalField, F, Q, TextField, Value
+from django.db.models.functions import Cast, Concat
+
+SEARCH_CONFIG = 'english'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+# ts_rank is a float4; it is rounded to a fixed-precision numeric so cursors
+# can carry it exactly and keyset comparisons match the stored value
+RANK_FIELD = DecimalField(max_digits=12, decimal_places=6)
+
+
+def search_transactions(queryset, text):
+    """
+    Filter transactions matching a search string and annotate each with a
+    `search_rank` (a Decimal) and a highlighted `search_snippet`.
+
+    On PostgreSQL the query runs against the trigger-maintained, GIN-indexed
+    `search_vector` column, so finding matches does not scan the user's whole
+    history. Other backends fall back to a case-insensitive substring match
+    with a constant rank and the plain description as the snippet.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.filter(
+            Q(description__icontains=text) | Q(notes__icontains=text)
+        ).annotate(
+            search_rank=Value(Decimal('0'), output_field=RANK_FIELD),
+            search_snippet=F('description'),
+        )
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=Cast(SearchRank(F('search_vector'), query), RANK_FIELD),
+        search_snippet=SearchHeadline(
+            Concat('description', Value(' - '), 'notes', output_field=TextField()),
+            query,
+            config=SEARCH_CONFIG,
+            start_sel=HIGHLIGHT_START,
+            stop_sel=HIGHLIGHT_STOP,
+            max_fragments=2,
+        ),
+    )
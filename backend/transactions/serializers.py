@@ -16,18 +16,41 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at', 'user', 'transactions_count')
 
     def get_transactions_count(self, obj):
-        return obj.transactions.count()
+        # CategoryViewSet annotates the count; single saved instances fall back to a query
+        count = getattr(obj, 'transactions_count', None)
+        return count if count is not None else obj.transactions.count()
+
+    def validate_parent(self, parent):
+        # The parent's path lists every ancestor, including the parent itself
+        if parent and self.instance and f'/{self.instance.pk}/' in parent.path:
+            raise serializers.ValidationError('A category cannot be nested under itself or its subcategories.')
+        return parent
+
+class TransactionCategorySerializer(serializers.ModelSerializer):
+    """Category nested inside a transaction, without the per-category transaction count"""
+    class Meta:
+        model = Category
+        fields = '__all__'
+        read_only_fields = ('id', 'created_at', 'updated_at', 'user')
 
 class TransactionSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
+    category = TransactionCategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source='category', write_only=True, required=True
     )
     
     class Meta:
         model = Transaction
-        fields = '__all__'
-        read_only_fields = ('id', 'created_at', 'updated_at', 'user')
+        exclude = ('search_vector',)
+        read_only_fields = ('id', 'created_at', 'updated_at', 'user', 'recurring_template')
         extra_kwargs = {
             'category': {'read_only': True},
-        } 
\ No newline at end of file
+        }
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Search results carry their relevance and a highlighted snippet
+        if hasattr(instance, 'search_rank'):
+            data['search_rank'] = float(instance.search_rank)
+            data['search_snippet'] = instance.search_snippet
+        return data 
\ No newline at end of file
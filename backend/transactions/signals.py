@@ -0,0 +1,70 @@
+from decimal import Decimal
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+from core.analytics_cache import bump_user_data_version
+from .models import Category, Transaction
+from .rollups import rollup_key, apply_rollup_deltas
+
+# Sent by bulk writers (statement imports, the recurring materializer) with the
+# list of `transactions` they inserted, since bulk_create skips post_save
+transactions_bulk_created = Signal()
+
+
+def _instance_rollup_values(instance):
+    """Return the rollup key and amount of a saved instance, coercing raw assignments"""
+    date = Transaction._meta.get_field('date').to_python(instance.date)
+    key = rollup_key(instance.user_id, date, instance.category_id, instance.transaction_type)
+    return key, Decimal(str(instance.amount))
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_rollup_state(sender, instance, raw=False, **kwargs):
+    """
+    Capture the stored values of an updated transaction before they change.
+
+    Other apps' post_save receivers read them from `_rollup_previous` too.
+    """
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._rollup_previous = Transaction.objects.filter(pk=instance.pk).values(
+        'user_id', 'date', 'category_id', 'transaction_type', 'amount'
+    ).first()
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move the transaction's amount between rollup rows when it is created or edited"""
+    if raw:
+        return
+    deltas = {}
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        old_key = rollup_key(previous['user_id'], previous['date'], previous['category_id'], previous['transaction_type'])
+        deltas[old_key] = (-previous['amount'], -1)
+
+    new_key, amount = _instance_rollup_values(instance)
+    total, count = deltas.get(new_key, (0, 0))
+    deltas[new_key] = (total + amount, count + 1)
+    apply_rollup_deltas(deltas)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    """Remove a deleted transaction from its rollup row"""
+    # Cascades from deleting a user or category clean up the rollups themselves
+    if not (isinstance(origin, Transaction) or (isinstance(origin, QuerySet) and origin.model is Transaction)):
+        return
+    key, amount = _instance_rollup_values(instance)
+    apply_rollup_deltas({key: (-amount, -1)})
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_analytics_cache(sender, instance, raw=False, **kwargs):
+    """Make cached analytics of the owner stale after any write to their data"""
+    if not raw:
+        bump_user_data_version(instance.user_id)
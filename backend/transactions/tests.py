@@ -3,8 +3,31 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from decimal import Decimal
 from datetime import datetime, timedelta
-from transactions.models import Transaction, Category
-from rest_framework.test import APITestCase, APIClient
+from io import StringIO
+import json
+import os
+import tempfile
+import tracemalloc
+from unittest import mock
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.db.models import Case, Count, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from core.analytics_cache import analytics_cache_stats
+from core.testing import QueryPlanAssertions
+from budgets.models import Budget, BudgetCategory
+from transactions.imports import TransactionImporter
+from transactions.search import RANK_FIELD
+from transactions.views import TransactionCursorPagination
+from transactions.recurring import materialize_recurring
+from transactions.models import Transaction, Category, MonthlyCategoryRollup
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, APIClient
 from rest_framework import status
 
 User = get_user_model()
@@ -86,3 +109,885 @@ class TransactionViewSetTestCase(APITestCase):
             for category in categories:
                 self.assertIsInstance(category['income'], float)
                 self.assertIsInstance(category['expenses'], float)
+
+
+class TransactionPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='pageuser',
+            email='page@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+
+        # Several transactions share a date so the cursor has to break ties on id
+        today = timezone.now().date()
+        for i in range(7):
+            Transaction.objects.create(
+                user=self.user,
+                amount=Decimal('10.00') + i,
+                description=f'Expense {i}',
+                category=self.food if i % 2 else self.travel,
+                transaction_type='EXPENSE',
+                date=today - timedelta(days=i // 3),
+                tags=['trip'] if i < 3 else [],
+            )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_cursor_walks_all_rows_once_in_order(self):
+        """Following next links returns every transaction exactly once, newest first"""
+        url = '/api/transactions/transactions/?page_size=3'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen.extend((item['date'], item['id']) for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/transactions/transactions/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filters(self):
+        url = '/api/transactions/transactions/'
+        response = self.client.get(url, {'category': self.food.id})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(url, {'amount_min': '12', 'amount_max': '14'})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(url, {'date_from': timezone.now().date().isoformat()})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(url, {'tags': 'trip'})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(url, {'transaction_type': 'INCOME'})
+        self.assertEqual(len(response.data['results']), 0)
+
+
+class DashboardStatsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='dashuser',
+            email='dash@example.com',
+            password='testpass123'
+        )
+        self.salary = Category.objects.create(name='Salary', user=self.user, is_income=True)
+        self.food = Category.objects.create(name='Food', user=self.user)
+
+        # A year of history, one income and two expenses in the middle of each month
+        today = timezone.now().date()
+        for months_back in range(12):
+            month_index = today.year * 12 + today.month - 1 - months_back
+            day = datetime(month_index // 12, month_index % 12 + 1, 15).date()
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('1000.00'), description='Salary',
+                category=self.salary, transaction_type='INCOME', date=day
+            )
+            for amount in ('100.00', '50.00'):
+                Transaction.objects.create(
+                    user=self.user, amount=Decimal(amount), description='Groceries',
+                    category=self.food, transaction_type='EXPENSE', date=day
+                )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_trend_covers_six_distinct_consecutive_months(self):
+        response = self.client.get('/api/transactions/transactions/dashboard_stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        trend = response.data['trend_data']
+        months = [item['month'] for item in trend]
+        self.assertEqual(len(set(months)), 6)
+        self.assertEqual(months, sorted(months, reverse=True))
+        for item in trend:
+            self.assertEqual(item['income'], 1000.0)
+            self.assertEqual(item['expenses'], 150.0)
+
+        statistics = response.data['statistics']
+        self.assertEqual(statistics['total_income'], 1000.0)
+        self.assertEqual(statistics['total_expenses'], 150.0)
+        self.assertEqual(statistics['transaction_count'], 3)
+        self.assertEqual(response.data['category_breakdown'], [{'category': 'Food', 'amount': 150.0}])
+
+    def test_query_count(self):
+        """Aggregates come from one grouped query regardless of history size"""
+        # data version + grouped aggregate + recent transactions with their categories
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/transactions/transactions/dashboard_stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(3):
+            self.client.get('/api/transactions/transactions/dashboard_stats/?time_range=current_year')
+
+
+class MonthlyCategoryRollupTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rollupuser',
+            email='rollup@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.travel = Category.objects.create(name='Travel', user=self.user)
+        self.day = datetime(2024, 3, 10).date()
+
+    def rollups(self):
+        return {
+            (r.month, r.category_id, r.transaction_type): (r.total, r.count)
+            for r in MonthlyCategoryRollup.objects.filter(user=self.user)
+            if r.count
+        }
+
+    def expected_rollups(self):
+        rows = Transaction.objects.filter(user=self.user).annotate(
+            m=TruncMonth('date')
+        ).values('m', 'category_id', 'transaction_type').annotate(t=Sum('amount'), c=Count('id'))
+        return {(r['m'], r['category_id'], r['transaction_type']): (r['t'], r['c']) for r in rows}
+
+    def test_signals_track_create_update_and_delete(self):
+        t1 = Transaction.objects.create(
+            user=self.user, amount=Decimal('20.00'), description='Lunch',
+            category=self.food, transaction_type='EXPENSE', date=self.day
+        )
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('5.00'), description='Coffee',
+            category=self.food, transaction_type='EXPENSE', date=self.day
+        )
+        self.assertEqual(self.rollups(), {(datetime(2024, 3, 1).date(), self.food.id, 'EXPENSE'): (Decimal('25.00'), 2)})
+
+        # Move to another month and category
+        t1.date = datetime(2024, 4, 2).date()
+        t1.category = self.travel
+        t1.amount = Decimal('30.00')
+        t1.save()
+        self.assertEqual(self.rollups(), self.expected_rollups())
+
+        t1.delete()
+        Transaction.objects.filter(user=self.user).delete()
+        self.assertEqual(self.rollups(), {})
+
+    def test_rebuild_command(self):
+        for i in range(5):
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('10.00'), description='Item',
+                category=self.food if i % 2 else self.travel,
+                transaction_type='EXPENSE', date=self.day + timedelta(days=30 * i)
+            )
+        MonthlyCategoryRollup.objects.all().delete()
+
+        call_command('rebuild_rollups', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.rollups(), self.expected_rollups())
+
+    def test_deleted_category_rolls_into_uncategorized(self):
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('12.00'), description='Taxi',
+            category=self.travel, transaction_type='EXPENSE', date=self.day
+        )
+        self.travel.delete()
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('8.00'), description='Bus',
+            category=None, transaction_type='EXPENSE', date=self.day
+        )
+        total = MonthlyCategoryRollup.objects.filter(user=self.user, category__isnull=True).aggregate(
+            total=Sum('total'))['total']
+        self.assertEqual(total, Decimal('20.00'))
+
+
+class TransactionExportTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='exportuser',
+            email='export@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Food', user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def seed(self, count):
+        start = datetime(2020, 1, 1).date()
+        Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    user=self.user, amount=Decimal('12.34'), description=f'Purchase number {i}',
+                    category=self.category, transaction_type='EXPENSE',
+                    date=start + timedelta(days=i % 1500), tags=['export'],
+                    notes='Seeded row for the export memory test'
+                )
+                for i in range(count)
+            ],
+            batch_size=5000
+        )
+
+    def test_csv_and_jsonl_formats(self):
+        self.seed(3)
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('99.00'), description='Salary',
+            category=None, transaction_type='INCOME', date=datetime(2020, 2, 1).date()
+        )
+
+        response = self.client.get('/api/transactions/transactions/export/?format=csv&transaction_type=EXPENSE')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(lines[0].split(',')[:4], ['id', 'date', 'description', 'amount'])
+        self.assertEqual(len(lines), 4)
+
+        response = self.client.get('/api/transactions/transactions/export/?format=jsonl')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[-1]['category'], None)
+        self.assertEqual(rows[0]['tags'], ['export'])
+
+    def measure_export(self):
+        tracemalloc.start()
+        try:
+            response = self.client.get('/api/transactions/transactions/export/?format=csv')
+            exported_bytes = 0
+            for chunk in response.streaming_content:
+                exported_bytes += len(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return exported_bytes, peak
+
+    def test_export_memory_is_bounded(self):
+        """Peak memory while streaming does not grow with the number of rows"""
+        self.seed(5000)
+        small_bytes, small_peak = self.measure_export()
+
+        self.seed(25000)
+        large_bytes, large_peak = self.measure_export()
+
+        self.assertGreater(large_bytes, 5 * small_bytes)
+        self.assertLess(large_peak, small_peak * 1.5)
+        self.assertLess(large_peak, large_bytes)
+
+
+class TransactionImportTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='importuser',
+            email='import@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, name, content, **data):
+        return self.client.post(
+            '/api/transactions/transactions/import/',
+            {'file': SimpleUploadedFile(name, content.encode()), **data},
+            format='multipart'
+        )
+
+    def test_csv_import(self):
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('4.50'), description='Coffee',
+            category=self.food, transaction_type='EXPENSE', date=datetime(2024, 1, 2).date()
+        )
+        content = (
+            'Date,Description,Amount,Category,Tags\n'
+            '2024-01-02,Coffee,-4.50,food,\n'           # duplicate of an existing row
+            '2024-01-03,Groceries,-52.10,Food,"weekly,home"\n'
+            '01/15/2024,Salary,2500.00,Salary,\n'
+            '2024-01-16,Broken,abc,Food,\n'             # rejected
+        )
+        response = self.upload('statement.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(response.data['duplicates'], 1)
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 5)
+        self.assertIn('rows_per_second', response.data)
+
+        groceries = Transaction.objects.get(user=self.user, description='Groceries')
+        self.assertEqual(groceries.amount, Decimal('52.10'))
+        self.assertEqual(groceries.transaction_type, 'EXPENSE')
+        self.assertEqual(groceries.category, self.food)
+        self.assertEqual(groceries.tags, ['weekly', 'home'])
+
+        salary = Transaction.objects.get(user=self.user, description='Salary')
+        self.assertEqual(salary.transaction_type, 'INCOME')
+        self.assertTrue(salary.category.is_income)
+
+        # Rollups include the bulk inserted rows
+        self.assertEqual(
+            MonthlyCategoryRollup.objects.get(user=self.user, category=self.food, transaction_type='EXPENSE').total,
+            Decimal('56.60')
+        )
+
+    def test_identical_rows_in_one_file_are_all_imported(self):
+        content = (
+            'Date,Description,Amount\n'
+            '2024-01-02,Coffee,-4.50\n'
+            '2024-01-02,Coffee,-4.50\n'
+        )
+        response = self.upload('statement.csv', content)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(response.data['duplicates'], 0)
+
+        # Re-importing matches each row against one stored transaction
+        response = self.upload('statement.csv', content)
+        self.assertEqual(response.data['imported'], 0)
+        self.assertEqual(response.data['duplicates'], 2)
+
+        # A later statement with a third coffee only adds that one, across batches too
+        rows = [{'line': line, 'date': '2024-01-02', 'description': 'Coffee', 'amount': '-4.50'} for line in range(3)]
+        result = TransactionImporter(self.user, batch_size=1).import_rows(rows)
+        self.assertEqual((result['imported'], result['duplicates']), (1, 2))
+        self.assertEqual(Transaction.objects.filter(user=self.user, description='Coffee').count(), 3)
+
+    def test_ofx_import(self):
+        content = (
+            'OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+            '<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20240105120000\n<TRNAMT>-15.25\n<FITID>1\n<NAME>Book store\n</STMTTRN>\n'
+            '<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20240106</DTPOSTED><TRNAMT>100.00</TRNAMT>'
+            '<NAME>Refund</NAME><MEMO>Order 42</MEMO></STMTTRN>\n'
+            '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+        )
+        response = self.upload('statement.ofx', content)
+        self.assertEqual(response.data['imported'], 2)
+        refund = Transaction.objects.get(user=self.user, description='Refund')
+        self.assertEqual(refund.notes, 'Order 42')
+        self.assertEqual(refund.date, datetime(2024, 1, 6).date())
+
+    def test_qif_import_command(self):
+        content = (
+            '!Type:Bank\n'
+            "D1/31'24\nT-20.00\nPPharmacy\nLHealth\n^\n"
+            'D02/01/2024\nT-8.00\nPBakery\nLFood\n^\n'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.qif', delete=False) as statement:
+            statement.write(content)
+        self.addCleanup(os.remove, statement.name)
+
+        out = StringIO()
+        call_command('import_transactions', statement.name, user='import@example.com', stdout=out)
+        self.assertIn('Imported 2 transactions', out.getvalue())
+        pharmacy = Transaction.objects.get(user=self.user, description='Pharmacy')
+        self.assertEqual(pharmacy.date, datetime(2024, 1, 31).date())
+        self.assertEqual(pharmacy.category.name, 'Health')
+
+    def test_queries_scale_with_batches(self):
+        """Rows are written in batches, not one insert per row"""
+        lines = ['date,description,amount,category']
+        start = datetime(2023, 1, 1).date()
+        for i in range(5000):
+            lines.append(f'{start + timedelta(days=i % 365)},Row {i},-{i % 90 + 1}.00,Food')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload('big.csv', '\n'.join(lines))
+        self.assertEqual(response.data['imported'], 5000)
+        # SQLite caps each INSERT by its bound-parameter limit; other backends
+        # write a whole batch per statement
+        self.assertLess(len(queries), 5000 / 25)
+
+
+class ListQueryCountTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='listuser',
+            email='list@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def seed(self, categories, per_category):
+        for i in range(categories):
+            category = Category.objects.create(name=f'Category {Category.objects.count()}', user=self.user)
+            Transaction.objects.bulk_create([
+                Transaction(
+                    user=self.user, amount=Decimal('5.00'), description='Item',
+                    category=category, transaction_type='EXPENSE', date=timezone.now().date()
+                )
+                for _ in range(per_category)
+            ])
+
+    def test_category_list_is_constant(self):
+        self.seed(2, 3)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/transactions/categories/')
+        self.assertEqual([c['transactions_count'] for c in response.data], [3, 3])
+
+        self.seed(10, 2)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/transactions/categories/')
+        self.assertEqual(len(response.data), 12)
+
+    def test_transaction_list_is_constant(self):
+        self.seed(2, 2)
+        with self.assertNumQueries(1):
+            self.client.get('/api/transactions/transactions/')
+
+        self.seed(10, 3)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/transactions/transactions/')
+        self.assertEqual(len(response.data['results']), 34)
+        self.assertNotIn('transactions_count', response.data['results'][0]['category'])
+
+
+class AnalyticsCacheTestCase(APITestCase):
+    url = '/api/transactions/transactions/dashboard_stats/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cacheuser',
+            email='cache@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Food', user=self.user)
+        self.add_expense('10.00')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_expense(self, amount):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Lunch',
+            category=self.category, transaction_type='EXPENSE', date=timezone.now().date()
+        )
+
+    def test_repeat_load_is_a_hit(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        # Only the user's data version is read
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['statistics']['total_expenses'], 10.0)
+
+        # Different parameters are cached separately
+        response = self.client.get(self.url, {'time_range': 'current_year'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(analytics_cache_stats(), {'hit': 1, 'miss': 2, 'stale': 0})
+
+    def test_writes_invalidate(self):
+        self.client.get(self.url)
+        transaction = self.add_expense('5.00')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['statistics']['total_expenses'], 15.0)
+
+        transaction.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['statistics']['total_expenses'], 10.0)
+
+        # Users do not share entries
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['statistics']['total_expenses'], 0.0)
+
+    def test_writes_in_another_process_invalidate(self):
+        self.client.get(self.url)
+        # A write handled by a worker process with its own local-memory cache
+        with mock.patch('core.analytics_cache.cache', LocMemCache('other-process', {})):
+            self.add_expense('5.00')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['statistics']['total_expenses'], 15.0)
+
+    def test_user_saves_keep_bumps(self):
+        self.client.get(self.url)
+        # Loaded before the write, then saved in full after it, e.g. by a login
+        user = User.objects.get(pk=self.user.pk)
+        self.add_expense('5.00')
+        user.reset_failed_login_attempts()
+        user.first_name = 'Cache'
+        user.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['statistics']['total_expenses'], 15.0)
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, 'Cache')
+
+    @override_settings(ANALYTICS_CACHE={'TIMEOUT': 0, 'STALE_TIMEOUT': 60, 'BACKGROUND_REFRESH': True})
+    def test_stale_while_revalidate(self):
+        refreshes = []
+        with mock.patch('core.analytics_cache.schedule_refresh', side_effect=lambda refresh: refreshes.append(refresh)):
+            self.client.get(self.url)
+            response = self.client.get(self.url)
+            self.assertEqual(response['X-Cache'], 'STALE')
+            # A refresh is already pending, so the next request does not start another
+            response = self.client.get(self.url)
+            self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertEqual(len(refreshes), 1)
+        refreshes[0]()
+
+
+class CategoryPathTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='pathuser',
+            email='path@example.com',
+            password='testpass123'
+        )
+        self.food = Category.objects.create(name='Food', user=self.user)
+        self.groceries = Category.objects.create(name='Groceries', parent=self.food, user=self.user)
+        self.produce = Category.objects.create(name='Produce', parent=self.groceries, user=self.user)
+        self.home = Category.objects.create(name='Home', user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_expense(self, amount, category):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), description='Purchase',
+            category=category, transaction_type='EXPENSE', date=timezone.now().date()
+        )
+
+    def test_paths_follow_parent_changes(self):
+        self.assertEqual(self.produce.path, f'/{self.food.id}/{self.groceries.id}/{self.produce.id}/')
+
+        self.groceries.parent = self.home
+        self.groceries.save()
+        self.produce.refresh_from_db()
+        self.assertEqual(self.produce.path, f'/{self.home.id}/{self.groceries.id}/{self.produce.id}/')
+
+        self.groceries.parent = None
+        self.groceries.save()
+        self.produce.refresh_from_db()
+        self.assertEqual(self.produce.ancestor_ids, [self.groceries.id, self.produce.id])
+
+    def test_cycles_are_rejected(self):
+        response = self.client.patch(
+            f'/api/transactions/categories/{self.food.id}/', {'parent': self.produce.id}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.food.refresh_from_db()
+        self.assertIsNone(self.food.parent_id)
+
+    def test_rollup_totals(self):
+        self.add_expense('10.00', self.food)
+        self.add_expense('20.00', self.groceries)
+        self.add_expense('30.00', self.produce)
+        self.add_expense('5.00', self.home)
+
+        response = self.client.get('/api/transactions/transactions/category_stats/', {'rollup': 'true'})
+        expenses = {category['name']: category['expenses'] for category in response.data['categories']}
+        self.assertEqual(expenses, {'Food': 60.0, 'Groceries': 50.0, 'Produce': 30.0, 'Home': 5.0})
+
+        response = self.client.get('/api/transactions/transactions/category_stats/')
+        expenses = {category['name']: category['expenses'] for category in response.data['categories']}
+        self.assertEqual(expenses['Food'], 10.0)
+
+        response = self.client.get('/api/reports/reports/financial_summary/', {'rollup': 'true'})
+        breakdown = {item['category']: item['amount'] for item in response.data['category_breakdown']}
+        self.assertEqual(breakdown, {'Food': 60.0, 'Home': 5.0})
+
+    def test_rollup_queries_do_not_grow_with_depth(self):
+        self.add_expense('10.00', self.produce)
+        cache.clear()
+        with CaptureQueriesContext(connection) as shallow:
+            self.client.get('/api/transactions/transactions/category_stats/', {'rollup': 'true'})
+
+        parent = self.produce
+        for depth in range(5):
+            parent = Category.objects.create(name=f'Level {depth}', parent=parent, user=self.user)
+            self.add_expense('1.00', parent)
+        cache.clear()
+        with CaptureQueriesContext(connection) as deep:
+            response = self.client.get('/api/transactions/transactions/category_stats/', {'rollup': 'true'})
+        self.assertEqual(len(deep), len(shallow))
+        expenses = {category['name']: category['expenses'] for category in response.data['categories']}
+        self.assertEqual(expenses['Food'], 15.0)
+
+
+class TransactionTagsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='taguser',
+            email='tags@example.com',
+            password='testpass123'
+        )
+        today = timezone.now().date()
+        for amount, transaction_type, tags in [
+            ('100.00', 'EXPENSE', ['trip-paris', 'reimbursable']),
+            ('40.00', 'EXPENSE', ['trip-paris']),
+            ('25.50', 'EXPENSE', ['reimbursable']),
+            ('500.00', 'INCOME', ['reimbursable']),
+            ('10.00', 'EXPENSE', []),
+        ]:
+            Transaction.objects.create(
+                user=self.user, amount=Decimal(amount), description='Tagged',
+                transaction_type=transaction_type, date=today, tags=tags
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_any_and_all(self):
+        url = '/api/transactions/transactions/'
+        response = self.client.get(url, {'tags': 'trip-paris,reimbursable'})
+        self.assertEqual(len(response.data['results']), 1)
+
+        response = self.client.get(url, {'tags': 'trip-paris,reimbursable', 'tags_match': 'any'})
+        self.assertEqual(len(response.data['results']), 4)
+
+        response = self.client.get(url, {'tags': 'trip', 'tags_match': 'any'})
+        self.assertEqual(len(response.data['results']), 0)
+
+        response = self.client.get(url, {'tags': 'trip', 'tags_match': 'some'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tag_stats(self):
+        url = '/api/transactions/transactions/tag_stats/'
+        # The data version and one aggregate
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data['tags'], [
+            {'tag': 'trip-paris', 'income': 0.0, 'expenses': 140.0, 'transaction_count': 2},
+            {'tag': 'reimbursable', 'income': 500.0, 'expenses': 125.5, 'transaction_count': 3},
+        ])
+
+        # List filters apply before aggregation
+        response = self.client.get(url, {'transaction_type': 'EXPENSE', 'tags': 'trip-paris'})
+        self.assertEqual(response.data['tags'], [
+            {'tag': 'trip-paris', 'income': 0.0, 'expenses': 140.0, 'transaction_count': 2},
+            {'tag': 'reimbursable', 'income': 0.0, 'expenses': 100.0, 'transaction_count': 1},
+        ])
+
+
+class TransactionSearchTestCase(APITestCase):
+    url = '/api/transactions/transactions/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='searchuser',
+            email='search@example.com',
+            password='testpass123'
+        )
+        today = timezone.now().date()
+        for i, (description, notes) in enumerate([
+            ('Coffee at Blue Bottle', ''),
+            ('Groceries', 'coffee beans and milk'),
+            ('Rent', 'October'),
+            ('Coffee filters', ''),
+        ]):
+            Transaction.objects.create(
+                user=self.user, amount=Decimal('5.00'), description=description, notes=notes,
+                transaction_type='EXPENSE', date=today - timedelta(days=i)
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_search_matches_description_and_notes(self):
+        response = self.client.get(self.url, {'q': 'coffee'})
+        self.assertEqual(
+            [row['description'] for row in response.data['results']],
+            ['Coffee at Blue Bottle', 'Groceries', 'Coffee filters']
+        )
+        self.assertIn('search_rank', response.data['results'][0])
+        self.assertIn('search_snippet', response.data['results'][0])
+        self.assertNotIn('search_vector', response.data['results'][0])
+
+        response = self.client.get(self.url)
+        self.assertNotIn('search_rank', response.data['results'][0])
+
+    def test_search_pages(self):
+        descriptions = []
+        response = self.client.get(self.url, {'q': 'coffee', 'page_size': 1})
+        while True:
+            descriptions.extend(row['description'] for row in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(descriptions, ['Coffee at Blue Bottle', 'Groceries', 'Coffee filters'])
+
+    def test_rank_cursor_is_exact(self):
+        # Tied ranks on a page boundary must neither repeat nor skip rows
+        ranks = {'Coffee at Blue Bottle': '0.607927', 'Groceries': '0.060793', 'Rent': '0.060793'}
+        queryset = Transaction.objects.filter(user=self.user).annotate(search_rank=Case(
+            *[When(description=description, then=Value(Decimal(rank))) for description, rank in ranks.items()],
+            default=Value(Decimal('0')),
+            output_field=RANK_FIELD,
+        ))
+
+        seen = []
+        params = {'page_size': 1}
+        while True:
+            paginator = TransactionCursorPagination()
+            page = paginator.paginate_queryset(queryset, Request(APIRequestFactory().get(self.url, params)))
+            seen.extend((transaction.description, transaction.search_rank) for transaction in page)
+            if not paginator.has_next:
+                break
+            params['cursor'] = paginator.encode_cursor(page[-1])
+        self.assertEqual([description for description, _ in seen], [
+            'Coffee at Blue Bottle', 'Groceries', 'Rent', 'Coffee filters'
+        ])
+        self.assertEqual(seen[1][1], Decimal('0.060793'))
+
+
+class RecurringMaterializerTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='recurringuser',
+            email='recurring@example.com',
+            password='testpass123'
+        )
+        self.rent = Category.objects.create(name='Rent', user=self.user)
+
+    def add_template(self, frequency, day, amount='1000.00', user=None):
+        return Transaction.objects.create(
+            user=user or self.user, amount=Decimal(amount), description='Rent', category=self.rent,
+            transaction_type='EXPENSE', date=day, is_recurring=True, recurring_frequency=frequency
+        )
+
+    def occurrence_dates(self, template):
+        return list(template.occurrences.order_by('date').values_list('date', flat=True))
+
+    def test_monthly_occurrences_keep_the_day_of_month(self):
+        template = self.add_template('monthly', datetime(2024, 1, 31).date())
+        result = materialize_recurring(horizon=datetime(2024, 4, 30).date())
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(self.occurrence_dates(template), [
+            datetime(2024, 2, 29).date(), datetime(2024, 3, 31).date(), datetime(2024, 4, 30).date()
+        ])
+        occurrence = template.occurrences.first()
+        self.assertFalse(occurrence.is_recurring)
+        self.assertEqual(occurrence.amount, Decimal('1000.00'))
+
+    def test_reruns_are_idempotent(self):
+        template = self.add_template('WEEKLY', datetime(2024, 1, 1).date())
+        materialize_recurring(horizon=datetime(2024, 1, 29).date())
+        self.assertEqual(len(self.occurrence_dates(template)), 4)
+
+        result = materialize_recurring(horizon=datetime(2024, 1, 29).date())
+        self.assertEqual(result, dict(result, templates=0, created=0))
+
+        # Deleted occurrences stay deleted, later ones are still generated
+        template.occurrences.filter(date=datetime(2024, 1, 15).date()).delete()
+        materialize_recurring(horizon=datetime(2024, 2, 12).date())
+        self.assertEqual(self.occurrence_dates(template), [
+            datetime(2024, 1, 8).date(), datetime(2024, 1, 22).date(), datetime(2024, 1, 29).date(),
+            datetime(2024, 2, 5).date(), datetime(2024, 2, 12).date(),
+        ])
+
+    def test_overlapping_runs_do_not_double_count(self):
+        template = self.add_template('monthly', datetime(2024, 1, 5).date())
+        budget = Budget.objects.create(
+            user=self.user, name='Q1', period_type='QUARTERLY', start_date=datetime(2024, 1, 1).date(),
+            end_date=datetime(2024, 3, 31).date(), total_amount=Decimal('5000.00')
+        )
+        allocation = BudgetCategory.objects.create(budget=budget, category=self.rent, amount=Decimal('3000.00'))
+        horizon = datetime(2024, 3, 31).date()
+        self.assertEqual(materialize_recurring(horizon=horizon)['created'], 2)
+
+        # A second run over the same window, e.g. after the template was edited
+        Transaction.objects.filter(id=template.id).update(materialized_until=None)
+        result = materialize_recurring(horizon=horizon)
+        self.assertEqual((result['templates'], result['created']), (1, 0))
+
+        self.assertEqual(len(self.occurrence_dates(template)), 2)
+        rollups = MonthlyCategoryRollup.objects.filter(user=self.user, month__gte=datetime(2024, 2, 1).date())
+        self.assertEqual(sorted(rollups.values_list('total', 'count')), [(Decimal('1000.00'), 1)] * 2)
+        allocation.refresh_from_db()
+        # The template itself plus two occurrences
+        self.assertEqual((allocation.spent_amount, allocation.transaction_count), (Decimal('3000.00'), 3))
+
+    def test_rollups_include_occurrences(self):
+        self.add_template('monthly', datetime(2024, 1, 5).date())
+        materialize_recurring(horizon=datetime(2024, 6, 30).date())
+        totals = dict(MonthlyCategoryRollup.objects.filter(user=self.user).values_list('month', 'total'))
+        self.assertEqual(len(totals), 6)
+        self.assertTrue(all(total == Decimal('1000.00') for total in totals.values()))
+
+    def test_command_and_unknown_frequencies(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        start = timezone.now().date() - timedelta(days=3)
+        mine = self.add_template('daily', start)
+        theirs = self.add_template('daily', start, user=other)
+        self.add_template('fortnightly-ish', start)
+
+        out = StringIO()
+        call_command('materialize_recurring', user='recurring@example.com', stdout=out)
+        self.assertIn('Created 3 occurrences', out.getvalue())
+        self.assertIn('Skipped 1', out.getvalue())
+        self.assertEqual(len(self.occurrence_dates(mine)), 3)
+        self.assertEqual(len(self.occurrence_dates(theirs)), 0)
+
+    def test_queries_scale_with_batches(self):
+        start = timezone.now().date() - timedelta(days=40)
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, amount=Decimal('10.00'), description=f'Subscription {i}', category=self.rent,
+                transaction_type='EXPENSE', date=start, is_recurring=True, recurring_frequency='weekly'
+            )
+            for i in range(1000)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            result = materialize_recurring(batch_size=500)
+        self.assertEqual(result['templates'], 1000)
+        self.assertEqual(Transaction.objects.filter(recurring_template__isnull=False).count(), result['created'])
+        # SQLite splits each bulk_create by its parameter limit, so only count the rest;
+        # each batch also looks up the occurrences it already stored
+        statements = [
+            q['sql'] for q in queries
+            if not q['sql'].startswith(('INSERT', 'SAVEPOINT', 'RELEASE SAVEPOINT'))
+        ]
+        self.assertLess(len(statements), 17)
+
+
+class TransactionQueryPlanTestCase(QueryPlanAssertions, APITestCase):
+    """The hot transaction and category queries must keep using their indexes"""
+
+    def setUp(self):
+        users = [
+            User.objects.create_user(username=f'planuser{i}', email=f'plan{i}@example.com', password='testpass123')
+            for i in range(5)
+        ]
+        self.user = users[0]
+        start = datetime(2023, 1, 1).date()
+        for user in users:
+            categories = [
+                Category.objects.create(name=f'Category {i}', user=user, is_income=i == 0)
+                for i in range(5)
+            ]
+            Transaction.objects.bulk_create([
+                Transaction(
+                    user=user, amount=Decimal('10.00'), description=f'Item {i}', category=categories[i % 5],
+                    transaction_type='INCOME' if i % 5 == 0 else 'EXPENSE', date=start + timedelta(days=i % 700)
+                )
+                for i in range(400)
+            ])
+        self.category = Category.objects.filter(user=self.user).first()
+        self.analyze()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_transaction_list(self):
+        url = '/api/transactions/transactions/'
+        response = self.assertRequestUsesIndexes(url, table='transactions_transaction', ordered=True)
+        # The next page continues from the cursor
+        self.assertRequestUsesIndexes(response.data['next'], table='transactions_transaction', ordered=True)
+
+    def test_list_filters(self):
+        url = '/api/transactions/transactions/'
+        period = {'date_from': '2023-06-01', 'date_to': '2023-06-30'}
+        self.assertRequestUsesIndexes(
+            url, {'transaction_type': 'EXPENSE', **period}, table='transactions_transaction', ordered=True
+        )
+        self.assertRequestUsesIndexes(
+            url, {'category': self.category.id, **period}, table='transactions_transaction', ordered=True
+        )
+
+    def test_category_filters(self):
+        url = '/api/transactions/categories/'
+        self.assertRequestUsesIndexes(url, {'type': 'income'}, table='transactions_category')
+        self.assertRequestUsesIndexes(url, {'parent': self.category.id}, table='transactions_category')
@@ -1,15 +1,187 @@
+import base64
+import io
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q
+from rest_framework.utils.urls import replace_query_param
+from django.db import connection
+from django.db.models import Count, Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from datetime import datetime, timedelta
+from django_filters.rest_framework import DjangoFilterBackend
+import django_filters
+from datetime import date, datetime
+from decimal import Decimal
+from core.analytics_cache import cached_analytics
+from .analytics import add_months, month_end, monthly_category_summary, roll_up_categories, tag_totals
+from .exports import CSVRenderer, JSONLinesRenderer, stream_csv, stream_jsonl
+from .imports import IMPORT_FORMATS, TransactionImporter, detect_format
 from .models import Account, Category, Transaction
+from .search import search_transactions
 from .serializers import AccountSerializer, CategorySerializer, TransactionSerializer
 
 # Create your views here.
 
+
+class TransactionFilter(django_filters.FilterSet):
+    """Filter for transactions"""
+    transaction_type = django_filters.ChoiceFilter(choices=Transaction.TRANSACTION_TYPES)
+    category = django_filters.BaseInFilter(field_name='category_id', lookup_expr='in')
+    is_recurring = django_filters.BooleanFilter()
+    q = django_filters.CharFilter(method='filter_search')
+    tags = django_filters.CharFilter(method='filter_tags')
+    tags_match = django_filters.ChoiceFilter(
+        choices=(('all', 'All'), ('any', 'Any')), method='filter_tags_match'
+    )
+
+    # Date range filters
+    date_from = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    # Amount range filters
+    amount_min = django_filters.NumberFilter(field_name='amount', lookup_expr='gte')
+    amount_max = django_filters.NumberFilter(field_name='amount', lookup_expr='lte')
+
+    class Meta:
+        model = Transaction
+        fields = [
+            'q', 'transaction_type', 'category', 'is_recurring', 'tags', 'tags_match',
+            'date_from', 'date_to',
+            'amount_min', 'amount_max'
+        ]
+
+    def filter_search(self, queryset, name, value):
+        """Full-text search over description and notes"""
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_transactions(queryset, value)
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Match transactions carrying the tags in a comma-separated list: all of
+        them by default, or any of them with `tags_match=any`.
+        """
+        tags = [t.strip() for t in value.split(',') if t.strip()]
+        if not tags:
+            return queryset
+        match_any = self.form.cleaned_data.get('tags_match') == 'any'
+
+        if connection.features.supports_json_field_contains:
+            # jsonb ?| and @> are both served by the GIN index on tags
+            if match_any:
+                return queryset.filter(tags__has_any_keys=tags)
+            return queryset.filter(tags__contains=tags)
+
+        # Backends without JSON containment (SQLite) match the quoted element
+        # inside the serialized array instead.
+        conditions = [Q(tags__icontains=f'"{tag}"') for tag in tags]
+        combined = conditions[0]
+        for condition in conditions[1:]:
+            combined = combined | condition if match_any else combined & condition
+        return queryset.filter(combined)
+
+    def filter_tags_match(self, queryset, name, value):
+        # Only changes how `tags` is applied
+        return queryset
+
+
+class TransactionCursorPagination(BasePagination):
+    """
+    Keyset pagination for transactions, newest first.
+
+    The opaque cursor encodes the (date, id) of the last row on the previous
+    page, so every page is a range scan from that position instead of an
+    OFFSET that grows with how far the client has scrolled. Search results
+    are ordered by relevance first, and their cursors carry the rank too.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    ordering = ('-date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ranked = 'search_rank' in queryset.query.annotations
+        ordering = ('-search_rank',) + self.ordering if self.ranked else self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            position_date, position_id, position_rank = position
+            keyset = Q(date__lt=position_date) | Q(date=position_date, id__lt=position_id)
+            if self.ranked:
+                keyset = Q(search_rank__lt=position_rank) | (Q(search_rank=position_rank) & keyset)
+            queryset = queryset.filter(keyset)
+
+        # Fetch one extra row to find out whether there is a next page
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            if self.ranked:
+                position_date, position_id, position_rank = decoded.split('|')
+                position_rank = Decimal(position_rank)
+                if not position_rank.is_finite():
+                    raise ValueError(position_rank)
+            else:
+                position_date, position_id = decoded.split('|')
+                position_rank = None
+            return date.fromisoformat(position_date), int(position_id), position_rank
+        except (TypeError, ValueError, ArithmeticError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        position = f'{instance.date.isoformat()}|{instance.pk}'
+        if self.ranked:
+            position += f'|{instance.search_rank}'
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
 class AccountViewSet(viewsets.ModelViewSet):
     serializer_class = AccountSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -25,7 +197,9 @@ class CategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Category.objects.filter(user=self.request.user)
+        queryset = Category.objects.filter(user=self.request.user).annotate(
+            transactions_count=Count('transactions')
+        )
         
         # Filter by type if provided
         category_type = self.request.query_params.get('type')
@@ -53,82 +227,157 @@ class CategoryViewSet(viewsets.ModelViewSet):
 class TransactionViewSet(viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = TransactionFilter
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user)
+        return Transaction.objects.filter(user=self.request.user).select_related('category').defer('search_vector')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, JSONLinesRenderer])
+    def export(self, request):
+        """
+        Stream the user's transactions as CSV or JSON Lines.
+
+        GET /api/transactions/transactions/export/?format=csv|jsonl
+
+        Accepts the same filters as the list endpoint. Rows are read from the
+        database in chunks and written out as they arrive, so memory use does not
+        depend on how many transactions are exported.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by('date', 'id')
+
+        if request.accepted_renderer.format == 'jsonl':
+            response = StreamingHttpResponse(stream_jsonl(queryset), content_type='application/x-ndjson')
+            filename = 'transactions.jsonl'
+        else:
+            response = StreamingHttpResponse(stream_csv(queryset), content_type='text/csv')
+            filename = 'transactions.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser])
+    def import_file(self, request):
+        """
+        Bulk import a bank statement.
+
+        POST /api/transactions/transactions/import/
+
+        Accepts a multipart `file` in CSV, OFX/QFX or QIF format, detected from
+        the file name unless `file_format` is given. Rows are parsed as a stream
+        and inserted in batches; duplicates of existing transactions are skipped.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'No file uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = (request.data.get('file_format') or detect_format(upload.name)).lower()
+        if file_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': f'Unsupported format. Use one of: {", ".join(IMPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        upload.seek(0)
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace', newline='')
+        result = TransactionImporter(request.user).import_file(lines, file_format)
+        return Response(result, status=status.HTTP_201_CREATED if result['imported'] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    @cached_analytics
+    def tag_stats(self, request):
+        """Get income, expense totals and counts per tag for the filtered transactions"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response({
+            'tags': [
+                {
+                    'tag': row['tag'],
+                    'income': float(row['income']),
+                    'expenses': float(row['expenses']),
+                    'transaction_count': row['count']
+                }
+                for row in tag_totals(queryset)
+            ]
+        })
+
     @action(detail=False, methods=['get'])
+    @cached_analytics
     def dashboard_stats(self, request):
         """Get dashboard statistics for the authenticated user"""
         # Get date range from query params
         time_range = request.query_params.get('time_range', 'current_month')
         
         # Calculate date range
-        now = timezone.now()
-        if time_range == 'current_month':
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        elif time_range == 'previous_month':
-            start_date = (now.replace(day=1) - timedelta(days=1)).replace(day=1)
-            end_date = now.replace(day=1) - timedelta(days=1)
+        today = timezone.now().date()
+        if time_range == 'previous_month':
+            start_date = add_months(today, -1)
+            end_date = month_end(start_date)
         elif time_range == 'current_year':
-            start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = now.replace(month=12, day=31, hour=23, minute=59, second=59, microsecond=999999)
+            start_date = today.replace(month=1, day=1)
+            end_date = today.replace(month=12, day=31)
         else:
             # Default to current month
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            start_date = add_months(today, 0)
+            end_date = month_end(start_date)
 
-        # Get transactions in date range
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__gte=start_date,
-            date__lte=end_date
+        # Monthly trend covers the current month and the 5 before it
+        trend_months = [add_months(today, -i) for i in range(6)]
+
+        # One grouped rollup query covers the selected period and the trend window
+        monthly_rows = monthly_category_summary(
+            request.user,
+            min(start_date, trend_months[-1]),
+            max(end_date, month_end(today))
         )
 
-        # Calculate statistics
-        income_transactions = transactions.filter(transaction_type='INCOME')
-        expense_transactions = transactions.filter(transaction_type='EXPENSE')
+        total_income = Decimal('0')
+        total_expenses = Decimal('0')
+        transaction_count = 0
+        category_totals = {}
+        trend_totals = {month: {'income': Decimal('0'), 'expenses': Decimal('0')} for month in trend_months}
+
+        for row in monthly_rows:
+            income = row['income'] or Decimal('0')
+            expenses = abs(row['expenses'] or Decimal('0'))
+
+            if start_date <= row['month'] <= end_date:
+                total_income += income
+                total_expenses += expenses
+                transaction_count += row['count']
+                if row['expenses'] is not None:
+                    category_name = row['category__name'] or 'Uncategorized'
+                    category_totals[category_name] = category_totals.get(category_name, 0) + expenses
+
+            if row['month'] in trend_totals:
+                trend_totals[row['month']]['income'] += income
+                trend_totals[row['month']]['expenses'] += expenses
 
-        total_income = income_transactions.aggregate(total=Sum('amount'))['total'] or 0
-        total_expenses = abs(expense_transactions.aggregate(total=Sum('amount'))['total'] or 0)
         net_balance = total_income - total_expenses
         savings_rate = (float(net_balance) / float(total_income) * 100) if total_income > 0 else 0
 
         # Category breakdown for expenses
-        category_breakdown = expense_transactions.values('category__name').annotate(
-            total=Sum('amount')
-        ).order_by('-total')[:10]
+        category_breakdown = sorted(category_totals.items(), key=lambda item: item[1], reverse=True)[:10]
 
         # Recent transactions
-        recent_transactions = transactions.order_by('-date')[:5]
+        recent_transactions = Transaction.objects.filter(
+            user=request.user,
+            date__gte=start_date,
+            date__lte=end_date
+        ).select_related('category').order_by('-date')[:5]
 
         # Monthly trend data (last 6 months)
-        trend_data = []
-        for i in range(6):
-            month_start = (now - timedelta(days=30*i)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            month_transactions = Transaction.objects.filter(
-                user=request.user,
-                date__gte=month_start,
-                date__lte=month_end
-            )
-            
-            month_income = month_transactions.filter(transaction_type='INCOME').aggregate(
-                total=Sum('amount'))['total'] or 0
-            month_expenses = abs(month_transactions.filter(transaction_type='EXPENSE').aggregate(
-                total=Sum('amount'))['total'] or 0)
-            
-            trend_data.append({
-                'month': month_start.strftime('%Y-%m'),
-                'income': float(month_income),
-                'expenses': float(month_expenses),
-                'balance': float(month_income - month_expenses)
-            })
+        trend_data = [
+            {
+                'month': month.strftime('%Y-%m'),
+                'income': float(totals['income']),
+                'expenses': float(totals['expenses']),
+                'balance': float(totals['income'] - totals['expenses'])
+            }
+            for month, totals in trend_totals.items()
+        ]
 
         return Response({
             'time_range': time_range,
@@ -141,65 +390,69 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 'total_expenses': float(total_expenses),
                 'net_balance': float(net_balance),
                 'savings_rate': round(savings_rate, 1),
-                'transaction_count': transactions.count()
+                'transaction_count': transaction_count
             },
             'category_breakdown': [
                 {
-                    'category': item['category__name'] or 'Uncategorized',
-                    'amount': abs(float(item['total']))
+                    'category': category_name,
+                    'amount': float(amount)
                 }
-                for item in category_breakdown
+                for category_name, amount in category_breakdown
             ],
             'recent_transactions': TransactionSerializer(recent_transactions, many=True).data,
             'trend_data': trend_data
         })
 
     @action(detail=False, methods=['get'])
+    @cached_analytics
     def category_stats(self, request):
         """Get category-wise statistics"""
         time_range = request.query_params.get('time_range', 'current_month')
         
         # Calculate date range
-        now = timezone.now()
-        if time_range == 'current_month':
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        else:
-            start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        start_date = add_months(timezone.now().date(), 0)
+        end_date = month_end(start_date)
 
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__gte=start_date,
-            date__lte=end_date
-        )
+        rows = monthly_category_summary(request.user, start_date, end_date)
 
-        # Get category statistics
-        category_stats = transactions.values('category__name', 'transaction_type').annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        ).order_by('category__name', 'transaction_type')
+        if request.query_params.get('rollup', '').lower() in ('1', 'true'):
+            # Totals of every category include its subcategories
+            subtrees = roll_up_categories(request.user, rows)
+            categories = [
+                {
+                    'id': category_id,
+                    'parent': totals['parent'],
+                    'name': totals['name'],
+                    'income': float(totals['income']),
+                    'expenses': float(totals['expenses']),
+                    'transaction_count': totals['count']
+                }
+                for category_id, totals in subtrees.items()
+                if totals['count']
+            ]
+            return Response({
+                'categories': sorted(categories, key=lambda category: category['name']),
+                'time_range': time_range,
+                'rollup': True
+            })
 
         # Group by category
         categories = {}
-        for stat in category_stats:
-            category_name = stat['category__name'] or 'Uncategorized'
+        for row in rows:
+            category_name = row['category__name'] or 'Uncategorized'
             if category_name not in categories:
                 categories[category_name] = {
                     'name': category_name,
-                    'income': 0,
-                    'expenses': 0,
+                    'income': 0.0,
+                    'expenses': 0.0,
                     'transaction_count': 0
                 }
             
-            if stat['transaction_type'] == 'INCOME':
-                categories[category_name]['income'] = float(stat['total'])
-            else:
-                categories[category_name]['expenses'] = abs(float(stat['total']))
-            
-            categories[category_name]['transaction_count'] += stat['count']
+            categories[category_name]['income'] += float(row['income'] or 0)
+            categories[category_name]['expenses'] += abs(float(row['expenses'] or 0))
+            categories[category_name]['transaction_count'] += row['count']
 
         return Response({
-            'categories': list(categories.values()),
+            'categories': sorted(categories.values(), key=lambda category: category['name']),
             'time_range': time_range
         })